@@ -17,7 +17,7 @@ if apikeys:
     print("apikeys loaded: \n{}".format(pformat(apikeys, indent=2)))
 
 
-@dataclass
+@dataclass(slots=True)
 class TxtSample:
     text: str
     target: Optional[str] = None
@@ -34,7 +34,7 @@ class TxtSample:
         return getattr(self, item)
     
 
-@dataclass
+@dataclass(slots=True)
 class ImageTxtSample:
     image_path: str
     text: str
@@ -1 +1,2 @@
-from .anomaly_detection import AnomalyData
\ No newline at end of file
+from .anomaly_detection import AnomalyData
+from .jsonl import JsonlDataset, JsonlIndex
\ No newline at end of file
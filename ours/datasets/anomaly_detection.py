@@ -1,12 +1,21 @@
-from typing import Optional, Sequence, List
+from typing import Optional, Sequence
 from ours.datasets.base import BaseDataset
 from ours.methods.base import BaseMethod
 from ours.utils.registry import registry
-from ours import ImageTxtSample, _OutputType
+from ours.utils.profiler import profiler
+from ours.datasets.store import StringTable, LabelMatrix, SampleStore
+from ours import _OutputType
 import yaml
 import json
 import os
 
+# prompt 中要求回答的病症 (不含 Support Devices)
+ANSWER_CONDITIONS = [
+    "No Finding", "Enlarged Cardiomediastinum", "Cardiomegaly", "Lung Opacity", "Lung Lesion",
+    "Edema", "Consolidation", "Pneumonia", "Atelectasis", "Pneumothorax",
+    "Pleural Effusion", "Pleural Other", "Fracture",
+]
+
 @registry.register_dataset()
 class AnomalyData(BaseDataset):
     dataset_ids: Sequence[str] = [
@@ -28,6 +37,14 @@ class AnomalyData(BaseDataset):
         "Support Devices": ["pacemaker", "tube", "catheter"],
     }
 
+    # 回答格式: 13 个病症 -> 0/1, 由支持结构化输出的模型强制执行
+    output_schema = {
+        "type": "object",
+        "properties": {condition: {"type": "integer", "enum": [0, 1]} for condition in ANSWER_CONDITIONS},
+        "required": ANSWER_CONDITIONS,
+        "additionalProperties": False,
+    }
+
     def __init__(self, dataset_id: str, method_hook: Optional[BaseMethod] = None, **kwargs) -> None:
         """
         dataset_id: 数据集名称
@@ -35,10 +52,12 @@ class AnomalyData(BaseDataset):
         img_dir: 图像存放路径
         method_hook: 可选的预处理方法
         uncertainty_policy: 处理 -1 不确定标签的策略 ("U-Zero", "U-One", "U-Ignore")
+        kwargs: 覆盖数据集配置文件中的项 (image_dir, annotation_file, nums), 来自任务配置的 dataset_cfg
         """
         super().__init__(dataset_id=dataset_id, method_hook=method_hook)
         with open(self.dataset_config) as f:
             self.config = yaml.load(f, Loader=yaml.FullLoader)
+        self.config.update({key: value for key, value in kwargs.items() if key in ['image_dir', 'annotation_file', 'nums']})
         
         self.image_dir = self.config.get('image_dir')
         self.label_dir = self.config.get('annotation_file')
@@ -49,8 +68,6 @@ class AnomalyData(BaseDataset):
             samples = json.load(f)['samples']
 
         assert self.nums <= len(samples), f"❌ num ({self.nums}) is larger than total samples ({len(samples)})."
-        self.images = []
-        self.labels = []
         # 只取前 nums 个样本
         samples = samples[:self.nums]
 
@@ -61,11 +78,6 @@ class AnomalyData(BaseDataset):
             "Pleural Effusion", "Pleural Other", "Fracture", "Support Devices"
         ]
 
-        for sample in samples:
-            img = sample['image_filename']
-            self.images.append(os.path.join(self.image_dir, img))
-            self.labels.append(sample['labels'])  # 多标签
-
         prompt = (
             "Analyze this chest X-ray image. "
             "Answer '1' or '0' for each condition: "
@@ -76,22 +88,24 @@ class AnomalyData(BaseDataset):
             "If any disease is present, set 'No Finding' to 0. Only one of 'No Finding' or other diseases can be 1."
             "Format your answer as a JSON with keys being the condition names and values being '1' or '0'."
         )
-        dataset = []
-        for img, labels in zip(self.images, self.labels):
-            dataset.append(ImageTxtSample(
-                image_path=img,
-                text=prompt,        
-                target=labels   # 多标签
-            ))
-            # print("img_dir",img)
-        
-        self.dataset = dataset
+        # 列式存储: 图像路径打包为一个字符串表, 多标签为 uint8 矩阵, 样本在访问时才构造
+        columns = self.labels_columns + [name for name in dict.fromkeys(name for sample in samples for name in sample['labels']) if name not in self.labels_columns]
+        self.images = StringTable(os.path.join(self.image_dir, sample['image_filename']) for sample in samples)
+        self.labels = LabelMatrix.from_dicts([sample['labels'] for sample in samples], columns=columns)
+        self.store = SampleStore(self.images, self.labels, prompt)
 
+    @property
+    def label_matrix(self) -> LabelMatrix:
+        """
+        Labels of all samples, evaluators select their columns directly (see `BaseTask.eval`).
+        """
+        return self.labels
 
     def __getitem__(self, index: int) -> _OutputType:
         if self.method_hook:
-            return self.method_hook.run(self.dataset[index])
-        return self.dataset[index]
+            with profiler.span('method_hook'):
+                return self.method_hook.run(self.store[index])
+        return self.store[index]
 
     def __len__(self) -> int:
-        return len(self.dataset)
+        return len(self.store)
@@ -1,10 +1,28 @@
 from abc import abstractmethod, ABC
-from typing import Optional, Any, Sequence, List
+from typing import Optional, Any, Sequence, List, Dict
 from torch.utils.data import Dataset
 from ours.methods.base import BaseMethod
 from ours import _OutputType, ImageTxtSample, TxtSample
+from ours.utils.image import encode_image
+from ours.utils.profiler import profiler
+import hashlib
+import json
+import os
 
-def collate_fn(batch_data: List[_OutputType]):
+PROMPT_LAYOUTS = ['user', 'system']
+
+def collate_fn(batch_data: List[_OutputType], encode_images: bool = False, max_image_size: int = 400, prompt_layout: str = 'user'):
+    """
+    Convert samples to chat messages.
+
+    encode_images: load, resize and base64-encode local images here, so that the work is done in dataloader
+        worker processes and the chat model receives a ready payload in `content['encoded_image']`
+    max_image_size: maximal image size used when encoding images
+    prompt_layout: 'user' sends the text and the image in one user message, 'system' sends the text of multimodal
+        samples as a system message followed by a user message holding the image only, so that instructions shared
+        by all samples form an identical leading prefix that providers can cache
+    """
+    assert prompt_layout in PROMPT_LAYOUTS, f"Unknown prompt layout {prompt_layout}, supported: {PROMPT_LAYOUTS}"
     collate_batch_data = []
     for data in batch_data:    
         if isinstance(data, ImageTxtSample):
@@ -12,17 +30,32 @@ def collate_fn(batch_data: List[_OutputType]):
                 'image_path': data.image_path,
                 'text': data.text
             }
+            if encode_images and os.path.exists(data.image_path):
+                content['encoded_image'] = encode_image(data.image_path, max_size=max_image_size)
         elif isinstance(data, TxtSample):
             content = data.text
         else:
             raise TypeError
 
-        message = [
-            {
-                "role": "user",
-                "content": content
-            }
-        ]
+        if prompt_layout == 'system' and isinstance(content, dict):
+            # static instructions first, the per-sample image last
+            message = [
+                {
+                    "role": "system",
+                    "content": content['text']
+                },
+                {
+                    "role": "user",
+                    "content": {**content, 'text': ''}
+                }
+            ]
+        else:
+            message = [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ]
         target = data.target
         extra = data.extra
 
@@ -35,6 +68,23 @@ def collate_fn(batch_data: List[_OutputType]):
         collate_batch_data.append(collate_data)
     return collate_batch_data
 
+def strip_payload(content: Any) -> Any:
+    """
+    Message content without the image payload prepared by `collate_fn`, for logging and hashing.
+    """
+    if isinstance(content, dict) and 'encoded_image' in content:
+        return {key: value for key, value in content.items() if key != 'encoded_image'}
+    return content
+
+def get_sample_id(index: int, message: List[Dict[str, Any]]) -> str:
+    """
+    Stable identifier of a sample: its position in the dataset and a digest of its message,
+    so that ids of a checkpoint do not silently match a modified dataset.
+    """
+    message = [{**item, 'content': strip_payload(item['content'])} for item in message]
+    digest = hashlib.sha1(json.dumps(message, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+    return f"{index}-{digest[:12]}"
+
 class BaseDataset(Dataset, ABC):
     """
     Base class for datasets, __getitem__ function return Union[ImageTxtSample, TxtSample].
@@ -43,6 +93,7 @@ class BaseDataset(Dataset, ABC):
     dataset_id: str # Identifier for the dataset
     dataset_ids: Sequence[str] = [] # List of available datasets
     dataset_config: Optional[str] = "" # dataset config path
+    output_schema: Optional[Dict[str, Any]] = None # JSON schema of the expected answers, sent to chat models supporting structured output
 
     def __init__(self, dataset_id: str, method_hook: Optional[BaseMethod] = None, **kwargs) -> None:
         """
@@ -66,7 +117,8 @@ class BaseDataset(Dataset, ABC):
     @abstractmethod
     def __getitem__(self, index: int) -> _OutputType:
         if self.method_hook:
-            return self.method_hook.run(self.dataset[index])
+            with profiler.span('method_hook'):
+                return self.method_hook.run(self.dataset[index])
         return self.dataset[index]
     
     @abstractmethod
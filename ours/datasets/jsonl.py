@@ -0,0 +1,188 @@
+from typing import Optional, Sequence, Dict, Any
+from ours.datasets.base import BaseDataset
+from ours.methods.base import BaseMethod
+from ours.utils.registry import registry
+from ours.utils.profiler import profiler
+from ours import ImageTxtSample, TxtSample, _OutputType
+import numpy as np
+import warnings
+import json
+import os
+
+# bytes read at once when building an index
+_CHUNK_SIZE = 1 << 24
+
+
+class JsonlIndex:
+    """
+    Random access to the records of a JSONL file through a byte-offset index.
+
+    The index is built once with a vectorized scan for newlines and saved next to the file (`<path>.idx.npy`),
+    later runs memory-map it, so that opening a file of millions of lines takes milliseconds and keeps almost nothing resident.
+    Records are read with `os.pread`, which is safe for threads and for forked dataloader workers; spawned workers
+    receive the path of the saved index and memory-map it again instead of scanning the file.
+
+    Index format: int64 array [file size, file mtime_ns, offset of line 0, ..., offset of line n-1, file size],
+    blank lines are skipped. A stale index (file size or mtime changed) is rebuilt.
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None) -> None:
+        """
+        Arguments:
+            path: path of the JSONL file
+            index_path: where the index is stored, `<path>.idx.npy` by default
+        """
+        self.path = path
+        self.index_path = index_path or path + '.idx.npy'
+        stat = os.stat(path)
+        self.file_size, self.file_mtime = stat.st_size, stat.st_mtime_ns
+        self.offsets = self.load()
+        # path of the memory-mapped index, None when it could not be saved
+        self.offsets_path = self.index_path
+        if self.offsets is None:
+            with profiler.span('jsonl_index:build'):
+                self.offsets = self.build()
+            if not self.save():
+                self.offsets_path = None
+        self._fd = None
+        self._pid = None
+
+    def load(self) -> Optional[np.ndarray]:
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            index = np.load(self.index_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if len(index) < 3 or index[0] != self.file_size or index[1] != self.file_mtime:
+            return None
+        return index[2:]
+
+    def build(self) -> np.ndarray:
+        starts, keep = [], []
+        position, line_start, last_content = 0, 0, -1
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                data = np.frombuffer(chunk, dtype=np.uint8)
+                newlines = np.flatnonzero(data == ord('\n')) + position
+                content = np.flatnonzero((data != ord(' ')) & (data != ord('\t')) & (data != ord('\r')) & (data != ord('\n'))) + position
+                # a line is blank if its last non-whitespace byte lies before its start
+                chunk_starts = np.concatenate([[line_start], newlines[:-1] + 1]) if len(newlines) else np.zeros(0, dtype=np.int64)
+                previous = np.searchsorted(content, newlines) - 1
+                last = np.where(previous >= 0, content[np.maximum(previous, 0)] if len(content) else -1, last_content)
+                starts.append(chunk_starts)
+                keep.append(last >= chunk_starts)
+                if len(newlines):
+                    line_start = int(newlines[-1]) + 1
+                if len(content):
+                    last_content = int(content[-1])
+                position += len(chunk)
+        # last line without a trailing newline
+        starts.append(np.array([line_start]))
+        keep.append(np.array([last_content >= line_start]))
+        starts, keep = np.concatenate(starts).astype(np.int64), np.concatenate(keep)
+        return np.append(starts[keep], self.file_size)
+
+    def save(self) -> bool:
+        index = np.concatenate([np.array([self.file_size, self.file_mtime], dtype=np.int64), self.offsets])
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp.npy"
+        try:
+            np.save(tmp_path, index)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            warnings.warn(f"Could not save the index of {self.path} to {self.index_path}: {e}")
+            return False
+        return True
+
+    @property
+    def fd(self) -> int:
+        # file descriptors are not shared with forked dataloader workers
+        if self._fd is None or self._pid != os.getpid():
+            self._fd, self._pid = os.open(self.path, os.O_RDONLY), os.getpid()
+        return self._fd
+
+    def read(self, index: int) -> bytes:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Record {index} out of range for {self.path} with {len(self)} records.")
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return os.pread(self.fd, end - start, start)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return json.loads(self.read(index))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the saved index is memory-mapped again and the file reopened after unpickling (spawned dataloader workers),
+        # an index that could not be saved is pickled with the object
+        state = dict(self.__dict__, _fd=None, _pid=None)
+        if self.offsets_path is not None:
+            state['offsets'] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        if self.offsets is None:
+            # already validated against the file by the pickled object
+            self.offsets = np.load(self.offsets_path, mmap_mode='r')[2:]
+
+    def __del__(self) -> None:
+        if getattr(self, '_fd', None) is not None and self._pid == os.getpid():
+            os.close(self._fd)
+
+
+@registry.register_dataset()
+class JsonlDataset(BaseDataset):
+    """
+    Dataset of a JSONL file, one sample per line, loaded lazily through a JsonlIndex.
+
+    By default a record holding `image_path` becomes an ImageTxtSample and other records a TxtSample,
+    `fields` maps the sample fields (text, image_path, target, extra) to the keys of differently named records.
+    Subclasses for a given dataset override `dataset_ids` and `to_sample`.
+    """
+
+    dataset_ids: Sequence[str] = [
+        "jsonl"
+    ]
+
+    def __init__(self, dataset_id: str, method_hook: Optional[BaseMethod] = None, path: Optional[str] = None, nums: Optional[int] = None,
+                 index_path: Optional[str] = None, fields: Optional[Dict[str, str]] = None, image_dir: Optional[str] = None, **kwargs) -> None:
+        """
+        path: path of the JSONL file
+        nums: only use the first `nums` records
+        index_path: where the byte-offset index is stored, `<path>.idx.npy` by default
+        fields: format: {sample field: record key}, e.g., {text: question, target: answer}
+        image_dir: directory of relative image paths
+        """
+        super().__init__(dataset_id=dataset_id, method_hook=method_hook)
+        assert path is not None and os.path.exists(path), f"JSONL file not found: {path}"
+        self.index = JsonlIndex(path, index_path=index_path)
+        self.nums = len(self.index) if nums is None else min(nums, len(self.index))
+        self.fields = fields or {}
+        self.image_dir = image_dir
+
+    def to_sample(self, record: Dict[str, Any]) -> _OutputType:
+        data = {field: record.get(self.fields.get(field, field)) for field in ['text', 'image_path', 'target', 'extra']}
+        if data['image_path'] is None:
+            return TxtSample.from_dict(data)
+        if self.image_dir is not None:
+            data['image_path'] = os.path.join(self.image_dir, data['image_path'])
+        return ImageTxtSample.from_dict(data)
+
+    def __getitem__(self, index: int) -> _OutputType:
+        if not 0 <= index < self.nums:
+            raise IndexError(f"Sample {index} out of range for {self.nums} samples.")
+        sample = self.to_sample(self.index[index])
+        if self.method_hook:
+            with profiler.span('method_hook'):
+                return self.method_hook.run(sample)
+        return sample
+
+    def __len__(self) -> int:
+        return self.nums
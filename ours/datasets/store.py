@@ -0,0 +1,116 @@
+from typing import Optional, Sequence, Dict, Any, Iterable, Iterator
+from ours import ImageTxtSample
+import numpy as np
+
+# uint8 code of uncertain (-1) CheXpert labels
+UNCERTAIN = 255
+
+
+class StringTable:
+    """
+    Read-only sequence of strings packed in one utf-8 buffer with an int64 offset array,
+    a few bytes per string instead of a Python str object (~60 bytes of overhead) each.
+    """
+
+    def __init__(self, strings: Iterable[str]) -> None:
+        encoded = [string.encode('utf-8') for string in strings]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=self.offsets[1:])
+        self.buffer = b''.join(encoded)
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"String {index} out of range for {len(self)} strings.")
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.buffer) + self.offsets.nbytes
+
+
+class LabelMatrix:
+    """
+    Multi-label targets as a uint8 matrix, one row per sample and one column per label name of `columns`.
+    Uncertain labels (-1) are stored as `UNCERTAIN`, labels missing from a sample as 0.
+
+    Rows read as label dicts ({name: value}), so that a LabelMatrix can be passed wherever a sequence of label dicts is expected,
+    evaluators select the columns they need with `select` instead of rebuilding the matrix from the dicts.
+    """
+
+    def __init__(self, matrix: np.ndarray, columns: Sequence[str]) -> None:
+        assert matrix.ndim == 2 and matrix.shape[1] == len(columns), f"Matrix of shape {matrix.shape} does not match {len(columns)} columns."
+        self.matrix = np.asarray(matrix, dtype=np.uint8)
+        self.columns = list(columns)
+        self.column_index = {name: i for i, name in enumerate(self.columns)}
+
+    @classmethod
+    def from_dicts(cls, labels: Sequence[Dict[str, Any]], columns: Optional[Sequence[str]] = None) -> "LabelMatrix":
+        """
+        columns: label names, by default the names found in `labels` in order of appearance
+        """
+        if columns is None:
+            columns = list(dict.fromkeys(name for label in labels for name in label))
+        column_index = {name: i for i, name in enumerate(columns)}
+        matrix = np.zeros((len(labels), len(columns)), dtype=np.uint8)
+        for row, label in enumerate(labels):
+            for name, value in label.items():
+                value = int(value)
+                if value not in (-1, 0, 1):
+                    raise ValueError(f"Label {name}={value} of sample {row} is not 0, 1 or -1.")
+                matrix[row, column_index[name]] = UNCERTAIN if value == -1 else value
+        return cls(matrix, columns)
+
+    def select(self, names: Sequence[str]) -> np.ndarray:
+        """
+        int matrix of the given label names, uncertain labels as -1 and unknown names as 0.
+        """
+        selected = np.zeros((len(self), len(names)), dtype=np.int64)
+        for i, name in enumerate(names):
+            if name in self.column_index:
+                selected[:, i] = self.matrix[:, self.column_index[name]]
+        selected[selected == UNCERTAIN] = -1
+        return selected
+
+    def take(self, indices: Sequence[int]) -> "LabelMatrix":
+        return LabelMatrix(self.matrix[np.asarray(indices, dtype=np.int64)], self.columns)
+
+    def __getitem__(self, index: int) -> Dict[str, int]:
+        row = self.matrix[index].astype(np.int64)
+        row[row == UNCERTAIN] = -1
+        return dict(zip(self.columns, row.tolist()))
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def __iter__(self) -> Iterator[Dict[str, int]]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class SampleStore:
+    """
+    Columnar storage of image samples sharing one prompt: packed image paths and a label matrix.
+    Samples are materialized on access as (slotted) ImageTxtSample objects with a label dict target,
+    instead of keeping one object and one dict per sample alive for the lifetime of the dataset.
+    """
+
+    def __init__(self, image_paths: StringTable, labels: LabelMatrix, text: str) -> None:
+        assert len(image_paths) == len(labels), f"{len(image_paths)} image paths for {len(labels)} label rows."
+        self.image_paths = image_paths
+        self.labels = labels
+        self.text = text
+
+    def __getitem__(self, index: int) -> ImageTxtSample:
+        return ImageTxtSample(image_path=self.image_paths[index], text=self.text, target=self.labels[index])
+
+    def __len__(self) -> int:
+        return len(self.labels)
@@ -1,7 +1,10 @@
 from abc import abstractmethod, ABC
 from typing import Dict, Any, Sequence, List, Tuple, Union, Optional
 from ours.evaluators.metrics import _supported_metrics
+from ours.evaluators.state import get_metric_state, RunningMetrics
+from ours.evaluators.bootstrap import bootstrap_metrics
 from ours.utils.registry import registry
+from ours.utils.profiler import profiler
 
 class BaseEvaluator(ABC):
     """
@@ -25,6 +28,8 @@ class BaseEvaluator(ABC):
         self.metrics_cfg = metrics_cfg
         for metrics_id in self.metrics_cfg.keys():
             assert metrics_id in _supported_metrics.keys(), f"{metrics_id} is not supported."
+        # running metrics of incremental evaluation, see `update`
+        self.running: Optional[RunningMetrics] = None
 
     @abstractmethod
     def process(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, **kwargs) -> Tuple[Sequence[Any], Sequence[Any]]:
@@ -46,7 +51,7 @@ class BaseEvaluator(ABC):
         # no-op
         return preds, labels, extras
     
-    def eval(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, **kwargs) -> Dict[str, Union[Sequence, float]]:
+    def eval(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, bootstrap_cfg: Optional[Dict[str, Any]] = None, per_sample_results: Optional[Dict[str, Sequence]] = None, **kwargs) -> Dict[str, Union[Sequence, float]]:
         """
         Evaluate pipeline including data processing and metrics calculation.
         
@@ -54,19 +59,75 @@ class BaseEvaluator(ABC):
             preds: responses from chatmodels
             labels: groundtruth labels
             extras: extra parameters
+            bootstrap_cfg: kwargs of `ours.evaluators.bootstrap.bootstrap_metrics`, e.g., {num_resamples: 1000, confidence: 0.95},
+                the confidence interval of a metric is returned as `<metrics_id>:ci`
+            per_sample_results: dict filled with the per-sample values of evaluators reporting them (e.g., parse failures),
+                saved with the per-sample results of the task instead of being returned
             
         Return:
             results
         """
 
         processed_preds, processed_labels, processed_extras = self.process(preds, labels, extras)
+        return self.compute(processed_preds, processed_labels, bootstrap_cfg=bootstrap_cfg)
+
+    def compute(self, processed_preds: Sequence[Any], processed_labels: Sequence[Any], bootstrap_cfg: Optional[Dict[str, Any]] = None) -> Dict[str, Union[Sequence, float]]:
+        """
+        Metrics of processed preds and labels, see `eval`.
+        """
+
         results = {}
 
         for metrics_id, kwargs in self.metrics_cfg.items():
             metrics_fn = _supported_metrics[metrics_id]
             results[metrics_id] = metrics_fn(processed_labels, processed_preds, **kwargs)
+
+        if bootstrap_cfg is not None:
+            with profiler.span('eval:bootstrap'):
+                intervals = bootstrap_metrics(self.metrics_cfg, processed_labels, processed_preds, **bootstrap_cfg)
+            results.update({f"{metrics_id}:ci": interval for metrics_id, interval in intervals.items()})
         
         return results
+
+    def state(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, **kwargs) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Mergeable states of the metrics over the given samples (see `ours.evaluators.state`), e.g., for the shards of a run.
+        
+        Return:
+            {metrics_id: state}, state is None for metrics without mergeable state
+        """
+
+        processed_preds, processed_labels, processed_extras = self.process(preds, labels, extras)
+        return {metrics_id: get_metric_state(metrics_id, processed_labels, processed_preds, **kwargs) for metrics_id, kwargs in self.metrics_cfg.items()}
+
+    def update(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, **kwargs) -> None:
+        """
+        Incremental evaluation: add samples to the running metrics, e.g., each response as it is generated.
+        By default the mergeable metric states are accumulated (see `ours.evaluators.state.RunningMetrics`), evaluators may override
+        `update`/`finalize`/`reset` with their own running statistics.
+        """
+
+        processed_preds, processed_labels, processed_extras = self.process(preds, labels, extras)
+        self.accumulate(processed_preds, processed_labels)
+
+    def accumulate(self, processed_preds: Sequence[Any], processed_labels: Sequence[Any]) -> None:
+        """
+        Add processed preds and labels to the running metrics, see `update`.
+        """
+
+        if self.running is None:
+            self.running = RunningMetrics(self.metrics_cfg)
+        self.running.update(processed_labels, processed_preds)
+
+    def finalize(self) -> Dict[str, Any]:
+        """
+        Metrics of the samples added by `update` so far, metrics without mergeable state are missing.
+        """
+
+        return self.running.compute() if self.running is not None else {}
+
+    def reset(self) -> None:
+        self.running = None
     
     def __call__(self, *args: Any, **kwds: Any) -> Any:
         return self.eval(*args, **kwds)
@@ -106,7 +167,7 @@ class SequentialEvaluator:
             result.append(current)
         return result
 
-    def eval(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, **kwargs) -> Dict[str, Union[Sequence, float]]:
+    def eval(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, per_sample_results: Optional[Dict[str, Sequence]] = None, **kwargs) -> Dict[str, Union[Sequence, float]]:
         """
         Evaluate pipeline including data processing and metrics calculation.
         
@@ -114,6 +175,7 @@ class SequentialEvaluator:
             preds: responses from chatmodels
             labels: groundtruth labels
             extras: extra parameters
+            per_sample_results: dict filled with the per-sample values of the final evaluator, keyed like the results
             
         Return:
             results
@@ -122,15 +184,53 @@ class SequentialEvaluator:
         prefix_results = {}
         seq_len = len(self.evaluator_seq)
         for evaluator_idx, (evaluator, keyname_prefix) in enumerate(zip(self.evaluator_seq, self.keyname_prefix_seq)):
-            if evaluator_idx < seq_len - 1:
-                preds, labels, extras = evaluator.process(preds, labels, extras)
-                prefix_results.update({f"{keyname_prefix}:pred_no_op": preds})
-            else:
-                # final evaluator
-                results = evaluator(preds, labels, extras)
-                prefix_results.update({f"{keyname_prefix}:{key}": value for key, value in results.items()})
+            with profiler.span(f"eval:{keyname_prefix}"):
+                if evaluator_idx < seq_len - 1:
+                    preds, labels, extras = evaluator.process(preds, labels, extras)
+                    prefix_results.update({f"{keyname_prefix}:pred_no_op": preds})
+                else:
+                    # final evaluator
+                    evaluator_per_sample_results = {}
+                    results = evaluator(preds, labels, extras, per_sample_results=evaluator_per_sample_results, **kwargs)
+                    prefix_results.update({f"{keyname_prefix}:{key}": value for key, value in results.items()})
+                    if per_sample_results is not None:
+                        per_sample_results.update({f"{keyname_prefix}:{key}": value for key, value in evaluator_per_sample_results.items()})
         
         return prefix_results
+
+    def state(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, **kwargs) -> Dict[str, Dict[str, Any]]:
+        """
+        Mergeable metric states of the final evaluator, keyed like the results of `eval`.
+
+        Return:
+            {"<keyname prefix>:<metrics_id>": {"metric": metrics_id, "kwargs": metrics_kwargs, "state": state}}
+        """
+
+        for evaluator in self.evaluator_seq[:-1]:
+            preds, labels, extras = evaluator.process(preds, labels, extras)
+        evaluator, keyname_prefix = self.evaluator_seq[-1], self.keyname_prefix_seq[-1]
+        states = evaluator.state(preds, labels, extras)
+        return {f"{keyname_prefix}:{metrics_id}": {"metric": metrics_id, "kwargs": evaluator.metrics_cfg[metrics_id], "state": state}
+                for metrics_id, state in states.items()}
+
+    def update(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, **kwargs) -> None:
+        """
+        Incremental evaluation: process the samples with the cascaded evaluators and add them to the running metrics of the final evaluator.
+        """
+
+        for evaluator in self.evaluator_seq[:-1]:
+            preds, labels, extras = evaluator.process(preds, labels, extras)
+        self.evaluator_seq[-1].update(preds, labels, extras)
+
+    def finalize(self) -> Dict[str, Any]:
+        """
+        Running metrics of the final evaluator, keyed like the results of `eval`.
+        """
+
+        return {f"{self.keyname_prefix_seq[-1]}:{key}": value for key, value in self.evaluator_seq[-1].finalize().items()}
+
+    def reset(self) -> None:
+        self.evaluator_seq[-1].reset()
     
     def __call__(self, *args: Any, **kwds: Any) -> Any:
         return self.eval(*args, **kwds)
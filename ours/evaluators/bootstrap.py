@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional, Sequence
+from ours.evaluators.metrics import _supported_metrics
+from ours.evaluators.state import ConfusionState, _mergeable_metrics
+import numpy as np
+import warnings
+
+"""
+Bootstrap confidence intervals of metrics: the samples are resampled with replacement `num_resamples` times and the
+interval is given by the percentiles of the metric over the resamples.
+
+Metrics computed from confusion counts (see `ours.evaluators.state.ConfusionState`) are evaluated for all the resamples at once:
+samples with the same per-class outcomes are interchangeable, so a resample is a multinomial draw of the number of times
+each distinct outcome occurs, and the counts of a chunk of resamples are one matrix product. Other metrics are recomputed on each resample.
+"""
+
+# metrics without a meaningful interval
+_no_bootstrap = ["pred_no_op", "iou_judge"]
+
+# maximal number of resample weights held at once
+_MAX_CHUNK_ELEMENTS = 1 << 24
+
+
+def _stack(results: Sequence[Any]) -> Any:
+    # results of the resamples -> one array with a leading resample axis per leaf
+    if isinstance(results[0], dict):
+        return {key: _stack([result[key] for result in results]) for key in results[0]}
+    return np.asarray(results, dtype=np.float64)
+
+
+def _interval(values: Any, confidence: float) -> Any:
+    if isinstance(values, dict):
+        return {key: _interval(value, confidence) for key, value in values.items()}
+    values = np.asarray(values, dtype=np.float64)
+    alpha = (1 - confidence) / 2 * 100
+    low, high = np.nanpercentile(values, [alpha, 100 - alpha], axis=0)
+    return np.stack([low, high], axis=-1).tolist()
+
+
+def bootstrap_confusion(metrics_id: str, y_true: Any, y_pred: Any, num_resamples: int, rng: np.random.Generator, **kwargs) -> Any:
+    """
+    `metrics_id` over `num_resamples` resamples, with a leading resample axis per leaf of the results.
+    """
+    classes, tp, fp, fn, exact, multilabel = ConfusionState.outcomes(y_true, y_pred)
+    num_samples, num_classes = len(exact), len(classes)
+    outcomes = np.concatenate([tp, fp, fn, exact[:, None]], axis=1).astype(np.uint8)
+    # distinct outcomes and their frequencies, usually far fewer than the samples
+    outcomes, counts = np.unique(outcomes, axis=0, return_counts=True)
+    outcomes = outcomes.astype(np.float64)
+
+    _, metric_fn = _mergeable_metrics[metrics_id]
+    chunk_size = max(1, min(num_resamples, _MAX_CHUNK_ELEMENTS // len(outcomes)))
+    results = []
+    for start in range(0, num_resamples, chunk_size):
+        weights = rng.multinomial(num_samples, counts / num_samples, size=min(chunk_size, num_resamples - start))
+        totals = np.rint(weights @ outcomes).astype(np.int64)
+        state = ConfusionState(classes, tp=totals[:, :num_classes], fp=totals[:, num_classes:2 * num_classes], fn=totals[:, 2 * num_classes:3 * num_classes],
+                               num_samples=np.full(len(weights), num_samples), num_exact=totals[:, -1], multilabel=multilabel)
+        results.append(metric_fn(state, **kwargs))
+    return _concatenate(results)
+
+
+def _concatenate(chunks: List[Any]) -> Any:
+    # results of chunks of resamples, leaves with a leading resample axis
+    if isinstance(chunks[0], dict):
+        return {key: _concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+    return np.concatenate([np.asarray(chunk, dtype=np.float64) for chunk in chunks], axis=0)
+
+
+def bootstrap_metric(metrics_id: str, y_true: Any, y_pred: Any, num_resamples: int = 1000, confidence: float = 0.95, seed: Optional[int] = 0, **kwargs) -> Any:
+    """
+    Bootstrap confidence interval of a metric of `_supported_metrics`.
+
+    Arguments:
+        metrics_id: metric id
+        y_true, y_pred: arguments of the metric
+        num_resamples: number of bootstrap resamples
+        confidence: confidence level of the (percentile) interval
+        seed: seed of the resampling, for reproducible intervals
+        kwargs: metric kwargs
+
+    Return:
+        [low, high] for every value of the metric, in the structure of the metric results, e.g., {'micro': {'f1': [low, high], ...}, ...}
+    """
+    rng = np.random.default_rng(seed)
+    if _mergeable_metrics.get(metrics_id, (None,))[0] is ConfusionState:
+        return _interval(bootstrap_confusion(metrics_id, y_true, y_pred, num_resamples, rng, **kwargs), confidence)
+
+    metrics_fn = _supported_metrics[metrics_id]
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    num_samples = len(y_pred)
+    chunk_size = max(1, min(num_resamples, _MAX_CHUNK_ELEMENTS // max(num_samples, 1)))
+    results = []
+    for start in range(0, num_resamples, chunk_size):
+        for indices in rng.integers(0, num_samples, (min(chunk_size, num_resamples - start), num_samples)):
+            results.append(metrics_fn(y_true[indices], y_pred[indices], **kwargs))
+    return _interval(_stack(results), confidence)
+
+
+def bootstrap_metrics(metrics_cfg: Dict[str, Any], y_true: Any, y_pred: Any, num_resamples: int = 1000, confidence: float = 0.95,
+                      seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    Bootstrap confidence intervals of the metrics of an evaluator, format of `metrics_cfg`: {metrics_id: metrics_kwargs, ...}
+    """
+    intervals = {}
+    for metrics_id, kwargs in metrics_cfg.items():
+        if metrics_id in _no_bootstrap:
+            continue
+        try:
+            intervals[metrics_id] = bootstrap_metric(metrics_id, y_true, y_pred, num_resamples=num_resamples, confidence=confidence, seed=seed, **(kwargs or {}))
+        except (TypeError, ValueError) as e:
+            warnings.warn(f"No bootstrap interval for {metrics_id}: {e!r}")
+    return intervals
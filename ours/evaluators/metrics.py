@@ -1,5 +1,6 @@
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from typing import Optional, Union
+from ours.evaluators.state import ConfusionState
+from typing import Optional, Union, List
 import numpy as np
 import scipy
 import json
@@ -41,6 +42,21 @@ def failure(y_true, y_pred, fails_num: Optional[Union[float, int]] = np.nan):
         failure = (x == fails_num).sum() / x.size
     return failure
 
+def specificity_score(y_true, y_pred, average: Optional[str] = 'binary', pos_label=1, zero_division: Union[str, float] = 'warn'):
+    # true negative rate, same arguments as sklearn's precision_score
+    return ConfusionState.from_arrays(y_true, y_pred).specificity(average=average, pos_label=pos_label, zero_division=zero_division)
+
+def subset_accuracy(y_true, y_pred):
+    # proportion of samples whose labels are all predicted correctly
+    return ConfusionState.from_arrays(y_true, y_pred).accuracy()
+
+def multilabel_report(y_true, y_pred, target_names: Optional[List[str]] = None, zero_division: Union[str, float] = 'warn'):
+    """
+    Per-class TP/FP/FN/TN counts of 2d indicator arrays computed once, and every score derived from them:
+    subset accuracy, micro, macro and per-class precision, recall, f1 and specificity (with support).
+    """
+    return ConfusionState.from_arrays(y_true, y_pred).report(target_names=target_names, zero_division=zero_division)
+
 def parse_box_string(box_str):
     # Remove triple quotes and any additional newline characters
     box_str = box_str.replace("'''", "").replace("\n", "").strip("[]")
@@ -102,6 +118,9 @@ _supported_metrics = {
     "precision_score": precision_score,
     "recall_score": recall_score, 
     "f1_score": f1_score,
+    "specificity_score": specificity_score,
+    "subset_accuracy": subset_accuracy,
+    "multilabel_report": multilabel_report,
     "pearson_corr": pearson_corr,
     "failure": failure,
     "iou_judge": iou_judge
@@ -1,10 +1,85 @@
-from typing import Any, Sequence, List, Tuple, Dict
+from typing import Any, Sequence, List, Tuple, Dict, Optional
 from ours.evaluators.base import BaseEvaluator
+from ours.datasets.store import LabelMatrix
 from ours.utils.registry import registry
+from operator import itemgetter
 import re
 import numpy as np
 import json
 
+try:
+    import orjson
+    _loads = orjson.loads
+    _JSONDecodeError = (orjson.JSONDecodeError, ValueError)
+except ImportError:
+    _loads = json.loads
+    _JSONDecodeError = (json.JSONDecodeError, ValueError)
+
+_CODE_FENCE = re.compile(r"```json|```")
+_decoder = json.JSONDecoder()
+
+
+def parse_json_answer(pred: Any) -> Optional[Dict[str, Any]]:
+    """
+    JSON object answered by a model, None if there is none. Code fences are removed, and text around the object
+    (e.g., an explanation after it) is tolerated.
+    """
+    if not isinstance(pred, str):
+        return None
+    if "`" in pred:
+        pred = _CODE_FENCE.sub("", pred)
+    pred = pred.strip()
+    try:
+        answer = _loads(pred)
+    except _JSONDecodeError:
+        start = pred.find("{")
+        if start < 0:
+            return None
+        try:
+            answer, _ = _decoder.raw_decode(pred, start)
+        except json.JSONDecodeError:
+            return None
+    return answer if isinstance(answer, dict) else None
+
+
+def _to_floats(values: Sequence[Any]) -> np.ndarray:
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return np.full(len(values), np.nan)
+
+
+def to_label_matrix(answers: Sequence[Optional[Dict[str, Any]]], label_names: Sequence[str], failures: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    int matrix of the answers, one column per label name, missing labels are 0.
+    Rows of answers that are None or hold values that are not numbers are left 0 and marked in `failures`, if given.
+    """
+    matrix = np.zeros((len(answers), len(label_names)), dtype=int)
+    rows = [i for i, answer in enumerate(answers) if answer is not None]
+    # answers usually hold all the labels (structured output), look them up at once
+    getter = itemgetter(*label_names) if len(label_names) > 1 else (lambda answer: (answer[label_names[0]],))
+    values = []
+    for i in rows:
+        try:
+            values.append(getter(answers[i]))
+        except KeyError:
+            values.append([answers[i].get(name, 0) for name in label_names])
+    try:
+        parsed = np.array(values, dtype=float).reshape(len(rows), len(label_names))
+    except (TypeError, ValueError):
+        # e.g., {"Edema": "yes"}, only the rows at fault are invalid
+        parsed = np.array([_to_floats(row) for row in values]).reshape(len(rows), len(label_names))
+    rows = np.array(rows, dtype=np.int64)
+    invalid = ~np.isfinite(parsed).all(axis=1)
+    if invalid.any() and failures is None:
+        raise ValueError(f"Labels of rows {rows[invalid].tolist()} are not numbers.")
+    matrix[rows[~invalid]] = parsed[~invalid]
+    if failures is not None:
+        failures[:] = True
+        failures[rows[~invalid]] = False
+    return matrix
+
+
 @registry.register_evaluator()
 class CheXpertKeywordEvaluator(BaseEvaluator):
     evaluator_ids: List[str] = ['rule_chexpert_eval']
@@ -23,43 +98,72 @@ class CheXpertKeywordEvaluator(BaseEvaluator):
             "Fracture": ["fracture", "broken rib"],
             "Support Devices": ["pacemaker", "tube", "catheter"],
         }
+        # 在线评估中累计的解析失败数, 见 `update`
+        self.num_parse_failures = 0
+        self.num_updated = 0
+        # 多标签报告默认以病症名称标注各列
+        if 'multilabel_report' in self.metrics_cfg:
+            self.metrics_cfg = {**self.metrics_cfg, 'multilabel_report': {'target_names': list(self.keyword_map.keys()), **(self.metrics_cfg['multilabel_report'] or {})}}
 
     def process(self, preds: Sequence[Any], labels: Sequence[Any], extras: Sequence[Any]) -> Tuple[Sequence[Any], Sequence[Any]]:
         """
         preds: 模型生成的文本描述
-        labels: 数据集标签（例如 [{'Cardiomegaly': 1, 'Edema': 0, ...}, ...])
+        labels: 数据集标签（例如 [{'Cardiomegaly': 1, 'Edema': 0, ...}, ...]), 或 LabelMatrix
         extras: 额外信息（可忽略）
+
+        无法解析的预测记为全 0, 解析失败的 mask 见 `process_with_failures`
+        """
+        processed_preds, processed_labels, extras, _ = self.process_with_failures(preds, labels, extras)
+        return processed_preds, processed_labels, extras
+
+    def process_with_failures(self, preds: Sequence[Any], labels: Sequence[Any], extras: Sequence[Any]) -> Tuple[Sequence[Any], Sequence[Any], Sequence[Any], np.ndarray]:
+        """
+        同 `process`, 另外返回解析失败的 bool mask (不保存在对象上, 多线程/在线评估可同时调用)
         """
         label_names = list(self.keyword_map.keys())  # 保持固定顺序
-        num_labels = len(label_names)
-
-        y_pred = []
-        y_true = []
-
-        for pred, label_dict in zip(preds, labels):
-            pred_vec = np.zeros(num_labels, dtype=int)
-            true_vec = np.zeros(num_labels, dtype=int)
-
-            # 1️⃣ 处理预测结果
-            if isinstance(pred, str):
-                pred_clean = re.sub(r"```json|```", "", pred).strip()
-                try:
-                    pred_dict = json.loads(pred_clean)
-                    for i, disease in enumerate(label_names):
-                        pred_vec[i] = int(pred_dict.get(disease, 0))
-                except Exception as e:
-                    print(f"⚠️ JSON parse error: {e} → default 0s")
-            else:
-                print(f"⚠️ Unexpected pred type: {type(pred)}")
-
-            # 2️⃣ 处理真实标签
-            for i, disease in enumerate(label_names):
-                true_vec[i] = int(label_dict.get(disease, 0))
-
-            y_pred.append(pred_vec)
-            y_true.append(true_vec)
-
-        processed_preds = np.array(y_pred)
-        processed_labels = np.array(y_true)
-
-        return processed_preds, processed_labels, extras
\ No newline at end of file
+
+        # 1️⃣ 处理预测结果 (逐样本的在线评估也会调用, 不在这里打印)
+        parse_failures = np.zeros(len(preds), dtype=bool)
+        processed_preds = to_label_matrix([parse_json_answer(pred) for pred in preds], label_names, parse_failures)
+
+        # 2️⃣ 处理真实标签, 列式标签 (LabelMatrix) 直接按列选取
+        if isinstance(labels, LabelMatrix):
+            processed_labels = labels.select(label_names)
+        else:
+            processed_labels = to_label_matrix(list(labels), label_names)
+
+        return processed_preds, processed_labels, extras, parse_failures
+
+    def eval(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, bootstrap_cfg: Optional[Dict[str, Any]] = None,
+             per_sample_results: Optional[Dict[str, Sequence]] = None, **kwargs) -> Dict[str, Any]:
+        """
+        在指标之外返回解析失败率 `parse_failure_rate`, 逐样本的解析失败 `parse_failure` 写入 `per_sample_results` (随逐样本结果写入日志)
+        """
+        processed_preds, processed_labels, _, parse_failures = self.process_with_failures(preds, labels, extras)
+        results = self.compute(processed_preds, processed_labels, bootstrap_cfg=bootstrap_cfg)
+        if parse_failures.any():
+            print(f"⚠️ {parse_failures.sum()}/{len(preds)} predictions could not be parsed → default 0s, see `parse_failure` in the per-sample results")
+        results['parse_failure_rate'] = float(parse_failures.mean()) if len(parse_failures) else 0.0
+        if per_sample_results is not None:
+            per_sample_results['parse_failure'] = parse_failures.tolist()
+        return results
+
+    def update(self, preds: Sequence[Any], labels: Optional[Sequence[Any]] = None, extras: Optional[Sequence[Any]] = None, **kwargs) -> None:
+        """
+        在运行指标之外累计解析失败数, `finalize` 给出目前为止的 `parse_failure_rate`
+        """
+        processed_preds, processed_labels, _, parse_failures = self.process_with_failures(preds, labels, extras)
+        self.accumulate(processed_preds, processed_labels)
+        self.num_parse_failures += int(parse_failures.sum())
+        self.num_updated += len(preds)
+
+    def finalize(self) -> Dict[str, Any]:
+        results = super().finalize()
+        if self.num_updated:
+            results['parse_failure_rate'] = self.num_parse_failures / self.num_updated
+        return results
+
+    def reset(self) -> None:
+        super().reset()
+        self.num_parse_failures = 0
+        self.num_updated = 0
@@ -0,0 +1,287 @@
+from typing import Any, Dict, List, Optional, Sequence, Union
+import numpy as np
+
+"""
+Mergeable metric states: sufficient statistics of a metric over a subset of the samples (e.g., one shard of a run),
+such that the states of disjoint subsets merge into the state of their union and the metric computed from the merged
+state equals the metric computed over all the samples at once.
+"""
+
+
+def _to_list(values: Any) -> List[Any]:
+    return np.asarray(values).tolist()
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray, zero_division: Union[str, float]) -> np.ndarray:
+    # sklearn semantics: 'warn' behaves as 0
+    fill = 0.0 if zero_division == 'warn' else float(zero_division)
+    numerator, denominator = np.asarray(numerator, dtype=np.float64), np.asarray(denominator, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = numerator / denominator
+    return np.where(denominator == 0, fill, result)
+
+
+def _to_output(values: np.ndarray) -> Union[float, List[float]]:
+    return float(values) if np.ndim(values) == 0 else values.tolist()
+
+
+class ConfusionState:
+    """
+    Per-class true positive, false positive and false negative counts, with the number of samples and of exact matches.
+
+    Multi-label targets (2d indicator arrays) have one class per column, other targets one class per label value.
+    Classification metrics computed from the counts are identical to sklearn's accuracy/precision/recall/f1 scores.
+
+    A batch of states (e.g., bootstrap resamples, see `ours.evaluators.bootstrap`) has counts of shape (batch size, classes)
+    and `num_samples`/`num_exact` of shape (batch size,), its metrics have a leading batch axis.
+    """
+
+    def __init__(self, classes: Sequence[Any], tp: Sequence[int], fp: Sequence[int], fn: Sequence[int], num_samples: Union[int, Sequence[int]],
+                 num_exact: Union[int, Sequence[int]], multilabel: bool) -> None:
+        self.classes = list(classes)
+        self.tp = np.asarray(tp, dtype=np.int64)
+        self.fp = np.asarray(fp, dtype=np.int64)
+        self.fn = np.asarray(fn, dtype=np.int64)
+        self.num_samples = np.asarray(num_samples, dtype=np.int64)
+        self.num_exact = np.asarray(num_exact, dtype=np.int64)
+        self.multilabel = multilabel
+
+    @staticmethod
+    def outcomes(y_true: Any, y_pred: Any) -> tuple:
+        """
+        Per-sample outcomes: classes, (samples, classes) tp/fp/fn indicators, per-sample exact matches and whether targets are multi-label.
+        """
+        y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+        assert y_true.shape == y_pred.shape, f"Shapes of y_true {y_true.shape} and y_pred {y_pred.shape} differ."
+        if y_true.ndim == 2:
+            classes, true, pred, exact = list(range(y_true.shape[1])), y_true == 1, y_pred == 1, (y_true == y_pred).all(axis=1)
+        else:
+            classes = np.union1d(y_true, y_pred)
+            true, pred, exact = y_true[:, None] == classes, y_pred[:, None] == classes, y_true == y_pred
+            classes = _to_list(classes)
+        return classes, true & pred, ~true & pred, true & ~pred, exact, y_true.ndim == 2
+
+    @classmethod
+    def from_arrays(cls, y_true: Any, y_pred: Any) -> "ConfusionState":
+        classes, tp, fp, fn, exact, multilabel = cls.outcomes(y_true, y_pred)
+        return cls(classes=classes, tp=tp.sum(0), fp=fp.sum(0), fn=fn.sum(0), num_samples=len(exact), num_exact=exact.sum(), multilabel=multilabel)
+
+    def merge(self, other: "ConfusionState") -> "ConfusionState":
+        # e.g., a shard without samples
+        if other.num_samples == 0:
+            return self
+        if self.num_samples == 0:
+            return other
+        assert self.multilabel == other.multilabel, "Cannot merge multi-label and single-label confusion counts."
+        if self.multilabel:
+            assert len(self.classes) == len(other.classes), "Multi-label confusion counts must have the same number of classes."
+            classes = self.classes
+        else:
+            classes = sorted(set(self.classes) | set(other.classes))
+        counts = {}
+        for name in ['tp', 'fp', 'fn']:
+            merged = dict.fromkeys(classes, 0)
+            for state in [self, other]:
+                for c, count in zip(state.classes, getattr(state, name)):
+                    merged[c] += int(count)
+            counts[name] = [merged[c] for c in classes]
+        return ConfusionState(classes, num_samples=self.num_samples + other.num_samples, num_exact=self.num_exact + other.num_exact,
+                              multilabel=self.multilabel, **counts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'classes': _to_list(self.classes),
+            'tp': self.tp.tolist(),
+            'fp': self.fp.tolist(),
+            'fn': self.fn.tolist(),
+            'num_samples': self.num_samples.tolist(),
+            'num_exact': self.num_exact.tolist(),
+            'multilabel': self.multilabel,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConfusionState":
+        return cls(**data)
+
+    def accuracy(self, normalize: bool = True) -> Union[float, List[float]]:
+        # subset accuracy for multi-label targets
+        if not normalize:
+            return _to_output(self.num_exact.astype(np.float64))
+        return _to_output(_divide(self.num_exact, self.num_samples, 0))
+
+    @property
+    def tn(self) -> np.ndarray:
+        # one-vs-rest for single-label targets
+        return self.num_samples[..., None] - self.tp - self.fp - self.fn
+
+    def _counts(self, average: Optional[str], pos_label: Any) -> tuple:
+        if average == 'binary':
+            assert not self.multilabel, "average='binary' is not supported for multi-label targets."
+            assert set(self.classes) <= {0, 1, pos_label}, f"average='binary' needs binary targets, got classes {self.classes}."
+            if pos_label not in self.classes:
+                zeros = np.zeros_like(self.num_samples[..., None])
+                return zeros, zeros, zeros, self.num_samples[..., None]
+            i = self.classes.index(pos_label)
+            return self.tp[..., i:i + 1], self.fp[..., i:i + 1], self.fn[..., i:i + 1], self.tn[..., i:i + 1]
+        if average == 'micro':
+            return tuple(counts.sum(axis=-1, keepdims=True) for counts in [self.tp, self.fp, self.fn, self.tn])
+        return self.tp, self.fp, self.fn, self.tn
+
+    def _average(self, scores: np.ndarray, average: Optional[str]) -> Union[float, List[float]]:
+        if average is None:
+            return scores.tolist()
+        if average == 'weighted':
+            support = self.tp + self.fn
+            return _to_output(_divide((scores * support).sum(axis=-1), support.sum(axis=-1), 0))
+        if average in ['binary', 'micro', 'macro']:
+            return _to_output(scores.mean(axis=-1))
+        raise NotImplementedError(f"average='{average}' cannot be computed from confusion counts.")
+
+    def precision(self, average: Optional[str] = 'binary', pos_label: Any = 1, zero_division: Union[str, float] = 'warn') -> Union[float, List[float]]:
+        tp, fp, fn, tn = self._counts(average, pos_label)
+        return self._average(_divide(tp, tp + fp, zero_division), average)
+
+    def recall(self, average: Optional[str] = 'binary', pos_label: Any = 1, zero_division: Union[str, float] = 'warn') -> Union[float, List[float]]:
+        tp, fp, fn, tn = self._counts(average, pos_label)
+        return self._average(_divide(tp, tp + fn, zero_division), average)
+
+    def f1(self, average: Optional[str] = 'binary', pos_label: Any = 1, zero_division: Union[str, float] = 'warn') -> Union[float, List[float]]:
+        tp, fp, fn, tn = self._counts(average, pos_label)
+        return self._average(_divide(2 * tp, 2 * tp + fp + fn, zero_division), average)
+
+    def specificity(self, average: Optional[str] = 'binary', pos_label: Any = 1, zero_division: Union[str, float] = 'warn') -> Union[float, List[float]]:
+        # true negative rate, TN / (TN + FP)
+        tp, fp, fn, tn = self._counts(average, pos_label)
+        return self._average(_divide(tn, tn + fp, zero_division), average)
+
+    def report(self, target_names: Optional[Sequence[str]] = None, zero_division: Union[str, float] = 'warn') -> Dict[str, Any]:
+        """
+        Subset accuracy, and micro, macro and per-class precision, recall, f1 and specificity, all derived from the same counts.
+
+        target_names: names of the classes in the per-class results, e.g., the label names of the columns of multi-label targets
+        """
+        names = list(target_names) if target_names is not None else [str(c) for c in self.classes]
+        assert len(names) == len(self.classes), f"{len(names)} target names for {len(self.classes)} classes."
+        scores = {}
+        for average in ['micro', 'macro', None]:
+            scores[average] = {
+                'precision': self.precision(average=average, zero_division=zero_division),
+                'recall': self.recall(average=average, zero_division=zero_division),
+                'f1': self.f1(average=average, zero_division=zero_division),
+                'specificity': self.specificity(average=average, zero_division=zero_division),
+            }
+        per_class = {key: np.asarray(values) for key, values in scores[None].items()}
+        per_class['support'] = self.tp + self.fn
+        return {
+            'subset_accuracy': self.accuracy(),
+            'micro': scores['micro'],
+            'macro': scores['macro'],
+            'per_class': {name: {key: values[..., i].tolist() for key, values in per_class.items()} for i, name in enumerate(names)},
+        }
+
+
+class SumState:
+    """
+    Sum, count and number of given failure values of predictions, for pred_sum, pred_mean and failure.
+    """
+
+    def __init__(self, total: float = 0.0, count: int = 0, num_nan: int = 0, num_fails: Optional[Dict[str, int]] = None) -> None:
+        self.total = float(total)
+        self.count = int(count)
+        self.num_nan = int(num_nan)
+        self.num_fails = dict(num_fails or {})
+
+    @classmethod
+    def from_arrays(cls, y_true: Any, y_pred: Any, fails_num: Optional[float] = None) -> "SumState":
+        x = np.asarray(y_pred, dtype=np.float64)
+        num_fails = {} if fails_num is None or np.isnan(fails_num) else {str(float(fails_num)): int((x == fails_num).sum())}
+        return cls(total=x.sum(), count=x.size, num_nan=np.isnan(x).sum(), num_fails=num_fails)
+
+    def merge(self, other: "SumState") -> "SumState":
+        num_fails = dict(self.num_fails)
+        for key, value in other.num_fails.items():
+            num_fails[key] = num_fails.get(key, 0) + value
+        return SumState(self.total + other.total, self.count + other.count, self.num_nan + other.num_nan, num_fails)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'total': self.total, 'count': self.count, 'num_nan': self.num_nan, 'num_fails': self.num_fails}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SumState":
+        return cls(**data)
+
+    def failure(self, fails_num: Optional[float] = np.nan) -> float:
+        if fails_num is None or np.isnan(fails_num):
+            return self.num_nan / self.count
+        return self.num_fails[str(float(fails_num))] / self.count
+
+
+# metric id -> (state class, metric computed from the state)
+_mergeable_metrics = {
+    "accuracy_score": (ConfusionState, lambda state, **kwargs: state.accuracy(**kwargs)),
+    "precision_score": (ConfusionState, lambda state, **kwargs: state.precision(**kwargs)),
+    "recall_score": (ConfusionState, lambda state, **kwargs: state.recall(**kwargs)),
+    "f1_score": (ConfusionState, lambda state, **kwargs: state.f1(**kwargs)),
+    "specificity_score": (ConfusionState, lambda state, **kwargs: state.specificity(**kwargs)),
+    "subset_accuracy": (ConfusionState, lambda state: state.accuracy()),
+    "multilabel_report": (ConfusionState, lambda state, **kwargs: state.report(**kwargs)),
+    "pred_sum": (SumState, lambda state: state.total),
+    "pred_mean": (SumState, lambda state: state.total / state.count),
+    "failure": (SumState, lambda state, **kwargs: state.failure(**kwargs)),
+}
+
+
+def _state_from_arrays(metrics_id: str, y_true: Any, y_pred: Any, **kwargs) -> Union[ConfusionState, SumState]:
+    state_cls, _ = _mergeable_metrics[metrics_id]
+    if state_cls is SumState:
+        return SumState.from_arrays(y_true, y_pred, fails_num=kwargs.get('fails_num'))
+    return state_cls.from_arrays(y_true, y_pred)
+
+
+def get_metric_state(metrics_id: str, y_true: Any, y_pred: Any, **kwargs) -> Optional[Dict[str, Any]]:
+    """
+    Mergeable state of a metric over the given samples, None if the metric has no mergeable state.
+    """
+    if metrics_id not in _mergeable_metrics:
+        return None
+    return _state_from_arrays(metrics_id, y_true, y_pred, **kwargs).to_dict()
+
+
+def merge_metric_states(metrics_id: str, states: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    state_cls, _ = _mergeable_metrics[metrics_id]
+    merged = state_cls.from_dict(states[0])
+    for state in states[1:]:
+        merged = merged.merge(state_cls.from_dict(state))
+    return merged.to_dict()
+
+
+def compute_metric(metrics_id: str, state: Dict[str, Any], **kwargs) -> Any:
+    state_cls, metric_fn = _mergeable_metrics[metrics_id]
+    return metric_fn(state_cls.from_dict(state), **kwargs)
+
+
+class RunningMetrics:
+    """
+    Running states of metrics updated with batches of samples, e.g., while responses are generated.
+    Memory does not grow with the number of samples, metrics without mergeable state are not computed.
+    """
+
+    def __init__(self, metrics_cfg: Dict[str, Any]) -> None:
+        """
+        metrics_cfg: format: {metrics_id: metrics_kwargs, ...}
+        """
+        self.metrics_cfg = {metrics_id: kwargs or {} for metrics_id, kwargs in metrics_cfg.items() if metrics_id in _mergeable_metrics}
+        self.unsupported = [metrics_id for metrics_id in metrics_cfg if metrics_id not in _mergeable_metrics]
+        self.states: Dict[str, Union[ConfusionState, SumState]] = {}
+        self.num_samples = 0
+
+    def update(self, y_true: Any, y_pred: Any) -> None:
+        for metrics_id, kwargs in self.metrics_cfg.items():
+            state = _state_from_arrays(metrics_id, y_true, y_pred, **kwargs)
+            self.states[metrics_id] = self.states[metrics_id].merge(state) if metrics_id in self.states else state
+        self.num_samples += len(y_pred)
+
+    def compute(self) -> Dict[str, Any]:
+        if self.num_samples == 0:
+            return {}
+        return {metrics_id: _mergeable_metrics[metrics_id][1](self.states[metrics_id], **kwargs) for metrics_id, kwargs in self.metrics_cfg.items()}
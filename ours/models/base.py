@@ -1,6 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
+import asyncio
+import threading
+from ours.utils.structured_output import STRUCTURED_OUTPUT_MODES, build_response_format, next_mode, is_response_format_error
+
+# guards the downgrades of `BaseChat.structured_output_state`, which concurrent requests may trigger at once
+_structured_output_lock = threading.Lock()
 
 
 class BaseChat(ABC):
@@ -11,10 +17,13 @@ class BaseChat(ABC):
     model_id: str = ''   # ID for a chat model, e.g., minigpt-4-vicuna-7b-v0
     model_arch: str = '' # Architecture of the model, e.g., minigpt-4
     model_family: List[str] = [] # List of available model_ids
+    thread_safe: bool = False # Whether `chat` can be called from several threads on the same instance
     
     
     def __init__(self, model_id:str) -> None:
         self.model_id = model_id
+        # structured output mode, in a dict shared by the shallow copies of the model (see `ours.tasks.sweep.ModelPool`)
+        self.structured_output_state: Dict[str, str] = {}
         assert self.model_id in self.model_family, f"Model {self.model_id} is not available. Only models in {self.model_family} can be used."
     
     
@@ -42,9 +51,86 @@ class BaseChat(ABC):
             max_new_tokens: int, maximal number of tokens to be generated
             stop_sequences: str/List[str], stop words where the model will stop generating further tokens
             output_scores: bool, whether return the logits of the generated tokens (not very practical)
+            stream: bool, receive the response as a stream of chunks (OpenAI-compatible models)
+            completion_detector: str, stop the stream as soon as the answer is complete, e.g., json_object
+            output_schema: dict, JSON schema of the answer, sent as `response_format` to providers supporting it
         """
         raise NotImplementedError
     
+    async def achat(self, 
+                    messages: List, 
+                    **generation_kwargs,
+                    ) -> "Response":
+        """
+        Asynchronous version of `chat`, used by the async generation mode of BaseTask.
+        
+        Subclasses with an async client (e.g., AsyncOpenAI) should override it. The default implementation 
+        runs the blocking `chat` in a worker thread so that every chat model can be driven from an event loop.
+        """
+        assert self.thread_safe, f"{self.__class__.__name__} is not thread safe, use the 'thread' executor instead of 'async'."
+        return await asyncio.to_thread(self.chat, messages, **generation_kwargs)
+
+    async def abuild_request(self, messages: List, **generation_kwargs) -> Dict[str, Any]:
+        """
+        `build_request` from a coroutine: images not encoded by the dataloader (no `encoded_image` in the content)
+        are read and encoded in a worker thread instead of blocking the event loop.
+        """
+        if any(isinstance(message['content'], dict) and message['content'].get('image_path') and 'encoded_image' not in message['content']
+               for message in messages):
+            return await asyncio.to_thread(self.build_request, messages, **generation_kwargs)
+        return self.build_request(messages, **generation_kwargs)
+
+    def stream_options(self, generation_kwargs: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """
+        Streaming settings of a request, read from the generation kwargs with the model config as fallback:
+            stream: bool, receive the response as a stream of chunks
+            completion_detector: str, name of a detector in `ours.utils.stream` (e.g., json_object) closing the stream once the answer is complete
+        """
+        model_config = getattr(self, 'model_config', None) or {}
+        stream = generation_kwargs.get('stream', model_config.get('stream', False))
+        detector_name = generation_kwargs.get('completion_detector', model_config.get('completion_detector'))
+        return stream, detector_name
+
+    def structured_output_mode(self) -> str:
+        """
+        How answer schemas are sent to the provider: 'json_schema', 'json_object' or 'none' (prompt-only),
+        taken from `structured_output` in the model config and downgraded when the provider rejects it.
+        """
+        if 'mode' not in self.structured_output_state:
+            model_config = getattr(self, 'model_config', None) or {}
+            self.structured_output_state['mode'] = model_config.get('structured_output', 'json_schema')
+        return self.structured_output_state['mode']
+
+    def response_format(self, generation_kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        `response_format` of a request, None when no `output_schema` is given or in prompt-only mode.
+        """
+        output_schema = generation_kwargs.get('output_schema')
+        if output_schema is None:
+            return None
+        return build_response_format(self.structured_output_mode(), output_schema)
+
+    def fallback_response_format(self, raw_request: Dict[str, Any], generation_kwargs: Dict[str, Any], error: BaseException) -> bool:
+        """
+        Called when a request was rejected with a 400: if it was rejected because of its structured output, downgrade
+        the mode of this model below the one of the request (json_schema -> json_object -> none), update `raw_request`
+        in place and return True to send it again. Other errors return False and should be raised.
+        """
+        if 'response_format' not in raw_request or not is_response_format_error(error):
+            return False
+        # the mode of the rejected request, not the current one: concurrent rejections must not skip a mode
+        mode = next_mode(raw_request['response_format']['type'])
+        with _structured_output_lock:
+            if STRUCTURED_OUTPUT_MODES.index(mode) > STRUCTURED_OUTPUT_MODES.index(self.structured_output_mode()):
+                print(f"[{self.model_id}] response_format rejected ({error}), falling back to structured output mode '{mode}'.")
+                self.structured_output_state['mode'] = mode
+        response_format = self.response_format(generation_kwargs)
+        if response_format is None:
+            raw_request.pop('response_format')
+        else:
+            raw_request['response_format'] = response_format
+        return True
+    
 
 
 
@@ -61,6 +147,24 @@ class Response:
     # The log probabilities of the output tokens
     
     finish_reason: Optional[str]
+
+    ttft: Optional[float] = None
+    # Seconds from sending the request to the first content token, only measured for streamed responses
+
+    prompt_tokens: Optional[int] = None
+    # Number of prompt tokens billed by the provider, None if not reported
+
+    completion_tokens: Optional[int] = None
+    # Number of generated tokens, None if not reported
+
+    cached_tokens: Optional[int] = None
+    # Prompt tokens served from the provider-side prefix cache, None if not reported
+
+    latency: Optional[float] = None
+    # Wall-clock seconds spent in `chat`, including rate limiting and retries
+
+    from_cache: bool = False
+    # Whether the response was served by the local response cache
     
 
     @classmethod
@@ -1,39 +1,14 @@
-from typing import List, Dict, Any, Literal
+from typing import List, Dict, Any, Literal, Optional
 import anthropic
 import yaml
-from mmte.utils.registry import registry
+from ours.utils.registry import registry
 from ours.models.base import BaseChat, Response
 from ours.utils.utils import get_abs_path
+from ours.utils.image import get_encoded_image
+from ours.utils.usage import get_token_usage
 import os
-import base64
 import time
-import io
 import httpx
-from PIL import Image
-import imghdr
-
-def encode_image(image_path: str):
-    buffer = io.BytesIO()
-        
-    img = Image.open(image_path).convert('RGB')
-    print(img.size)
-    if img.width>400 or img.height>400:
-        if img.width > img.height:
-            new_width = 400
-            concat = float(new_width/float(img.width))
-            new_height = int((float(img.height)*float(concat)))
-        else:
-            new_height = 400
-            concat = float(new_height/float(img.height))
-            new_width = int((float(img.width)*float(concat)))
-        img = img.resize((new_width, new_height), Image.LANCZOS)
-    
-    format = imghdr.what(image_path)
-    if not format:
-        format = 'JPEG'
-    img.save(buffer, format=format)
-    img_data = base64.b64encode(buffer.getvalue())
-    return img_data.decode('utf-8')
 
 @registry.register_chatmodel()
 class ClaudeChat(BaseChat):
@@ -46,12 +21,15 @@ class ClaudeChat(BaseChat):
     model_family = list(MODEL_CONFIG.keys())
     
     model_arch = 'claude'
+    thread_safe = True # the client is shared across threads, no global state is mutated
     
-    def __init__(self, model_id: str="claude-3-sonnet-20240229", **kargs):
+    def __init__(self, model_id: str = "claude-3-sonnet-20240229", model_cfg: Optional[Dict[str, Any]] = None, **kargs):
         super().__init__(model_id=model_id)
         config = self.MODEL_CONFIG[self.model_id]
         with open(get_abs_path(config)) as f:
             self.model_config = yaml.load(f, Loader=yaml.FullLoader)
+        # overrides from the task config, e.g., base_url of a local server
+        self.model_config.update(model_cfg or {})
         
         api_key = os.getenv('anthropic_apikey', '')
         assert api_key, "anthropic_apikey is empty"
@@ -61,24 +39,25 @@ class ClaudeChat(BaseChat):
         self.timeout = self.model_config.get('timeout', 1)
         
     def chat(self, messages: List[Dict[str, Any]], **generation_kwargs):
+        start_time = time.perf_counter()
         conversation = []
+        system_prompts = []
         for message in messages:
-            if message["role"] in ["system", "user", "assistant"]:
+            if message["role"] == "system" and isinstance(message['content'], str):
+                # the messages API takes system prompts as a top-level parameter
+                system_prompts.append(message['content'])
+            elif message["role"] in ["system", "user", "assistant"]:
                 if isinstance(message['content'], dict):
                     # multimodal content
                     text = message['content']['text']
-                    image_data = encode_image(message['content']['image_path'])
-                    format = imghdr.what(message['content']['image_path'])
-                    if not format:
-                        format = 'jpeg'
-                    image_media_type = "image/{}".format(format)
+                    encoded_image = get_encoded_image(message['content'])
                     content = [
                         {
                             "type": "image",
                             "source": {
                                 "type": "base64",
-                                "media_type": image_media_type,
-                                "data": image_data
+                                "media_type": encoded_image.mime_type,
+                                "data": encoded_image.data
                             }
                         },
                         {
@@ -86,6 +65,9 @@ class ClaudeChat(BaseChat):
                             "text": text
                         }
                     ]
+                    if not text:
+                        # the instructions were moved to a system message by the 'system' prompt layout
+                        content = content[:1]
                 else:
                     text = message['content']
                     content = [
@@ -105,6 +87,8 @@ class ClaudeChat(BaseChat):
             "max_tokens": generation_kwargs.get("max_new_tokens"),
             "temperature": 0,
         }
+        if system_prompts:
+            raw_request["system"] = "\n".join(system_prompts)
 
 
         
@@ -117,9 +101,10 @@ class ClaudeChat(BaseChat):
                 response = f"Error in generation: {e}"
                 time.sleep(self.timeout)
         if isinstance(response, str):
-            return Response(self.model_id, response, None, None)
+            return Response(self.model_id, response, None, None, latency=time.perf_counter() - start_time)
         response_message = response.content[0].text
         finish_reason = response.stop_reason
         logprobs = None
         
-        return Response(self.model_id, response_message, logprobs, finish_reason)
+        return Response(self.model_id, response_message, logprobs, finish_reason, latency=time.perf_counter() - start_time,
+                        **get_token_usage(getattr(response, 'usage', None)))
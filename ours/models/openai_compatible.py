@@ -0,0 +1,173 @@
+from typing import List, Dict, Any, Optional
+import yaml
+from ours.models.base import BaseChat, Response
+from ours.utils.utils import get_abs_path
+from ours.utils.ratelimit import get_rate_limiter
+from ours.utils.retry import RetryPolicy, RetryError
+from ours.utils.image import get_encoded_image
+from ours.utils.usage import get_token_usage
+from ours.utils.stream import stream_completion, astream_completion, get_completion_detector
+from openai import OpenAI, AsyncOpenAI, BadRequestError
+import os
+import time
+
+
+class OpenAICompatibleChat(BaseChat):
+    """
+    Base class for chat models served through an OpenAI-compatible chat-completions API.
+
+    Subclasses only declare their configs and provider: `MODEL_CONFIG`, `apikey_env` (environment variable of the api key)
+    and the request defaults below. Requests go through the shared rate limiter and retry policy, can be streamed and
+    fall back to weaker structured output modes when the provider rejects `response_format`. Failed generations are
+    returned as a Response without finish_reason, so that they are neither cached nor checkpointed.
+    """
+
+    MODEL_CONFIG: Dict[str, str] = {}
+    apikey_env: str = ''
+    default_base_url: Optional[str] = None # None for the endpoint of the openai SDK
+    default_timeout: float = 1
+    default_max_new_tokens: int = 100
+    system_images: bool = True # whether images may be sent in a leading system message
+    supports_logprobs: bool = True # whether `output_scores` is sent as `logprobs`
+    thread_safe = True # the client is shared across threads, no global state is mutated
+
+    def __init__(self, model_id: str, model_cfg: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+        super().__init__(model_id=model_id)
+        with open(get_abs_path(self.MODEL_CONFIG[self.model_id])) as f:
+            self.model_config = yaml.load(f, Loader=yaml.FullLoader)
+        # overrides from the task config, e.g., base_url of a local server
+        self.model_config.update(model_cfg or {})
+
+        api_key = os.getenv(self.apikey_env, '')
+        assert api_key, f"{self.apikey_env} is empty"
+        self.api_key = api_key
+        self.max_retries = self.model_config.get('max_retries', 10)
+        self.timeout = self.model_config.get('timeout', self.default_timeout)
+        self.retry_policy = RetryPolicy.from_config(self.model_config, default_delay=self.timeout)
+        # a client per instance instead of the global `openai.api_key`, so that instances are thread safe
+        base_url = self.model_config.get('base_url', self.default_base_url)
+        self.client = OpenAI(api_key=self.api_key, base_url=base_url, max_retries=0) # retries are handled by self.retry_policy
+        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=base_url, max_retries=0)
+        # shared by every instance using the same endpoint and api key
+        self.rate_limiter = get_rate_limiter(str(self.client.base_url), self.api_key, self.model_config.get('rate_limit'))
+
+    def build_request(self, messages: List[Dict[str, Any]], **generation_kwargs) -> Dict[str, Any]:
+        """
+        Chat-completion request body of the messages.
+        """
+        conversation = []
+        for message in messages:
+            if message["role"] not in ["system", "user", "assistant"]:
+                raise ValueError("Unsupported role. Only system, user and assistant are supported.")
+
+            if isinstance(message["content"], dict):
+                if not self.system_images and len(conversation) == 0 and message["role"] == "system":
+                    raise AttributeError(f"{self.__class__.__name__} doesn't support images in the first system message.")
+                text = message["content"].get("text", "")
+                image_path = message["content"].get("image_path", "")
+                local_image = os.path.exists(image_path)
+                # the text goes first and the per-sample image last, keeping shared instructions in the cacheable prefix
+                content = [
+                    {"type": "text", "text": text},
+                    {"type": "image_url", "image_url": {"url": get_encoded_image(message['content']).data_url if local_image else image_path}},
+                ]
+                if not text:
+                    # the instructions were moved to a system message by the 'system' prompt layout
+                    content = content[1:]
+            else:
+                content = message["content"]
+            conversation.append({"role": message["role"], "content": content})
+
+        raw_request: Dict[str, Any] = {
+            "model": self.model_id,
+            "messages": conversation,
+            "temperature": generation_kwargs.get("temperature", 1.0),
+            "max_tokens": generation_kwargs.get("max_new_tokens", self.default_max_new_tokens),
+            "n": generation_kwargs.get("num_return_sequences", 1),
+        }
+        if "stop_sequences" in generation_kwargs:
+            raw_request["stop"] = generation_kwargs["stop_sequences"]
+        if not generation_kwargs.get("do_sample", True):
+            raw_request["temperature"] = 0.0
+        if self.supports_logprobs and "output_scores" in generation_kwargs and "vision" not in self.model_id:
+            raw_request["logprobs"] = generation_kwargs["output_scores"]
+        response_format = self.response_format(generation_kwargs)
+        if response_format is not None:
+            raw_request["response_format"] = response_format
+        return raw_request
+
+    def create(self, raw_request: Dict[str, Any], generation_kwargs: Dict[str, Any], **request_kwargs):
+        """
+        One attempt of a request, called by the retry policy: waits for the rate limiter, then sends the request,
+        again with a weaker structured output mode as long as the provider rejects `response_format`.
+        """
+        estimated_tokens = self.rate_limiter.estimate_tokens(raw_request) if self.rate_limiter else 0
+        stream, detector_name = self.stream_options(generation_kwargs)
+        if self.rate_limiter:
+            self.rate_limiter.acquire(estimated_tokens)
+        while True:
+            try:
+                if stream:
+                    response = stream_completion(self.client, raw_request, get_completion_detector(detector_name), **request_kwargs)
+                else:
+                    response = self.client.chat.completions.create(**raw_request, **request_kwargs)
+                break
+            except BadRequestError as e:
+                if not self.fallback_response_format(raw_request, generation_kwargs, e):
+                    raise
+        if self.rate_limiter:
+            self.rate_limiter.settle(estimated_tokens, getattr(response.usage, 'total_tokens', None))
+        return response
+
+    async def acreate(self, raw_request: Dict[str, Any], generation_kwargs: Dict[str, Any], **request_kwargs):
+        """
+        Asynchronous version of `create`.
+        """
+        estimated_tokens = self.rate_limiter.estimate_tokens(raw_request) if self.rate_limiter else 0
+        stream, detector_name = self.stream_options(generation_kwargs)
+        if self.rate_limiter:
+            await self.rate_limiter.aacquire(estimated_tokens)
+        while True:
+            try:
+                if stream:
+                    response = await astream_completion(self.async_client, raw_request, get_completion_detector(detector_name), **request_kwargs)
+                else:
+                    response = await self.async_client.chat.completions.create(**raw_request, **request_kwargs)
+                break
+            except BadRequestError as e:
+                if not self.fallback_response_format(raw_request, generation_kwargs, e):
+                    raise
+        if self.rate_limiter:
+            self.rate_limiter.settle(estimated_tokens, getattr(response.usage, 'total_tokens', None))
+        return response
+
+    def chat(self, messages: List[Dict[str, Any]], **generation_kwargs) -> Response:
+        start_time = time.perf_counter()
+        raw_request = self.build_request(messages, **generation_kwargs)
+        try:
+            response = self.parse_response(self.retry_policy.call(lambda **request_kwargs: self.create(raw_request, generation_kwargs, **request_kwargs)))
+        except RetryError as e:
+            response = self.error_response(e)
+        response.latency = time.perf_counter() - start_time
+        return response
+
+    async def achat(self, messages: List[Dict[str, Any]], **generation_kwargs) -> Response:
+        start_time = time.perf_counter()
+        raw_request = await self.abuild_request(messages, **generation_kwargs)
+        try:
+            response = self.parse_response(await self.retry_policy.acall(lambda **request_kwargs: self.acreate(raw_request, generation_kwargs, **request_kwargs)))
+        except RetryError as e:
+            response = self.error_response(e)
+        response.latency = time.perf_counter() - start_time
+        return response
+
+    def error_response(self, error: BaseException) -> Response:
+        print(f"Error in generation: {error}")
+        return Response(self.model_id, f"Error in generation: {error}", None, None)
+
+    def parse_response(self, response) -> Response:
+        """
+        Response of a chat completion, e.g., also the results of the batch executor.
+        """
+        return Response(self.model_id, response.choices[0].message.content, response.choices[0].logprobs, response.choices[0].finish_reason,
+                        ttft=getattr(response, 'ttft', None), **get_token_usage(getattr(response, 'usage', None)))
@@ -1,17 +1,52 @@
 from abc import ABC
-from typing import Optional, List, Union, Sequence, Any, Dict, Type
+from typing import Optional, List, Union, Sequence, Any, Dict, Type, Iterator
 from torch.utils.data import DataLoader
-from ours.datasets.base import BaseDataset, collate_fn
+from ours.datasets.base import BaseDataset, collate_fn, get_sample_id, strip_payload
 from ours.utils.registry import registry
 from ours.methods.base import BaseMethod
-from ours.models.base import BaseChat
+from ours.models.base import BaseChat, Response
 from ours.evaluators.base import SequentialEvaluator
+from ours.utils.cache import ResponseCache, CachedChat
+from ours.utils.checkpoint import Checkpoint
+from ours.utils.batch import BatchJob
+from ours.utils.usage import USAGE_FIELDS, summarize_usage, save_usage
+from ours.utils.profiler import profiler
+from ours.tasks.shard import get_shard_indices, save_metric_state
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
 import warnings
+import itertools
+import asyncio
+import threading
 import json
 import os
 
 class BaseTask(ABC):    
-    def __init__(self, dataset_id: str, model_id: str, method_cfg: Optional[Dict] = {}, dataset_cfg: Optional[Dict] = {}, generation_kwargs: Optional[Dict] = {}, evaluator_seq_cfgs: List = [], log_file: Optional[str] = None) -> None:
+    supported_executors: List[str] = ['sequential', 'async', 'thread', 'batch']
+
+    def __init__(self, dataset_id: str, model_id: str, method_cfg: Optional[Dict] = {}, dataset_cfg: Optional[Dict] = {}, generation_kwargs: Optional[Dict] = {}, evaluator_seq_cfgs: List = [], log_file: Optional[str] = None, executor: str = 'sequential', max_concurrency: int = 1, cache_cfg: Optional[Dict] = None, checkpoint_file: Optional[str] = None, resume: bool = False, dataloader_cfg: Optional[Dict] = {}, batch_cfg: Optional[Dict] = {}, model_cfg: Optional[Dict] = {}, num_shards: int = 1, shard_id: int = 0, bootstrap_cfg: Optional[Dict] = None, online_eval_cfg: Optional[Dict] = None) -> None:
+        """
+        executor: how requests are sent to the chat model, 'sequential' (one at a time), 'async' (concurrent `achat` calls), 'thread' (`chat` in a thread pool)
+            or 'batch' (one offline job on the batch API of OpenAI-compatible providers)
+        max_concurrency: maximal number of in-flight requests for concurrent executors
+        cache_cfg: config of the persistent response cache, format: {path: ..., max_size_mb: ...}, None to disable it
+        checkpoint_file: JSONL file where responses are appended as they complete, None to disable checkpointing
+        resume: skip the samples already finished in `checkpoint_file`
+        dataloader_cfg: config of the dataloader, format: {num_workers: ..., prefetch_factor: ..., encode_images: ..., max_image_size: ..., prompt_layout: ...},
+            with `encode_images` images are loaded and encoded in `num_workers` prefetching worker processes,
+            `prompt_layout` is 'user' or 'system' (instructions in a system message for provider-side prefix caching)
+        batch_cfg: config of the 'batch' executor, format: {input_file: ..., endpoint: ..., completion_window: ..., poll_interval: ..., timeout: ...},
+            a batch still running after `timeout` seconds raises TimeoutError and is waited for again by the next run (see `ours.utils.batch.BatchJob`)
+        model_cfg: overrides of the model config file, e.g., {base_url: ..., rate_limit: ...}
+        num_shards, shard_id: only run the samples of shard `shard_id` out of `num_shards` (see `ours.tasks.shard.get_shard`),
+            and save mergeable metric states instead of the metrics
+        bootstrap_cfg: config of the bootstrap confidence intervals of the metrics, format: {num_resamples: ..., confidence: ..., seed: ...},
+            None to disable them (see `ours.evaluators.bootstrap`)
+        online_eval_cfg: config of the evaluation while responses are generated, format: {every: ..., final_eval: ...}, the running metrics
+            (see `BaseEvaluator.update`) are printed and saved as `<log name>.online.json` every `every` samples, None to disable it.
+            With `final_eval: false` the responses are not kept in memory (they are still checkpointed) and the final evaluation
+            and usage report are skipped, the online metrics are the results of the run (not supported for sharded runs)
+        """
         self.dataset_id = dataset_id
         self.model_id = model_id
         self.method_cfg = method_cfg
@@ -19,16 +54,43 @@ class BaseTask(ABC):
         self.evaluator_seq_cfgs = evaluator_seq_cfgs
         self.generation_kwargs = generation_kwargs
         self.log_file = log_file
+        assert executor in self.supported_executors, f"Executor {executor} is not supported. Only executors in {self.supported_executors} can be used."
+        assert max_concurrency >= 1, "max_concurrency must be a positive integer."
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.response_cache = ResponseCache(**cache_cfg) if cache_cfg is not None else None
+        self.checkpoint_file = checkpoint_file
+        self.resume = resume
+        self.checkpoint: Optional[Checkpoint] = None
+        self.dataloader_cfg = dataloader_cfg
+        self.batch_cfg = batch_cfg
+        self.model_cfg = model_cfg
+        assert 0 <= shard_id < num_shards, f"shard_id must be in [0, {num_shards})."
+        self.num_shards = num_shards
+        self.shard_id = shard_id
+        self.shard_indices: Optional[List[int]] = None
+        self.bootstrap_cfg = bootstrap_cfg
+        self.online_eval_cfg = online_eval_cfg
+        # the metric states of a shard are computed by the final evaluation
+        assert num_shards == 1 or self.keep_responses(), "online_eval_cfg with final_eval: false cannot be used with num_shards > 1, the shard metric states (<log name>.state.json) are written by the final evaluation."
+        self.online_lock = threading.Lock()
+        self.num_online = 0
     
     def get_handlers(self) -> None:
-        self.evaluators = self.get_evaluators()
-        self.method = self.get_method() # get method before dataset
-        self.model = self.get_model()
-        self.dataset = self.get_dataset()
+        with profiler.span('get_handlers:evaluators'):
+            self.evaluators = self.get_evaluators()
+        with profiler.span('get_handlers:method'):
+            self.method = self.get_method() # get method before dataset
+        with profiler.span('get_handlers:model'):
+            self.model = self.get_model()
+        with profiler.span('get_handlers:dataset'):
+            self.dataset = self.get_dataset()
     
     def get_model(self) -> BaseChat:
         model_cls = registry.get_chatmodel_class(self.model_id)
-        model = model_cls(self.model_id)
+        model = model_cls(self.model_id, model_cfg=self.model_cfg) if self.model_cfg else model_cls(self.model_id)
+        if self.response_cache is not None:
+            model = CachedChat(model, self.response_cache)
         return model
     
     def get_dataset(self) -> BaseDataset:
@@ -47,6 +109,17 @@ class BaseTask(ABC):
         method = method_cls(method_id, **method_kwargs)
         return method
     
+    def get_generation_kwargs(self) -> Dict[str, Any]:
+        """
+        Generation kwargs of the task, with the answer schema of the dataset as `output_schema` unless the config sets it
+        (`output_schema: null` disables structured output for the task).
+        """
+        generation_kwargs = dict(self.generation_kwargs)
+        output_schema = getattr(self.dataset, 'output_schema', None)
+        if output_schema is not None:
+            generation_kwargs.setdefault('output_schema', output_schema)
+        return generation_kwargs
+
     def get_evaluators(self) -> List[SequentialEvaluator]:
         evaluators = []
 
@@ -57,18 +130,49 @@ class BaseTask(ABC):
 
     
     def get_dataloader(self) -> DataLoader:
-        dataloader = DataLoader(dataset=self.dataset, batch_size=1, collate_fn=collate_fn)
+        if self.num_shards > 1:
+            # samples of the other shards are never loaded
+            self.shard_indices = get_shard_indices(len(self.dataset), self.num_shards, self.shard_id)
+        num_workers = self.dataloader_cfg.get('num_workers', 0)
+        collate = partial(collate_fn, encode_images=self.dataloader_cfg.get('encode_images', False), max_image_size=self.dataloader_cfg.get('max_image_size', 400),
+                          prompt_layout=self.dataloader_cfg.get('prompt_layout', 'user'))
+        dataloader = DataLoader(dataset=self.dataset, batch_size=1, collate_fn=collate, num_workers=num_workers, sampler=self.shard_indices,
+                                prefetch_factor=self.dataloader_cfg.get('prefetch_factor', 2) if num_workers > 0 else None)
         return dataloader
 
+    def get_labels(self, responses: List[Dict[str, Any]]) -> Sequence[Any]:
+        """
+        Targets of the responses. Datasets with a `label_matrix` (see `ours.datasets.store.LabelMatrix`) give the rows
+        of the responses, by the dataset position in their sample ids, so that evaluators get the matrix without rebuilding it.
+        """
+        label_matrix = getattr(self.dataset, 'label_matrix', None)
+        if label_matrix is None:
+            return [response['target'] for response in responses]
+        return label_matrix.take([int(response['sample_id'].split('-')[0]) for response in responses])
+
     def eval(self, responses: List[Dict[str, Any]]) -> Dict[str, Union[float, Sequence]]:
         contents: Sequence[str] = [response['content'] for response in responses]
         preds: Sequence[str] = [response['response'] for response in responses]
-        labels: Sequence[str] = [response['target'] for response in responses]
+        labels: Sequence[Any] = self.get_labels(responses)
         extras: Sequence[str] = [response['extra'] for response in responses]
         results = {}
 
+        if self.num_shards > 1:
+            # metrics of the whole run are computed from the merged states of the shards
+            states = {}
+            for evaluator in self.evaluators:
+                with profiler.span('eval'):
+                    states.update(evaluator.state(preds, labels, extras=extras))
+            if self.log_file is not None:
+                save_metric_state(states, os.path.splitext(self.log_file)[0] + '.state.json')
+            print(f"Saved the metric states of shard {self.shard_id}/{self.num_shards}.")
+            return None
+
+        # per-sample values of the evaluators (e.g., parse failures), saved to the log file instead of printed
+        per_sample_results = {}
         for evaluator in self.evaluators:
-            result = evaluator(preds, labels, extras=extras)
+            with profiler.span('eval'):
+                result = evaluator(preds, labels, extras=extras, bootstrap_cfg=self.bootstrap_cfg, per_sample_results=per_sample_results)
             print(result)
             # for key in result.keys():
             #     if key in results.keys():
@@ -109,6 +213,8 @@ class BaseTask(ABC):
         #     }
         # )
         # return results
+        if per_sample_results and self.log_file is not None:
+            self.save_results({'sample_id': [response['sample_id'] for response in responses], **per_sample_results})
         return None
 
     def save_results(self, results: Dict[str, Any]) -> None:
@@ -141,52 +247,339 @@ class BaseTask(ABC):
             with open(self.log_file, "w") as f:
                 json.dump(formatted_results, f, indent=4)
 
+    def iter_samples(self, dataloader: DataLoader) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the collated samples in dataset order, attaching a stable `sample_id` to each of them.
+        """
+        # positions in the dataset, for the samples of one shard
+        indices = iter(self.shard_indices) if self.shard_indices is not None else itertools.count()
+        batches = iter(dataloader)
+        # loaders fed by another stage (e.g., `FanOutLoader`) name the span of their own waits
+        span_name = getattr(dataloader, 'wait_span', 'dataloader')
+        while True:
+            # time spent waiting for the dataloader: loading, method_hook and collate, unless hidden by prefetching workers
+            with profiler.span(span_name):
+                batch_data = next(batches, None)
+            if batch_data is None:
+                return
+            for data in batch_data:
+                data['sample_id'] = get_sample_id(next(indices), data['message'])
+                yield data
+
+    def get_finished(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Output of a sample already finished in the checkpoint being resumed, if any.
+        """
+        if self.checkpoint is None:
+            return None
+        output = self.checkpoint.finished.get(data['sample_id'])
+        if output is not None:
+            self.update_online(output)
+        return output
+
+    def build_output(self, data: Dict[str, Any], response) -> Dict[str, Any]:
+        message = data['message']
+        output = {
+            "sample_id": data['sample_id'],
+            "content": strip_payload(message[-1]['content']),
+            "response": response.content,
+            "target": data['target'],
+            "extra": data['extra'],
+        }
+        for field in USAGE_FIELDS:
+            value = getattr(response, field, None)
+            if value is not None and value is not False:
+                output[field] = value
+        print("output:",output)
+        # failed generations (no finish_reason, like `CachedChat`) are not finished: `--resume` retries them
+        if self.checkpoint is not None and response.finish_reason is not None:
+            self.checkpoint.append(data['sample_id'], output)
+        self.update_online(output)
+        return output
+
+    def keep_responses(self) -> bool:
+        """
+        Whether `generate` returns the responses, False when the online evaluation replaces the final one.
+        """
+        return self.online_eval_cfg is None or self.online_eval_cfg.get('final_eval', True)
+
+    def reset_online(self) -> None:
+        if self.online_eval_cfg is None:
+            return
+        self.num_online = 0
+        for evaluator in self.evaluators:
+            evaluator.reset()
+
+    def update_online(self, output: Dict[str, Any]) -> None:
+        """
+        Add a finished response to the running metrics of the evaluators, and report them every `online_eval_cfg['every']` samples.
+        """
+        if self.online_eval_cfg is None:
+            return
+        # responses land from worker threads with the 'thread' executor
+        with self.online_lock:
+            labels = self.get_labels([output])
+            with profiler.span('eval:online'):
+                for evaluator in self.evaluators:
+                    evaluator.update([output['response']], labels, [output['extra']])
+            self.num_online += 1
+            if self.num_online % self.online_eval_cfg.get('every', 100) == 0:
+                self.report_online()
+
+    def report_online(self) -> Dict[str, Any]:
+        """
+        Running metrics of the samples finished so far, saved as `<log name>.online.json`.
+        """
+        results = {}
+        for evaluator in self.evaluators:
+            results.update(evaluator.finalize())
+        print(f"[online eval] {self.num_online} samples: {results}")
+        if self.log_file is not None:
+            path = os.path.splitext(self.log_file)[0] + '.online.json'
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'num_samples': self.num_online, 'metrics': results}, f, indent=4)
+            os.replace(path + '.tmp', path)
+        return results
+
     def generate(self, dataloader: DataLoader, **generate_kwargs) -> List[Dict[str, Any]]:
         print('len(self.dataset): ', len(dataloader.dataset))
+        self.reset_online()
+        if self.executor == 'async':
+            return asyncio.run(self.agenerate(dataloader, **generate_kwargs))
+        if self.executor == 'thread':
+            return self.threaded_generate(dataloader, **generate_kwargs)
+        if self.executor == 'batch':
+            # the batch results are in memory anyway, only the returned list is dropped
+            responses = self.batch_generate(dataloader, **generate_kwargs)
+            return responses if self.keep_responses() else []
+
+        keep = self.keep_responses()
         responses = []
-        for batch_data in dataloader:
-            for data in batch_data:
-                """
-                    # for text data
-                    message = [
-                        {
-                            "role": "user",
-                            "content": text
-                        }
-                    ]
-
-                    # for multimodal data
-                    message = [
-                        {
-                            "role": "user",
-                            "content": {
-                                "image_path": ...,
-                                "text": ...
-                            }
+        for data in self.iter_samples(dataloader):
+            """
+                # for text data
+                message = [
+                    {
+                        "role": "user",
+                        "content": text
+                    }
+                ]
+
+                # for multimodal data
+                message = [
+                    {
+                        "role": "user",
+                        "content": {
+                            "image_path": ...,
+                            "text": ...
                         }
-                    ]
-                """
-                
-                message = data['message']
-                target = data['target']
-                extra: Dict[str, Any] = data['extra']
-
-                response = self.model.chat(messages=message, **generate_kwargs)
-                output = {
-                    "content": message[0]['content'],
-                    "response": response.content,
-                    "target": target,
-                    "extra": extra,
-                }
-                print("output:",output)
+                    }
+                ]
+            """
             
+            output = self.get_finished(data)
+            if output is None:
+                with profiler.span('chat'):
+                    response = self.model.chat(messages=data['message'], **generate_kwargs)
+                output = self.build_output(data, response)
+            if keep:
                 responses.append(output)
         
         return responses
+
+    async def agenerate(self, dataloader: DataLoader, **generate_kwargs) -> List[Dict[str, Any]]:
+        """
+        Concurrent version of `generate`: at most `max_concurrency` `achat` requests are in flight,
+        and the responses are returned in dataset order.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def worker(data: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                with profiler.span('chat'):
+                    response = await self.model.achat(messages=data['message'], **generate_kwargs)
+                return self.build_output(data, response)
+            finally:
+                semaphore.release()
+
+        keep = self.keep_responses()
+        # without keeping the responses, only the running requests are held
+        outputs, running = [], set()
+        for data in self.iter_samples(dataloader):
+            output = self.get_finished(data)
+            if output is not None:
+                if keep:
+                    outputs.append(output)
+                continue
+            # acquire before scheduling, so that samples are not pulled from the dataloader faster than they are sent
+            await semaphore.acquire()
+            task = asyncio.create_task(worker(data))
+            if keep:
+                outputs.append(task)
+            else:
+                running.add(task)
+                finished = {task for task in running if task.done()}
+                for task in finished:
+                    # raise the error of a failed request, like the awaits below
+                    task.result()
+                running -= finished
+
+        await asyncio.gather(*running)
+        # outputs are kept in the dataset order
+        return [await output if isinstance(output, asyncio.Task) else output for output in outputs]
+
+    def threaded_generate(self, dataloader: DataLoader, **generate_kwargs) -> List[Dict[str, Any]]:
+        """
+        Thread-pool version of `generate` for synchronous chat models: `chat` runs in `max_concurrency` worker threads,
+        and the responses are returned in dataset order. Models not declaring `thread_safe` get one instance per worker thread.
+        """
+        local = threading.local()
+
+        def get_thread_model() -> BaseChat:
+            if self.model.thread_safe:
+                return self.model
+            if not hasattr(local, 'model'):
+                local.model = self.get_model()
+            return local.model
+
+        semaphore = threading.BoundedSemaphore(self.max_concurrency * 2)
+
+        def worker(data: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                with profiler.span('chat'):
+                    response = get_thread_model().chat(messages=data['message'], **generate_kwargs)
+                return self.build_output(data, response)
+            finally:
+                semaphore.release()
+
+        keep = self.keep_responses()
+        # without keeping the responses, only the running requests are held
+        outputs, running = [], set()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            for data in self.iter_samples(dataloader):
+                output = self.get_finished(data)
+                if output is not None:
+                    if keep:
+                        outputs.append(output)
+                    continue
+                # bound the number of pending samples, so that the dataloader is not drained into memory
+                semaphore.acquire()
+                future = pool.submit(worker, data)
+                if keep:
+                    outputs.append(future)
+                else:
+                    running.add(future)
+                    finished = {future for future in running if future.done()}
+                    for future in finished:
+                        # raise the error of a failed request, like the results below
+                        future.result()
+                    running -= finished
+            for future in running:
+                future.result()
+            # outputs are kept in submission order, i.e., the dataset order
+            return [output.result() if isinstance(output, Future) else output for output in outputs]
         
+    def batch_generate(self, dataloader: DataLoader, **generate_kwargs) -> List[Dict[str, Any]]:
+        """
+        Batch-API version of `generate`: requests built by the chat model are submitted as one offline batch,
+        and the results are mapped back to the dataset order. Like `CachedChat`, samples found in the response cache
+        are not submitted and successful results are written to it; failed rows are neither cached nor checkpointed.
+        """
+        assert hasattr(self.model, 'build_request') and hasattr(self.model, 'client'), f"{self.model_id} does not support the batch executor."
+        batch_cfg = dict(self.batch_cfg)
+        if self.checkpoint_file or self.log_file:
+            default_input_file = os.path.splitext(self.checkpoint_file or self.log_file)[0] + '.batch_input.jsonl'
+        else:
+            default_input_file = os.path.join('./cache/batches', f"{self.model_id}.batch_input.jsonl")
+        input_file = batch_cfg.pop('input_file', default_input_file)
+        batch_job = BatchJob(self.model.client, **batch_cfg)
+
+        outputs, pending = [], []
+
+        def iter_requests():
+            for data in self.iter_samples(dataloader):
+                outputs.append(self.get_finished(data))
+                if outputs[-1] is not None:
+                    continue
+                key = self.response_cache.make_key(self.model.model_id, data['message'], generate_kwargs) if self.response_cache is not None else None
+                cached = self.response_cache.get(key) if key is not None else None
+                if cached is not None:
+                    cached.from_cache = True
+                    outputs[-1] = self.build_output(data, cached)
+                    continue
+                pending.append((len(outputs) - 1, data, key))
+                yield data['sample_id'], self.model.build_request(data['message'], **generate_kwargs)
+
+        if batch_job.write_input(input_file, iter_requests()) == 0:
+            return outputs
+
+        results = batch_job.run(input_file)
+        for idx, data, key in pending:
+            completion, error = results.get(data['sample_id'], (None, "missing in batch output"))
+            if completion is not None:
+                response = self.model.parse_response(completion)
+            else:
+                response = Response(self.model_id, f"Error in batch generation: {error}", None, None)
+            if key is not None and response.finish_reason is not None:
+                self.response_cache.set(key, response)
+            outputs[idx] = self.build_output(data, response)
+        return outputs
+        
+    def report_usage(self, responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Aggregate token usage, latency and cost of the run, saved next to the log file as `<log name>.usage.json`.
+        """
+        pricing = (getattr(self.model, 'model_config', None) or {}).get('pricing')
+        summary = summarize_usage(responses, pricing)
+        totals = summary['totals']
+        print(f"Usage: {totals['prompt_tokens']} prompt tokens ({totals['cached_tokens']} cached), {totals['completion_tokens']} completion tokens, "
+              f"{totals['num_from_cache']}/{totals['num_samples']} samples from the response cache.")
+        if 'cost' in summary:
+            print(f"Cost: {summary['cost']['total']:.4f} {summary['cost']['currency']}")
+        if totals['num_usage_unknown']:
+            print(f"⚠️ {totals['num_usage_unknown']}/{totals['num_samples']} responses have no token usage (e.g., streams closed early), "
+                  f"token counts and cost are lower bounds.")
+        if self.log_file is not None:
+            save_usage(summary, os.path.splitext(self.log_file)[0] + '.usage.json')
+        return summary
+
+    def save_profile(self) -> None:
+        """
+        Export the stage timings of the run next to the log file, as JSON (`<log name>.profile.json`)
+        and as a Prometheus textfile (`<log name>.prom`).
+        """
+        for stage, stats in profiler.summary().items():
+            print(f"[profile] {stage}: count={stats['count']} total={stats['total']:.3f}s p50={stats['p50']:.3f}s p99={stats['p99']:.3f}s")
+        if self.log_file is not None:
+            log_prefix = os.path.splitext(self.log_file)[0]
+            profiler.save_json(log_prefix + '.profile.json')
+            profiler.save_prometheus(log_prefix + '.prom', labels={'model_id': self.model_id, 'dataset_id': self.dataset_id})
+
+    def reset_profile(self) -> None:
+        """
+        Start the run with empty stage timings, so that tasks run one after another in a process are profiled separately.
+        """
+        profiler.reset()
+
     def pipeline(self) -> None:
-        self.get_handlers()
+        self.reset_profile()
+        with profiler.span('get_handlers'):
+            self.get_handlers()
         dataloader = self.get_dataloader()
-        responses = self.generate(dataloader, **self.generation_kwargs)
-        results = self.eval(responses)
+        if self.checkpoint_file is not None:
+            self.checkpoint = Checkpoint(self.checkpoint_file, resume=self.resume)
+        try:
+            with profiler.span('generate'):
+                responses = self.generate(dataloader, **self.get_generation_kwargs())
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+        if self.online_eval_cfg is not None:
+            self.report_online()
+        if self.keep_responses():
+            self.report_usage(responses)
+            results = self.eval(responses)
+        self.save_profile()
         # self.save_results(results)
\ No newline at end of file
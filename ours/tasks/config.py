@@ -0,0 +1,84 @@
+from typing import Optional, Dict, Any, Type, Union
+from ours.tasks.base import BaseTask
+from ours.tasks.multi_model import MultiModelTask, get_model_path
+from ours.tasks.shard import get_shard_path, merge_shards
+from ours.utils.utils import merge_config
+import yaml
+import os
+
+
+def load_task_config(config: str, cfg_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Load a task config file, merge the `--cfg-options` style overrides (dotted keys) and fill in the default generation kwargs.
+    """
+    with open(config, 'r') as f:
+        cfg = yaml.load(f, Loader=yaml.FullLoader)
+    if cfg_options:
+        cfg = merge_config(cfg, cfg_options)
+
+    generation_kwargs = cfg.get('generation_kwargs', {})
+    if 'max_new_tokens' not in generation_kwargs.keys():
+        generation_kwargs['max_new_tokens'] = 50
+    if 'do_sample' not in generation_kwargs.keys():
+        generation_kwargs['do_sample'] = False
+
+    cfg['generation_kwargs'] = generation_kwargs
+    cfg['config_path'] = config
+    return cfg
+
+
+def build_task(cfg: Dict[str, Any], resume: bool = False, task_cls: Type[BaseTask] = BaseTask, **task_kwargs) -> Union[BaseTask, MultiModelTask]:
+    """
+    Instantiate the task of a loaded config: a `task_cls` instance, or a MultiModelTask if `model_id` is a list.
+
+    Arguments:
+        cfg: task config, see `load_task_config`
+        resume: skip the samples already finished in the checkpoint file of the run
+        task_cls: BaseTask or a subclass of it, for single-model tasks
+        task_kwargs: extra arguments of `task_cls`
+    """
+    model_id = cfg.get('model_id')
+    num_shards, shard_id = cfg.get('num_shards', 1), cfg.get('shard_id', 0)
+    # every shard writes its own outputs, merged by `merge_shards`
+    log_file = get_shard_path(cfg.get('log_file'), num_shards, shard_id)
+    # responses are checkpointed next to the log file unless specified
+    checkpoint_file = get_shard_path(cfg.get('checkpoint_file'), num_shards, shard_id)
+    if checkpoint_file is None and log_file is not None:
+        checkpoint_file = os.path.splitext(log_file)[0] + '.responses.jsonl'
+
+    kwargs = dict(
+        dataset_id=cfg.get('dataset_id'),
+        method_cfg=cfg.get('method_cfg', {}),
+        dataset_cfg=cfg.get('dataset_cfg', {}),
+        generation_kwargs=cfg.get('generation_kwargs', {}),
+        evaluator_seq_cfgs=cfg.get('evaluator_seq_cfgs', []),
+        executor=cfg.get('executor', 'sequential'),
+        max_concurrency=cfg.get('max_concurrency', 1),
+        cache_cfg=cfg.get('cache_cfg'),
+        resume=resume,
+        dataloader_cfg=cfg.get('dataloader_cfg', {}),
+        batch_cfg=cfg.get('batch_cfg', {}),
+        model_cfg=cfg.get('model_cfg', {}),
+        num_shards=num_shards,
+        shard_id=shard_id,
+        bootstrap_cfg=cfg.get('bootstrap_cfg'),
+        online_eval_cfg=cfg.get('online_eval_cfg'),
+    )
+    if isinstance(model_id, (list, tuple)):
+        # several models over one shared dataset pass, logs are written per model (see `get_model_path`)
+        return MultiModelTask(model_ids=list(model_id), log_file=log_file, checkpoint_file=checkpoint_file, **kwargs)
+    return task_cls(model_id=model_id, log_file=log_file, checkpoint_file=checkpoint_file, **kwargs, **task_kwargs)
+
+
+def merge_task_shards(cfg: Dict[str, Any]) -> None:
+    """
+    Merge the outputs of the `num_shards` shards of the run of a loaded config, for every model of the run.
+    """
+    model_id, log_file, checkpoint_file = cfg.get('model_id'), cfg.get('log_file'), cfg.get('checkpoint_file')
+    assert log_file is not None, "Merging shards needs the log_file of the run."
+    if not isinstance(model_id, (list, tuple)):
+        merge_shards(log_file, cfg.get('num_shards', 1), checkpoint_file)
+        return
+    for model_id in model_id:
+        print(f"===== {model_id} =====")
+        merge_shards(get_model_path(log_file, model_id), cfg.get('num_shards', 1), get_model_path(checkpoint_file, model_id))
@@ -0,0 +1,182 @@
+from typing import Optional, List, Dict, Any, Iterator, Union
+from concurrent.futures import ThreadPoolExecutor
+from torch.utils.data import DataLoader
+from ours.tasks.base import BaseTask
+from ours.utils.cache import ResponseCache
+from ours.utils.checkpoint import Checkpoint
+from ours.utils.profiler import profiler
+import queue
+import os
+
+_END = object()
+
+
+def get_model_path(path: Optional[str], model_id: str) -> Optional[str]:
+    """
+    Per-model version of a log/checkpoint path: a `{model_id}` placeholder is filled in,
+    otherwise the model id is inserted as the last directory, e.g., logs/anomaly-detection.json -> logs/<model_id>/anomaly-detection.json.
+    """
+    if path is None:
+        return None
+    if '{model_id}' in path:
+        return path.replace('{model_id}', model_id)
+    return os.path.join(os.path.dirname(path), model_id, os.path.basename(path))
+
+
+class FanOutLoader:
+    """
+    The view of one model on a dataloader iterated once for all models: batches are read from a bounded queue
+    filled by `MultiModelTask.generate`, so that a fast model is at most `maxsize` batches ahead of the slowest one.
+    """
+
+    # the waits of a model on its queue, the dataloader itself is timed by `MultiModelTask.generate`
+    wait_span = 'dataloader:fan_out'
+
+    def __init__(self, dataset, maxsize: int) -> None:
+        self.dataset = dataset
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+    def put(self, batch: Any) -> None:
+        # a model that failed stops consuming, do not block the other models on its full queue
+        while not self.closed:
+            try:
+                self.queue.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            batch = self.queue.get()
+            if batch is _END:
+                return
+            yield batch
+
+
+class MultiModelTask:
+    """
+    Runs several chat models over one dataset in a single process. The dataset, the method hook and the dataloader
+    (image loading and encoding) are shared, every sample is prepared once and fanned out to one BaseTask per model,
+    which keeps its own executor, checkpoint, evaluators, usage report and log file.
+    """
+
+    def __init__(self, dataset_id: str, model_ids: List[str], log_file: Optional[str] = None, checkpoint_file: Optional[str] = None, queue_size: int = 8, cache_cfg: Optional[Dict] = None, **task_kwargs) -> None:
+        """
+        model_ids: chat models run concurrently over the dataset
+        log_file, checkpoint_file: per-model paths derived by `get_model_path`, e.g., logs/{model_id}/anomaly-detection.json
+        queue_size: maximal number of prepared batches waiting for a model
+        cache_cfg: config of the response cache, opened once and shared by the models
+        task_kwargs: other arguments of BaseTask, shared by the models
+        """
+        assert len(model_ids) > 0, "model_ids must not be empty."
+        assert len(set(model_ids)) == len(model_ids), f"Duplicated model ids in {model_ids}."
+        self.dataset_id = dataset_id
+        self.model_ids = list(model_ids)
+        self.log_file = log_file
+        self.queue_size = queue_size
+        self.response_cache = ResponseCache(**cache_cfg) if cache_cfg is not None else None
+        self.tasks = [BaseTask(dataset_id=dataset_id, model_id=model_id, log_file=get_model_path(log_file, model_id),
+                               checkpoint_file=get_model_path(checkpoint_file, model_id), cache_cfg=None, **task_kwargs) for model_id in self.model_ids]
+        for task in self.tasks:
+            task.response_cache = self.response_cache
+
+    def get_handlers(self) -> None:
+        lead = self.tasks[0]
+        lead.get_handlers()
+        for task in self.tasks[1:]:
+            with profiler.span('get_handlers:evaluators'):
+                task.evaluators = task.get_evaluators()
+            task.method = lead.method
+            task.dataset = lead.dataset
+            with profiler.span('get_handlers:model'):
+                task.model = task.get_model()
+
+    def generate(self, dataloader: DataLoader) -> List[Union[List[Dict[str, Any]], BaseException]]:
+        """
+        Iterate over the dataloader once and feed every batch to all models, each running `BaseTask.generate` in its own thread.
+        Returns the responses of every model, or the error it failed with, in the order of `model_ids`.
+        """
+        loaders = [FanOutLoader(dataloader.dataset, self.queue_size) for _ in self.tasks]
+
+        def run(task: BaseTask, loader: FanOutLoader) -> List[Dict[str, Any]]:
+            try:
+                return task.generate(loader, **task.get_generation_kwargs())
+            finally:
+                loader.closed = True
+
+        with ThreadPoolExecutor(max_workers=len(self.tasks)) as pool:
+            futures = [pool.submit(run, task, loader) for task, loader in zip(self.tasks, loaders)]
+            try:
+                batches = iter(dataloader)
+                while not all(loader.closed for loader in loaders):
+                    # the models wait on their queues, the dataloader is waited for here
+                    with profiler.span('dataloader'):
+                        batch = next(batches, None)
+                    if batch is None:
+                        break
+                    for loader in loaders:
+                        loader.put(batch)
+            finally:
+                for loader in loaders:
+                    loader.put(_END)
+
+            outputs = []
+            for task, future in zip(self.tasks, futures):
+                error = future.exception()
+                if error is not None:
+                    print(f"Generation failed for {task.model_id}: {error!r}")
+                outputs.append(error if error is not None else future.result())
+            return outputs
+
+    def save_profile(self) -> None:
+        """
+        Stage timings are shared by the models, exported once as `<log name>.profile.json` / `.prom` under the `all-models` directory.
+        """
+        for stage, stats in profiler.summary().items():
+            print(f"[profile] {stage}: count={stats['count']} total={stats['total']:.3f}s p50={stats['p50']:.3f}s p99={stats['p99']:.3f}s")
+        if self.log_file is not None:
+            log_prefix = os.path.splitext(get_model_path(self.log_file, 'all-models'))[0]
+            profiler.save_json(log_prefix + '.profile.json')
+            profiler.save_prometheus(log_prefix + '.prom', labels={'model_id': ','.join(self.model_ids), 'dataset_id': self.dataset_id})
+
+    def reset_profile(self) -> None:
+        """
+        Start the run with empty stage timings, the models of the run are profiled together.
+        """
+        profiler.reset()
+
+    def pipeline(self) -> None:
+        self.reset_profile()
+        with profiler.span('get_handlers'):
+            self.get_handlers()
+        dataloader = self.tasks[0].get_dataloader()
+        for task in self.tasks[1:]:
+            task.shard_indices = self.tasks[0].shard_indices
+        for task in self.tasks:
+            if task.checkpoint_file is not None:
+                task.checkpoint = Checkpoint(task.checkpoint_file, resume=task.resume)
+        try:
+            with profiler.span('generate'):
+                outputs = self.generate(dataloader)
+        finally:
+            for task in self.tasks:
+                if task.checkpoint is not None:
+                    task.checkpoint.close()
+            if self.response_cache is not None:
+                self.response_cache.close()
+
+        for task, responses in zip(self.tasks, outputs):
+            if isinstance(responses, BaseException):
+                continue
+            print(f"===== {task.model_id} =====")
+            if task.online_eval_cfg is not None:
+                task.report_online()
+            if task.keep_responses():
+                task.report_usage(responses)
+                task.eval(responses)
+        self.save_profile()
+
+        errors = [(task.model_id, error) for task, error in zip(self.tasks, outputs) if isinstance(error, BaseException)]
+        if errors:
+            raise RuntimeError(f"Generation failed for {[model_id for model_id, _ in errors]}") from errors[0][1]
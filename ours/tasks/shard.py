@@ -0,0 +1,106 @@
+from typing import Optional, List, Dict, Any
+from ours.evaluators.state import merge_metric_states, compute_metric
+from ours.utils.usage import summarize_usage, save_usage
+import warnings
+import hashlib
+import json
+import os
+
+
+def get_shard(index: int, num_shards: int) -> int:
+    """
+    Shard of the sample at position `index` of the dataset (the position part of its sample id).
+    The hash is stable across processes and machines, unlike `hash`, and spreads neighbouring samples over the shards.
+    Only the position is hashed, so that the samples of other shards are never loaded or encoded.
+    """
+    digest = hashlib.sha1(str(index).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards
+
+
+def get_shard_indices(num_samples: int, num_shards: int, shard_id: int) -> List[int]:
+    return [index for index in range(num_samples) if get_shard(index, num_shards) == shard_id]
+
+
+def get_shard_path(path: Optional[str], num_shards: int, shard_id: int) -> Optional[str]:
+    """
+    Path of the output of one shard, e.g., logs/anomaly-detection.json -> logs/anomaly-detection.shard-0-of-4.json.
+    """
+    if path is None or num_shards == 1:
+        return path
+    prefix, ext = os.path.splitext(path)
+    return f"{prefix}.shard-{shard_id}-of-{num_shards}{ext}"
+
+
+def save_metric_state(states: Dict[str, Dict[str, Any]], path: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(states, f, indent=4)
+
+
+def _read_responses(path: str) -> List[Dict[str, Any]]:
+    responses = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                responses.append(json.loads(line))
+            except json.JSONDecodeError:
+                # truncated line written during a crash
+                continue
+    return responses
+
+
+def merge_shards(log_file: str, num_shards: int, checkpoint_file: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Merge the outputs of the `num_shards` shards of a run into the outputs of a single-node run:
+    responses in dataset order (`<log name>.responses.jsonl`), usage (`<log name>.usage.json`) and the metrics
+    computed from the merged metric states (`<log name>.metrics.json`).
+
+    Arguments:
+        log_file: log file of the run, as configured (without the shard suffix)
+        num_shards: number of shards of the run
+        checkpoint_file: checkpoint file of the run if not next to the log file
+
+    Return:
+        merged metrics
+    """
+    log_prefix = os.path.splitext(log_file)[0]
+    shard_states, shard_checkpoints = [], []
+    for shard_id in range(num_shards):
+        shard_prefix = os.path.splitext(get_shard_path(log_file, num_shards, shard_id))[0]
+        shard_states.append(shard_prefix + '.state.json')
+        # same layout as `build_task`
+        shard_checkpoints.append(get_shard_path(checkpoint_file, num_shards, shard_id) if checkpoint_file else shard_prefix + '.responses.jsonl')
+    checkpoint_file = checkpoint_file or log_prefix + '.responses.jsonl'
+    missing = [path for path in shard_states + shard_checkpoints if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Outputs of unfinished shards are missing: {missing}")
+
+    responses = []
+    for path in shard_checkpoints:
+        responses.extend(_read_responses(path))
+    # sample ids start with the position of the sample in the dataset
+    responses.sort(key=lambda response: int(response['sample_id'].split('-')[0]))
+    assert len({response['sample_id'] for response in responses}) == len(responses), "A sample was processed by several shards."
+    with open(checkpoint_file, 'w', encoding='utf-8') as f:
+        for response in responses:
+            f.write(json.dumps(response, ensure_ascii=False, default=str) + '\n')
+    save_usage(summarize_usage(responses), log_prefix + '.usage.json')
+
+    states: Dict[str, List[Dict[str, Any]]] = {}
+    for path in shard_states:
+        with open(path, 'r') as f:
+            for key, value in json.load(f).items():
+                states.setdefault(key, []).append(value)
+
+    metrics = {}
+    for key, values in states.items():
+        if any(value['state'] is None for value in values):
+            warnings.warn(f"{key} has no mergeable state, recompute it from {checkpoint_file}.")
+            continue
+        state = merge_metric_states(values[0]['metric'], [value['state'] for value in values])
+        metrics[key] = compute_metric(values[0]['metric'], state, **values[0]['kwargs'])
+    print(f"Merged {num_shards} shards, {len(responses)} samples: {metrics}")
+    with open(log_prefix + '.metrics.json', 'w') as f:
+        json.dump(metrics, f, indent=4)
+    return metrics
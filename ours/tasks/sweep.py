@@ -0,0 +1,211 @@
+from typing import Optional, List, Dict, Any
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from ours.tasks.base import BaseTask
+from ours.tasks.config import load_task_config, build_task
+from ours.models.base import BaseChat
+from ours.utils.cache import ResponseCache, CachedChat
+from ours.utils.ratelimit import ConcurrencyLimiter, InFlightChat
+from ours.utils.registry import registry
+from ours.utils.profiler import profiler
+from ours.utils.utils import merge_config
+import copy
+import itertools
+import threading
+import traceback
+import time
+import json
+import os
+
+
+@dataclass
+class SweepJob:
+    """
+    One task config of a sweep: `name` identifies the job (and its log file), `params` are the grid values it was expanded from.
+    """
+    name: str
+    cfg: Dict[str, Any]
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def provider(self) -> str:
+        model_cls = registry.get_chatmodel_class(self.cfg['model_id'])
+        return model_cls.model_arch if model_cls is not None else ''
+
+
+def _format_param(key: str, value: Any) -> str:
+    return f"{key.split('.')[-1]}={value}".replace('/', '_').replace(' ', '')
+
+
+def expand_sweep(spec: Dict[str, Any]) -> List[SweepJob]:
+    """
+    Expand a sweep spec into task configs, one job per config file × grid point × model.
+
+    Spec format:
+        configs: [task config files]
+        cfg_options: {dotted key: value}, applied to every job
+        grid: {dotted key: [values]}, cartesian product
+        log_dir: directory of the logs, the log of a job is `<log_dir>/<config name>/<grid values>.json`
+
+    A list-valued `model_id` is expanded into one job per model, so that the jobs can be scheduled per provider.
+    """
+    grid = spec.get('grid') or {}
+    keys = list(grid.keys())
+    log_dir = spec.get('log_dir', './logs/sweep')
+
+    jobs = []
+    for config in spec['configs']:
+        config_name = os.path.splitext(os.path.basename(config))[0]
+        for values in itertools.product(*[grid[key] for key in keys]):
+            params = dict(zip(keys, values))
+            cfg = load_task_config(config, dict(spec.get('cfg_options') or {}, **params))
+            model_ids = cfg['model_id'] if isinstance(cfg['model_id'], (list, tuple)) else [cfg['model_id']]
+            for model_id in model_ids:
+                job_params = dict(params, model_id=model_id) if len(model_ids) > 1 else params
+                name = '/'.join([config_name, ','.join(_format_param(key, value) for key, value in job_params.items()) or 'default'])
+                job_cfg = merge_config(cfg, {'model_id': model_id, 'log_file': os.path.join(log_dir, name + '.json')})
+                jobs.append(SweepJob(name, job_cfg, job_params))
+
+    names = [job.name for job in jobs]
+    assert len(set(names)) == len(names), "Sweep jobs must have distinct names, check the configs and the grid."
+    return jobs
+
+
+def interleave_providers(jobs: List[SweepJob]) -> List[SweepJob]:
+    """
+    Order the jobs round-robin over their providers, so that concurrent jobs spread over the provider budgets
+    instead of queueing on one of them while the others are idle.
+    """
+    groups: Dict[str, List[SweepJob]] = {}
+    for job in jobs:
+        groups.setdefault(job.provider, []).append(job)
+    return [job for group in itertools.zip_longest(*groups.values()) for job in group if job is not None]
+
+
+class ModelPool:
+    """
+    Chat models, response caches and in-flight budgets shared by the jobs of a sweep.
+
+    Thread-safe models are created once per (model_id, model_cfg) and share their sync client (connection pool) across jobs,
+    the rate limiters of the models are already shared per endpoint and api key. Every job gets its own async client:
+    the connections of an async client are bound to the event loop that opened them, and each async job runs its own loop.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None) -> None:
+        """
+        budgets: maximal number of in-flight requests per provider (`model_arch` of the chat model), across all jobs
+        """
+        self.limiters = {provider: ConcurrencyLimiter(max_in_flight) for provider, max_in_flight in (budgets or {}).items()}
+        self.models: Dict[Any, BaseChat] = {}
+        self.caches: Dict[str, ResponseCache] = {}
+        self.lock = threading.Lock()
+
+    def get_cache(self, cache_cfg: Optional[Dict[str, Any]]) -> Optional[ResponseCache]:
+        if cache_cfg is None:
+            return None
+        key = json.dumps(cache_cfg, sort_keys=True)
+        with self.lock:
+            if key not in self.caches:
+                self.caches[key] = ResponseCache(**cache_cfg)
+            return self.caches[key]
+
+    @staticmethod
+    def with_own_async_client(model: BaseChat) -> BaseChat:
+        """
+        Shallow copy of a shared model with a new async client of the same endpoint, the other clients, the limiters and
+        the structured output mode stay shared.
+        """
+        async_client = model.async_client
+        model = copy.copy(model)
+        model.async_client = type(async_client)(api_key=async_client.api_key, base_url=async_client.base_url,
+                                                timeout=async_client.timeout, max_retries=async_client.max_retries)
+        return model
+
+    def get_model(self, model_id: str, model_cfg: Optional[Dict[str, Any]] = None, response_cache: Optional[ResponseCache] = None):
+        key = (model_id, json.dumps(model_cfg or {}, sort_keys=True))
+        with self.lock:
+            model = self.models.get(key)
+            if model is None:
+                model_cls = registry.get_chatmodel_class(model_id)
+                model = model_cls(model_id, model_cfg=model_cfg) if model_cfg else model_cls(model_id)
+                if model.thread_safe:
+                    self.models[key] = model
+            elif getattr(model, 'async_client', None) is not None:
+                model = self.with_own_async_client(model)
+        limiter = self.limiters.get(model.model_arch)
+        if limiter is not None:
+            model = InFlightChat(model, limiter)
+        # cache hits do not take a slot of the budget
+        if response_cache is not None:
+            model = CachedChat(model, response_cache)
+        return model
+
+
+class SweepTask(BaseTask):
+    """
+    BaseTask of a sweep job, whose models and response cache come from the ModelPool of the sweep.
+    """
+
+    def __init__(self, pool: ModelPool, cache_cfg: Optional[Dict] = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.pool = pool
+        self.response_cache = pool.get_cache(cache_cfg)
+
+    def get_model(self) -> BaseChat:
+        return self.pool.get_model(self.model_id, self.model_cfg, self.response_cache)
+
+    def reset_profile(self) -> None:
+        # the stages of concurrent jobs are aggregated for the whole sweep, a job must not drop the others
+        pass
+
+    def save_profile(self) -> None:
+        # the profiler mixes the stages of concurrent jobs, they are exported once for the whole sweep
+        pass
+
+
+class Sweep:
+    """
+    Runs the jobs of a sweep in one process, at most `max_parallel_jobs` at a time, under per-provider in-flight budgets.
+    A failed job is reported and does not stop the others.
+    """
+
+    def __init__(self, jobs: List[SweepJob], max_parallel_jobs: int = 4, budgets: Optional[Dict[str, int]] = None, log_dir: str = './logs/sweep', resume: bool = False) -> None:
+        assert max_parallel_jobs >= 1, "max_parallel_jobs must be a positive integer."
+        self.jobs = interleave_providers(jobs)
+        self.max_parallel_jobs = max_parallel_jobs
+        self.pool = ModelPool(budgets)
+        self.log_dir = log_dir
+        self.resume = resume
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any], resume: bool = False) -> "Sweep":
+        return cls(expand_sweep(spec), max_parallel_jobs=spec.get('max_parallel_jobs', 4), budgets=spec.get('budgets'),
+                   log_dir=spec.get('log_dir', './logs/sweep'), resume=resume)
+
+    def run_job(self, job: SweepJob) -> Dict[str, Any]:
+        print(f"[sweep] start {job.name}")
+        start = time.perf_counter()
+        result = {'name': job.name, 'params': job.params, 'log_file': job.cfg.get('log_file')}
+        try:
+            task = build_task(job.cfg, resume=self.resume, task_cls=SweepTask, pool=self.pool)
+            task.pipeline()
+            result['status'] = 'finished'
+        except Exception as e:
+            traceback.print_exc()
+            result.update(status='failed', error=repr(e))
+        result['duration'] = time.perf_counter() - start
+        print(f"[sweep] {result['status']} {job.name} in {result['duration']:.1f}s")
+        return result
+
+    def run(self) -> List[Dict[str, Any]]:
+        with ThreadPoolExecutor(max_workers=self.max_parallel_jobs) as pool:
+            results = list(pool.map(self.run_job, self.jobs))
+
+        num_failed = sum(result['status'] == 'failed' for result in results)
+        print(f"[sweep] {len(results) - num_failed}/{len(results)} jobs finished, {num_failed} failed.")
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(os.path.join(self.log_dir, 'sweep.json'), 'w') as f:
+            json.dump(results, f, indent=4)
+        profiler.save_json(os.path.join(self.log_dir, 'sweep.profile.json'))
+        profiler.save_prometheus(os.path.join(self.log_dir, 'sweep.prom'))
+        return results
@@ -0,0 +1,56 @@
+from PIL import Image
+from ours import ImageTxtSample
+from ours.datasets.base import BaseDataset, collate_fn, get_sample_id, strip_payload
+from ours.tasks.base import BaseTask
+
+
+class ImageListData(BaseDataset):
+    dataset_ids = ['image-list']
+
+    def __init__(self, dataset_id, image_paths, **kwargs):
+        super().__init__(dataset_id=dataset_id)
+        self.dataset = [ImageTxtSample(image_path=path, text='describe', target=str(i)) for i, path in enumerate(image_paths)]
+
+    def __getitem__(self, index):
+        return self.dataset[index]
+
+    def __len__(self):
+        return len(self.dataset)
+
+
+def make_images(tmp_path, num):
+    paths = []
+    for i in range(num):
+        path = str(tmp_path / f'{i}.jpg')
+        Image.new('RGB', (800, 600), color=(i, i, i)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_collate_fn_encodes_images(tmp_path):
+    sample = ImageTxtSample(image_path=make_images(tmp_path, 1)[0], text='describe')
+    plain = collate_fn([sample])[0]
+    encoded = collate_fn([sample], encode_images=True, max_image_size=200)[0]
+
+    assert 'encoded_image' not in plain['message'][0]['content']
+    assert encoded['message'][0]['content']['encoded_image'].mime_type == 'image/jpeg'
+    # payload 不影响 sample_id 与日志内容
+    assert strip_payload(encoded['message'][0]['content']) == plain['message'][0]['content']
+    assert get_sample_id(0, encoded['message']) == get_sample_id(0, plain['message'])
+
+
+def test_dataloader_workers_keep_order(tmp_path):
+    task = BaseTask(dataset_id='image-list', model_id='', dataloader_cfg={'num_workers': 2, 'encode_images': True})
+    task.dataset = ImageListData('image-list', make_images(tmp_path, 6))
+    batches = list(task.get_dataloader())
+    assert [batch[0]['target'] for batch in batches] == [str(i) for i in range(6)]
+    assert all('encoded_image' in batch[0]['message'][0]['content'] for batch in batches)
+
+
+def test_system_prompt_layout_puts_instructions_first(tmp_path):
+    sample = ImageTxtSample(image_path=make_images(tmp_path, 1)[0], text='describe')
+    message = collate_fn([sample], prompt_layout='system')[0]['message']
+
+    assert message[0] == {'role': 'system', 'content': 'describe'}
+    assert message[1]['role'] == 'user' and message[1]['content']['text'] == ''
+    assert message[1]['content']['image_path'] == sample.image_path
@@ -0,0 +1,68 @@
+import json
+import os
+import pickle
+import numpy as np
+import pytest
+from ours import ImageTxtSample, TxtSample
+from ours.datasets.jsonl import JsonlDataset, JsonlIndex
+
+
+def write_jsonl(path, records, blank_lines=False):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if blank_lines:
+                f.write('\n  \r\n')
+
+
+def test_index_random_access(tmp_path):
+    path = str(tmp_path / 'data.jsonl')
+    records = [{'question': f'问题 {i}', 'answer': i} for i in range(1000)]
+    write_jsonl(path, records, blank_lines=True)
+    index = JsonlIndex(path)
+
+    assert len(index) == 1000
+    assert index[0] == records[0] and index[537] == records[537] and index[-1] == records[-1]
+    assert os.path.exists(path + '.idx.npy')
+
+
+def test_index_is_reused_and_rebuilt_when_stale(tmp_path):
+    path = str(tmp_path / 'data.jsonl')
+    write_jsonl(path, [{'i': i} for i in range(10)])
+    JsonlIndex(path)
+    reopened = JsonlIndex(path)
+    # 复用磁盘上的索引 (memmap)
+    assert reopened.load() is not None and len(reopened) == 10
+
+    # 文件变化后索引失效并重建
+    write_jsonl(path, [{'i': i} for i in range(20)])
+    rebuilt = JsonlIndex(path)
+    assert len(rebuilt) == 20 and rebuilt[19] == {'i': 19}
+
+
+def test_dataset_builds_samples_lazily(tmp_path):
+    path = str(tmp_path / 'data.jsonl')
+    write_jsonl(path, [{'question': 'q0', 'answer': 'a0'}, {'question': 'q1', 'answer': 'a1', 'image': '1.jpg'}, {'question': 'q2', 'answer': 'a2'}])
+    dataset = JsonlDataset('jsonl', path=path, nums=2, fields={'text': 'question', 'target': 'answer', 'image_path': 'image'}, image_dir='images')
+
+    assert len(dataset) == 2
+    assert dataset[0] == TxtSample(text='q0', target='a0')
+    assert dataset[1] == ImageTxtSample(image_path=os.path.join('images', '1.jpg'), text='q1', target='a1')
+
+    restored = pickle.loads(pickle.dumps(dataset))
+    assert restored[1] == dataset[1]
+
+
+def test_unpickled_index_maps_the_saved_offsets(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data.jsonl')
+    write_jsonl(path, [{'i': i} for i in range(10)])
+    index = JsonlIndex(path)
+
+    # 子进程中不应重新扫描文件
+    monkeypatch.setattr(JsonlIndex, 'build', lambda self: pytest.fail("the file was scanned again"))
+    restored = pickle.loads(pickle.dumps(index))
+    assert isinstance(restored.offsets, np.memmap) and len(restored) == 10 and restored[7] == {'i': 7}
+
+    # 索引无法保存时随对象一起序列化
+    index.offsets_path = None
+    assert pickle.loads(pickle.dumps(index))[9] == {'i': 9}
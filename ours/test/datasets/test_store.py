@@ -0,0 +1,60 @@
+import json
+import pickle
+import numpy as np
+from ours import ImageTxtSample
+from ours.datasets.anomaly_detection import AnomalyData, ANSWER_CONDITIONS
+from ours.datasets.store import StringTable, LabelMatrix, UNCERTAIN
+from ours.evaluators.rule_eval import CheXpertKeywordEvaluator
+
+
+def make_annotation(tmp_path, num_samples):
+    rng = np.random.default_rng(0)
+    samples = [{'image_filename': f'{i:05d}.jpg', 'labels': {condition: int(rng.random() < 0.3) for condition in ANSWER_CONDITIONS}} for i in range(num_samples)]
+    samples[1]['labels']['Edema'] = -1
+    annotation_file = tmp_path / 'labels.json'
+    annotation_file.write_text(json.dumps({'samples': samples}))
+    return samples, str(annotation_file)
+
+
+def test_string_table():
+    strings = ['a.jpg', '', '图像/胸片.png', 'x' * 300]
+    table = StringTable(strings)
+    assert list(table) == strings and len(table) == 4 and table[-1] == strings[-1]
+    assert pickle.loads(pickle.dumps(table))[2] == strings[2]
+
+
+def test_label_matrix():
+    labels = [{'A': 1, 'B': 0}, {'B': -1}, {'A': 0, 'C': 1}]
+    matrix = LabelMatrix.from_dicts(labels)
+    assert matrix.columns == ['A', 'B', 'C'] and matrix.matrix.dtype == np.uint8
+    assert matrix.matrix[1, 1] == UNCERTAIN
+    # 缺失的标签为 0
+    assert matrix[1] == {'A': 0, 'B': -1, 'C': 0}
+    assert matrix.select(['C', 'B', 'D']).tolist() == [[0, 0, 0], [0, -1, 0], [1, 0, 0]]
+    assert list(matrix.take([2, 0])) == [matrix[2], matrix[0]]
+
+
+def test_anomaly_data_store(tmp_path):
+    samples, annotation_file = make_annotation(tmp_path, 50)
+    dataset = AnomalyData('anomaly-detection', image_dir=str(tmp_path), annotation_file=annotation_file, nums=40)
+
+    assert len(dataset) == 40
+    sample = dataset[7]
+    assert isinstance(sample, ImageTxtSample) and not hasattr(sample, '__dict__')
+    assert sample.image_path == str(tmp_path / samples[7]['image_filename'])
+    assert {name: sample.target[name] for name in samples[7]['labels']} == samples[7]['labels']
+    assert dataset[1].target['Edema'] == -1
+    # dataloader workers receive a pickled copy of the dataset
+    assert pickle.loads(pickle.dumps(dataset))[7] == sample
+
+
+def test_evaluator_reads_label_matrix(tmp_path):
+    samples, annotation_file = make_annotation(tmp_path, 30)
+    dataset = AnomalyData('anomaly-detection', image_dir=str(tmp_path), annotation_file=annotation_file, nums=30)
+    evaluator = CheXpertKeywordEvaluator('rule_chexpert_eval', metrics_cfg={})
+    preds = [json.dumps(sample['labels']) for sample in samples]
+    indices = [3, 0, 17, 29]
+
+    _, from_matrix, _ = evaluator.process([preds[i] for i in indices], dataset.label_matrix.take(indices), None)
+    _, from_dicts, _ = evaluator.process([preds[i] for i in indices], [samples[i]['labels'] for i in indices], None)
+    assert np.array_equal(from_matrix, from_dicts)
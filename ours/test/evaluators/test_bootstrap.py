@@ -0,0 +1,63 @@
+import json
+import numpy as np
+import pytest
+from sklearn.metrics import f1_score
+from ours.evaluators.bootstrap import bootstrap_metric, bootstrap_metrics
+from ours.evaluators.base import SequentialEvaluator
+from ours.evaluators.state import ConfusionState
+
+
+def random_labels(num_samples=2000, num_classes=5, seed=0):
+    rng = np.random.default_rng(seed)
+    y_true = (rng.random((num_samples, num_classes)) < 0.2).astype(int)
+    y_pred = np.where(rng.random(y_true.shape) < 0.85, y_true, 1 - y_true)
+    return y_true, y_pred
+
+
+def test_batched_state_matches_single_states():
+    states = [ConfusionState.from_arrays(*random_labels(100, seed=seed)) for seed in range(4)]
+    batch = ConfusionState(states[0].classes, tp=[state.tp for state in states], fp=[state.fp for state in states], fn=[state.fn for state in states],
+                           num_samples=[state.num_samples for state in states], num_exact=[state.num_exact for state in states], multilabel=True)
+    report = batch.report(zero_division=0)
+    for i, state in enumerate(states):
+        expected = state.report(zero_division=0)
+        assert report['subset_accuracy'][i] == pytest.approx(expected['subset_accuracy'])
+        assert report['macro']['f1'][i] == pytest.approx(expected['macro']['f1'])
+        assert report['per_class']['3']['specificity'][i] == pytest.approx(expected['per_class']['3']['specificity'])
+        assert batch.f1(average='weighted', zero_division=0)[i] == pytest.approx(state.f1(average='weighted', zero_division=0))
+
+
+def test_confusion_bootstrap_matches_index_resampling():
+    y_true, y_pred = random_labels()
+    low, high = bootstrap_metric('f1_score', y_true, y_pred, num_resamples=1000, average='macro')
+    # 朴素的逐次重采样作为参照
+    rng = np.random.default_rng(1)
+    scores = [f1_score(y_true[indices], y_pred[indices], average='macro') for indices in rng.integers(0, len(y_true), (1000, len(y_true)))]
+    assert low == pytest.approx(np.percentile(scores, 2.5), abs=0.015)
+    assert high == pytest.approx(np.percentile(scores, 97.5), abs=0.015)
+    assert low < f1_score(y_true, y_pred, average='macro') < high
+    # 相同 seed 结果可复现
+    assert bootstrap_metric('f1_score', y_true, y_pred, num_resamples=1000, average='macro') == [low, high]
+
+
+def test_bootstrap_metrics():
+    y_true, y_pred = random_labels(num_classes=1)
+    y_true, y_pred = y_true[:, 0], y_pred[:, 0]
+    intervals = bootstrap_metrics({'accuracy_score': {}, 'pred_mean': {}, 'pred_no_op': {}, 'multilabel_report': None}, y_true, y_pred, num_resamples=300)
+    assert set(intervals) == {'accuracy_score', 'pred_mean', 'multilabel_report'}
+    assert intervals['pred_mean'][0] < y_pred.mean() < intervals['pred_mean'][1]
+    assert len(intervals['multilabel_report']['per_class']['1']['f1']) == 2
+
+
+def test_evaluator_reports_intervals():
+    evaluator = SequentialEvaluator({'rule_chexpert_eval': {'metrics_cfg': {'accuracy_score': {}, 'f1_score': {'average': 'micro'}}}})
+    label_names = list(evaluator.evaluator_seq[0].keyword_map.keys())
+    rng = np.random.default_rng(0)
+    labels = [{name: int(rng.random() < 0.3) for name in label_names} for _ in range(300)]
+    preds = [json.dumps({name: value if rng.random() < 0.9 else 1 - value for name, value in label.items()}) for label in labels]
+
+    results = evaluator(preds, labels, bootstrap_cfg={'num_resamples': 500})
+    low, high = results['rule_chexpert_eval:f1_score:ci']
+    assert low < results['rule_chexpert_eval:f1_score'] < high
+    assert 'rule_chexpert_eval:accuracy_score:ci' in results
+    assert 'rule_chexpert_eval:f1_score:ci' not in evaluator(preds, labels)
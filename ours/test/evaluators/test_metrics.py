@@ -0,0 +1,61 @@
+import json
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support, confusion_matrix
+from ours.evaluators.metrics import multilabel_report, specificity_score, subset_accuracy
+from ours.evaluators.rule_eval import CheXpertKeywordEvaluator
+from ours.evaluators.state import get_metric_state, merge_metric_states, compute_metric
+
+
+def random_labels(num_samples=300, num_classes=9, seed=0):
+    rng = np.random.default_rng(seed)
+    y_true = (rng.random((num_samples, num_classes)) < 0.25).astype(int)
+    y_pred = np.where(rng.random(y_true.shape) < 0.8, y_true, 1 - y_true)
+    # 一个从未出现也从未预测的类别
+    y_true[:, -1] = y_pred[:, -1] = 0
+    return y_true, y_pred
+
+
+def test_multilabel_report_matches_sklearn():
+    y_true, y_pred = random_labels()
+    names = [f'c{i}' for i in range(y_true.shape[1])]
+    report = multilabel_report(y_true, y_pred, target_names=names, zero_division=0)
+
+    assert report['subset_accuracy'] == pytest.approx(accuracy_score(y_true, y_pred))
+    for average in ['micro', 'macro']:
+        precision, recall, f1, _ = precision_recall_fscore_support(y_true, y_pred, average=average, zero_division=0)
+        assert [report[average][key] for key in ['precision', 'recall', 'f1']] == pytest.approx([precision, recall, f1])
+    precision, recall, f1, support = precision_recall_fscore_support(y_true, y_pred, average=None, zero_division=0)
+    for i, name in enumerate(names):
+        tn, fp, fn, tp = confusion_matrix(y_true[:, i], y_pred[:, i], labels=[0, 1]).ravel()
+        assert report['per_class'][name] == pytest.approx({'precision': precision[i], 'recall': recall[i], 'f1': f1[i],
+                                                           'specificity': tn / (tn + fp), 'support': support[i]})
+
+
+def test_specificity_and_subset_accuracy():
+    y_true, y_pred = np.array([1, 0, 0, 1, 0]), np.array([1, 1, 0, 0, 0])
+    assert specificity_score(y_true, y_pred) == pytest.approx(2 / 3)
+    assert subset_accuracy(y_true, y_pred) == pytest.approx(0.6)
+
+    y_true, y_pred = random_labels(seed=1)
+    tn = ((y_true == 0) & (y_pred == 0)).sum()
+    fp = ((y_true == 0) & (y_pred == 1)).sum()
+    assert specificity_score(y_true, y_pred, average='micro') == pytest.approx(tn / (tn + fp))
+
+
+def test_report_from_merged_states():
+    y_true, y_pred = random_labels(seed=2)
+    states = [get_metric_state('multilabel_report', y_true[i::3], y_pred[i::3]) for i in range(3)]
+    merged = compute_metric('multilabel_report', merge_metric_states('multilabel_report', states), zero_division=0)
+    assert merged == multilabel_report(y_true, y_pred, zero_division=0)
+
+
+def test_chexpert_evaluator_report():
+    evaluator = CheXpertKeywordEvaluator('rule_chexpert_eval', metrics_cfg={'multilabel_report': {'zero_division': 0}})
+    label_names = list(evaluator.keyword_map.keys())
+    labels = [{name: int(i % (j + 2) == 0) for j, name in enumerate(label_names)} for i in range(40)]
+    preds = [json.dumps({name: 1 for name in label_names}) for _ in labels]
+
+    report = evaluator(preds, labels)['multilabel_report']
+    assert list(report['per_class']) == label_names
+    assert report['per_class']['Atelectasis']['recall'] == 1.0 and report['micro']['specificity'] == 0.0
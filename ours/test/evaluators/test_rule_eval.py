@@ -0,0 +1,56 @@
+import json
+import numpy as np
+from ours.evaluators.rule_eval import CheXpertKeywordEvaluator, parse_json_answer, to_label_matrix
+
+
+def test_parse_json_answer():
+    answer = {"Edema": 1, "Fracture": 0}
+    assert parse_json_answer(json.dumps(answer)) == answer
+    assert parse_json_answer("```json\n" + json.dumps(answer) + "\n```") == answer
+    # 答案后附带解释 (之前报 "Extra data")
+    assert parse_json_answer(json.dumps(answer) + "\nExplanation: {see above}") == answer
+    assert parse_json_answer("Here is my answer: " + json.dumps(answer)) == answer
+    assert parse_json_answer("no json here") is None
+    assert parse_json_answer("[1, 0]") is None
+    assert parse_json_answer(None) is None
+
+
+def test_to_label_matrix():
+    failures = np.zeros(4, dtype=bool)
+    matrix = to_label_matrix([{"a": "1", "b": True}, None, {"a": "yes"}, {"b": 1.0}], ["a", "b"], failures)
+    assert matrix.tolist() == [[1, 1], [0, 0], [0, 0], [0, 1]]
+    assert failures.tolist() == [False, True, True, False]
+
+
+def test_process_batch():
+    evaluator = CheXpertKeywordEvaluator('rule_chexpert_eval', metrics_cfg={})
+    label_names = list(evaluator.keyword_map.keys())
+    rng = np.random.default_rng(0)
+    labels = [{name: int(rng.random() < 0.3) for name in label_names} for _ in range(200)]
+    preds = [json.dumps(label) + "\nExplanation: based on the lung fields." for label in labels]
+    preds[5], preds[9] = "I cannot tell.", 42
+
+    processed_preds, processed_labels, _, parse_failures = evaluator.process_with_failures(preds, labels, None)
+    expected = np.array([[label[name] for name in label_names] for label in labels])
+    assert processed_preds.shape == processed_labels.shape == (200, len(label_names))
+    assert np.array_equal(processed_labels, expected)
+    assert np.flatnonzero(parse_failures).tolist() == [5, 9]
+    assert not processed_preds[[5, 9]].any()
+    assert np.array_equal(evaluator.process(preds, labels, None)[0], processed_preds)
+    keep = ~parse_failures
+    assert np.array_equal(processed_preds[keep], expected[keep])
+
+
+def test_eval_reports_parse_failures():
+    evaluator = CheXpertKeywordEvaluator('rule_chexpert_eval', metrics_cfg={'accuracy_score': {}})
+    label_names = list(evaluator.keyword_map.keys())
+    labels = [{name: 0 for name in label_names} for _ in range(4)]
+    preds = [json.dumps(label) for label in labels]
+    preds[1] = "I cannot tell."
+
+    per_sample_results = {}
+    results = evaluator(preds, labels, per_sample_results=per_sample_results)
+    assert results['parse_failure_rate'] == 0.25
+    # 逐样本的 mask 不放进打印的指标中
+    assert all(not isinstance(value, list) for value in results.values())
+    assert per_sample_results == {'parse_failure': [False, True, False, False]}
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from ours.evaluators.metrics import pred_mean, failure
+from ours.evaluators.state import get_metric_state, merge_metric_states, compute_metric, RunningMetrics
+
+SKLEARN_METRICS = {'accuracy_score': accuracy_score, 'precision_score': precision_score, 'recall_score': recall_score, 'f1_score': f1_score}
+
+
+def merged_metric(metrics_id, y_true, y_pred, num_shards, **kwargs):
+    # 按样本随机切分为若干 shard, 合并各 shard 的状态后计算指标
+    shard_of = np.random.default_rng(0).integers(0, num_shards, len(y_true))
+    states = [get_metric_state(metrics_id, y_true[shard_of == i], y_pred[shard_of == i], **kwargs) for i in range(num_shards)]
+    return compute_metric(metrics_id, merge_metric_states(metrics_id, states), **kwargs)
+
+
+@pytest.mark.parametrize('kwargs', [{'average': 'micro'}, {'average': 'macro', 'zero_division': 0}, {'average': 'weighted', 'zero_division': 0}, {'average': None, 'zero_division': 0}])
+def test_multilabel_states_match_sklearn(kwargs):
+    rng = np.random.default_rng(1)
+    y_true = (rng.random((200, 13)) < 0.2).astype(int)
+    y_pred = (rng.random((200, 13)) < 0.2).astype(int)
+    y_pred[:, 5] = 0  # 一个从未被预测的类别: zero_division
+
+    assert merged_metric('accuracy_score', y_true, y_pred, 4) == accuracy_score(y_true, y_pred)
+    for metrics_id in ['precision_score', 'recall_score', 'f1_score']:
+        expected = SKLEARN_METRICS[metrics_id](y_true, y_pred, **kwargs)
+        assert np.allclose(merged_metric(metrics_id, y_true, y_pred, 4, **kwargs), expected)
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'average': 'macro'}, {'average': 'micro'}])
+def test_single_label_states_match_sklearn(kwargs):
+    rng = np.random.default_rng(2)
+    num_classes = 2 if not kwargs else 4
+    y_true, y_pred = rng.integers(0, num_classes, 101), rng.integers(0, num_classes, 101)
+
+    assert merged_metric('accuracy_score', y_true, y_pred, 3) == accuracy_score(y_true, y_pred)
+    for metrics_id in ['precision_score', 'recall_score', 'f1_score']:
+        assert np.isclose(merged_metric(metrics_id, y_true, y_pred, 3, **kwargs), SKLEARN_METRICS[metrics_id](y_true, y_pred, **kwargs))
+
+
+def test_sum_states():
+    y_pred = np.array([1.0, np.nan, 3.0, -1.0, 2.0, np.nan])
+    finite = y_pred[~np.isnan(y_pred)]
+    assert np.isclose(merged_metric('pred_mean', finite, finite, 2), pred_mean(None, finite))
+    assert merged_metric('failure', y_pred, y_pred, 2) == failure(None, y_pred)
+    assert merged_metric('failure', y_pred, y_pred, 2, fails_num=-1) == failure(None, y_pred, fails_num=-1)
+
+
+def test_metrics_without_state():
+    assert get_metric_state('pearson_corr', [1, 2], [1, 2]) is None
+
+
+def test_running_metrics_match_batch_metrics():
+    rng = np.random.default_rng(3)
+    y_true = (rng.random((120, 6)) < 0.3).astype(int)
+    y_pred = np.where(rng.random(y_true.shape) < 0.8, y_true, 1 - y_true)
+    metrics_cfg = {'accuracy_score': {}, 'f1_score': {'average': 'macro', 'zero_division': 0}, 'pred_no_op': {}}
+    running = RunningMetrics(metrics_cfg)
+    assert running.compute() == {}
+    # 逐个样本更新
+    for i in range(len(y_true)):
+        running.update(y_true[i:i + 1], y_pred[i:i + 1])
+
+    assert running.num_samples == 120 and running.unsupported == ['pred_no_op']
+    assert running.compute() == pytest.approx({'accuracy_score': accuracy_score(y_true, y_pred), 'f1_score': f1_score(y_true, y_pred, average='macro', zero_division=0)})
@@ -0,0 +1,348 @@
+"""
+Local stand-in for an OpenAI-compatible provider, implementing the chat-completions (plain and streamed), files and batches endpoints,
+with configurable latency, server errors and rate limiting so that the pipeline can be tested and benchmarked offline.
+
+Usage:
+    with MockOpenAIServer(latency={'dist': 'lognormal', 'median': 0.5, 'sigma': 0.4}, rate_limit_rate=0.05) as server:
+        client = OpenAI(base_url=server.base_url, api_key='mock')
+
+    # standalone, e.g., for run_task.py with `model_cfg.base_url=http://127.0.0.1:8000/v1`
+    python -m ours.test.mock_server --port 8000 --latency-median 0.5 --latency-sigma 0.4 --rate-limit-rate 0.05
+"""
+import argparse
+import email.parser
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+
+def echo_responder(body: Dict[str, Any]) -> str:
+    # answer with the text of the last user message
+    content = body['messages'][-1]['content']
+    if isinstance(content, list):
+        content = ' '.join(part.get('text', '') for part in content if part.get('type') == 'text')
+    return content
+
+
+def sample_latency(spec: Union[None, float, Dict[str, Any]], rng: random.Random) -> float:
+    """
+    Draw a latency in seconds from `spec`:
+        None or a number: constant
+        {'dist': 'uniform', 'low': ..., 'high': ...}
+        {'dist': 'normal', 'mean': ..., 'std': ...}
+        {'dist': 'lognormal', 'median': ..., 'sigma': ...}, heavy-tailed like real API latencies
+        {'dist': 'exponential', 'mean': ...}
+    """
+    if spec is None:
+        return 0.0
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    dist = spec.get('dist', 'constant')
+    if dist == 'constant':
+        value = spec.get('value', 0.0)
+    elif dist == 'uniform':
+        value = rng.uniform(spec['low'], spec['high'])
+    elif dist == 'normal':
+        value = rng.gauss(spec['mean'], spec['std'])
+    elif dist == 'lognormal':
+        value = rng.lognormvariate(math.log(spec['median']), spec['sigma'])
+    elif dist == 'exponential':
+        value = rng.expovariate(1.0 / spec['mean'])
+    else:
+        raise ValueError(f"Unknown latency distribution {dist}.")
+    return max(0.0, min(value, spec.get('max', float('inf'))))
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # many concurrent clients connect at once in benchmarks
+    request_queue_size = 1024
+
+
+class MockOpenAIServer:
+    def __init__(self, responder: Callable[[Dict[str, Any]], str] = echo_responder, host: str = '127.0.0.1', port: int = 0, stream_chunk_size: int = 4, stream_delay: float = 0,
+                 response_formats: Sequence[str] = ('json_schema', 'json_object'), latency: Union[None, float, Dict[str, Any]] = None,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: Optional[float] = 0.1, seed: Optional[int] = None) -> None:
+        """
+        Arguments:
+            responder: function from a chat-completion request body to the content of the answer
+            host, port: address to listen on, port 0 picks a free port
+            stream_chunk_size: characters per chunk of streamed answers
+            stream_delay: seconds between two chunks of streamed answers
+            response_formats: `response_format` types accepted, requests with other types are rejected with a 400
+            latency: latency of chat completions before the first byte, see `sample_latency`
+            error_rate: fraction of chat completions failing with a 500
+            rate_limit_rate: fraction of chat completions rejected with a 429
+            retry_after: seconds sent in the Retry-After header of 429s, None to omit the header
+            seed: seed of the latency and error draws
+        """
+        self.response_formats = set(response_formats)
+        self.rejected_response_formats: List[str] = []
+        self.responder = responder
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_delay = stream_delay
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.num_chat_requests = 0
+        # chat completions received on /chat/completions, the others come from batches
+        self.num_online_chat_requests = 0
+        self.num_errors = 0
+        self.num_rate_limited = 0
+        self.last_prompt = ''
+        self.lock = threading.Lock()
+        self.httpd = _HTTPServer((host, port), self._make_handler())
+        self.thread: Optional[threading.Thread] = None
+
+    def draw_fault(self) -> Optional[int]:
+        """
+        Status code of an injected failure for the next chat completion, None if it succeeds.
+        """
+        with self.lock:
+            draw = self.rng.random()
+            if draw < self.rate_limit_rate:
+                self.num_rate_limited += 1
+                return 429
+            if draw < self.rate_limit_rate + self.error_rate:
+                self.num_errors += 1
+                return 500
+        return None
+
+    def draw_latency(self) -> float:
+        with self.lock:
+            return sample_latency(self.latency, self.rng)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    # ---- provider logic ----
+
+    def chat_completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            self.num_chat_requests += 1
+        content = self.responder(body)
+        prompt = json.dumps(body['messages'])
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = max(1, len(content) // 4)
+        # prefix caching: the prompt prefix shared with the previous request is cached, by blocks of 16 tokens
+        with self.lock:
+            common = len(os.path.commonprefix([prompt, self.last_prompt]))
+            self.last_prompt = prompt
+        cached_tokens = common // 4 // 16 * 16
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop', 'logprobs': None}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens,
+                      'prompt_tokens_details': {'cached_tokens': cached_tokens}},
+        }
+
+    def chat_completion_chunks(self, body: Dict[str, Any]):
+        """
+        Streamed version of `chat_completion`, yields the chunks of the answer.
+        """
+        completion = self.chat_completion(body)
+        content = completion['choices'][0]['message']['content']
+        base = {k: completion[k] for k in ['id', 'created', 'model']}
+        base['object'] = 'chat.completion.chunk'
+        yield {**base, 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}]}
+        for start in range(0, len(content), self.stream_chunk_size):
+            yield {**base, 'choices': [{'index': 0, 'delta': {'content': content[start:start + self.stream_chunk_size]}, 'finish_reason': None}]}
+        yield {**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+        if (body.get('stream_options') or {}).get('include_usage'):
+            yield {**base, 'choices': [], 'usage': completion['usage']}
+
+    def create_file(self, content: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        with self.lock:
+            self.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()), 'filename': filename, 'purpose': purpose, 'status': 'processed'}
+
+    def create_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        batch = {
+            'id': f"batch_{uuid.uuid4().hex[:12]}",
+            'object': 'batch',
+            'endpoint': body['endpoint'],
+            'input_file_id': body['input_file_id'],
+            'completion_window': body['completion_window'],
+            'status': 'validating',
+            'created_at': int(time.time()),
+            'output_file_id': None,
+            'error_file_id': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+        }
+        with self.lock:
+            self.batches[batch['id']] = batch
+        return batch
+
+    def retrieve_batch(self, batch_id: str) -> Dict[str, Any]:
+        batch = self.batches[batch_id]
+        # the batch is processed on the second status check, so that clients have to poll
+        if batch['status'] == 'validating':
+            batch['status'] = 'in_progress'
+        elif batch['status'] == 'in_progress':
+            self._process_batch(batch)
+        return batch
+
+    def _process_batch(self, batch: Dict[str, Any]) -> None:
+        outputs, errors = [], []
+        for line in self.files[batch['input_file_id']].decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            try:
+                body = self.chat_completion(request['body'])
+                outputs.append({'id': f"batch_req_{uuid.uuid4().hex[:8]}", 'custom_id': request['custom_id'], 'response': {'status_code': 200, 'body': body}, 'error': None})
+            except Exception as e:
+                errors.append({'id': f"batch_req_{uuid.uuid4().hex[:8]}", 'custom_id': request['custom_id'], 'response': None, 'error': {'code': 'server_error', 'message': str(e)}})
+        batch['output_file_id'] = self.create_file(''.join(json.dumps(o) + '\n' for o in outputs).encode('utf-8'), 'output.jsonl', 'batch_output')['id']
+        if errors:
+            batch['error_file_id'] = self.create_file(''.join(json.dumps(e) + '\n' for e in errors).encode('utf-8'), 'errors.jsonl', 'batch_output')['id']
+        batch['request_counts'] = {'total': len(outputs) + len(errors), 'completed': len(outputs), 'failed': len(errors)}
+        batch['status'] = 'completed'
+
+    # ---- HTTP layer ----
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, chunks) -> None:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                        if server.stream_delay:
+                            time.sleep(server.stream_delay)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client closed the stream early
+                    pass
+                self.close_connection = True
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def do_POST(self) -> None:
+                raw = self._read_body()
+                if self.path.endswith('/chat/completions'):
+                    with server.lock:
+                        server.num_online_chat_requests += 1
+                    body = json.loads(raw)
+                    response_format = (body.get('response_format') or {}).get('type')
+                    fault = server.draw_fault()
+                    time.sleep(server.draw_latency())
+                    if fault == 429:
+                        headers = {'Retry-After': str(server.retry_after)} if server.retry_after is not None else None
+                        self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'rate_limit_error'}}, headers)
+                    elif fault == 500:
+                        self._send_json(500, {'error': {'message': 'Internal server error', 'type': 'server_error'}})
+                    elif response_format is not None and response_format not in server.response_formats:
+                        server.rejected_response_formats.append(response_format)
+                        self._send_json(400, {'error': {'message': f"response_format type {response_format} is not supported", 'type': 'invalid_request_error', 'param': 'response_format'}})
+                    elif body.get('stream'):
+                        self._send_stream(server.chat_completion_chunks(body))
+                    else:
+                        self._send_json(200, server.chat_completion(body))
+                elif self.path.endswith('/files'):
+                    message = email.parser.BytesParser().parsebytes(b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + raw)
+                    fields = {part.get_param('name', header='content-disposition'): part for part in message.get_payload()}
+                    file_part = fields['file']
+                    self._send_json(200, server.create_file(file_part.get_payload(decode=True), file_part.get_filename(), fields['purpose'].get_payload(decode=True).decode()))
+                elif self.path.endswith('/batches'):
+                    self._send_json(200, server.create_batch(json.loads(raw)))
+                else:
+                    self._send_json(404, {'error': {'message': f"unknown path {self.path}"}})
+
+            def do_GET(self) -> None:
+                parts = self.path.split('?')[0].rstrip('/').split('/')
+                if len(parts) >= 2 and parts[-2] == 'batches' and parts[-1] in server.batches:
+                    self._send_json(200, server.retrieve_batch(parts[-1]))
+                elif len(parts) >= 3 and parts[-1] == 'content' and parts[-2] in server.files:
+                    data = server.files[parts[-2]]
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/octet-stream')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                else:
+                    self._send_json(404, {'error': {'message': f"unknown path {self.path}"}})
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency-median', type=float, default=0.0, help='median latency (s) of chat completions, lognormal')
+    parser.add_argument('--latency-sigma', type=float, default=0.0, help='sigma of the lognormal latency, 0 for a constant latency')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--stream-delay', type=float, default=0.0)
+    parser.add_argument('--answer', default=None, help='fixed answer of every chat completion, echo the prompt if not given')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    latency = {'dist': 'lognormal', 'median': args.latency_median, 'sigma': args.latency_sigma} if args.latency_sigma > 0 else args.latency_median
+    responder = (lambda body: args.answer) if args.answer is not None else echo_responder
+    server = MockOpenAIServer(responder=responder, host=args.host, port=args.port, stream_delay=args.stream_delay, latency=latency,
+                              error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    print(f"Mock OpenAI-compatible server listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import random
+import pytest
+from ours.models.base import BaseChat, Response
+from ours.tasks.base import BaseTask
+from ours.utils.checkpoint import Checkpoint
+
+
+class EchoChat(BaseChat):
+    model_family = ['echo']
+
+    def chat(self, messages, **generation_kwargs):
+        return Response(self.model_id, messages[0]['content'], None, 'stop')
+
+    async def achat(self, messages, **generation_kwargs):
+        # 随机延迟, 使请求乱序完成
+        await asyncio.sleep(random.random() * 0.01)
+        return self.chat(messages, **generation_kwargs)
+
+
+def make_batches(num):
+    return [[{'message': [{'role': 'user', 'content': f'sample-{i}'}], 'target': i, 'extra': None}] for i in range(num)]
+
+
+class ListLoader(list):
+    dataset = property(lambda self: [data for batch in self for data in batch])
+
+
+def test_async_generate_keeps_dataset_order():
+    task = BaseTask(dataset_id='', model_id='echo', executor='async', max_concurrency=8)
+    task.model = EchoChat('echo')
+    responses = task.generate(ListLoader(make_batches(50)))
+
+    assert [response['target'] for response in responses] == list(range(50))
+    assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(50)]
+
+
+def test_sequential_and_async_generate_agree():
+    outputs = {}
+    for executor in ['sequential', 'async']:
+        task = BaseTask(dataset_id='', model_id='echo', executor=executor, max_concurrency=4)
+        task.model = EchoChat('echo')
+        outputs[executor] = task.generate(ListLoader(make_batches(20)))
+    assert outputs['sequential'] == outputs['async']
+
+
+class UnsafeChat(EchoChat):
+    thread_safe = False
+    instances = 0
+
+    def __init__(self, model_id):
+        super().__init__(model_id)
+        UnsafeChat.instances += 1
+
+
+def test_threaded_generate_keeps_dataset_order():
+    task = BaseTask(dataset_id='', model_id='echo', executor='thread', max_concurrency=4)
+    task.model = UnsafeChat('echo')
+    # 非线程安全模型: 每个工作线程各自创建实例
+    task.get_model = lambda: UnsafeChat('echo')
+    responses = task.generate(ListLoader(make_batches(30)))
+
+    assert [response['target'] for response in responses] == list(range(30))
+    assert UnsafeChat.instances <= 1 + 4
+
+
+class CrashingChat(EchoChat):
+    # 所有实例 (包括线程执行器中每个线程各自的实例) 共享调用计数
+    calls = []
+
+    def __init__(self, model_id, crash_at=None, fail_at=None):
+        super().__init__(model_id)
+        self.crash_at = crash_at
+        self.fail_at = fail_at
+
+    def chat(self, messages, **generation_kwargs):
+        if len(CrashingChat.calls) == self.crash_at:
+            raise RuntimeError("crash")
+        CrashingChat.calls.append(messages[0]['content'])
+        if messages[0]['content'] == self.fail_at:
+            # 与各模型封装一致: 生成失败时返回错误文本, finish_reason 为 None
+            return Response(self.model_id, "Error: failed to generate response", None, None)
+        return super().chat(messages, **generation_kwargs)
+
+
+@pytest.mark.parametrize('executor', ['sequential', 'thread', 'async'])
+def test_resume_from_checkpoint_only_runs_missing_samples(tmp_path, executor):
+    checkpoint_file = str(tmp_path / 'responses.jsonl')
+    CrashingChat.calls = []
+    task = BaseTask(dataset_id='', model_id='echo', checkpoint_file=checkpoint_file)
+    task.checkpoint = Checkpoint(checkpoint_file)
+    task.model = CrashingChat('echo', crash_at=7, fail_at='sample-2')
+    with pytest.raises(RuntimeError):
+        task.generate(ListLoader(make_batches(10)))
+    task.checkpoint.close()
+
+    # 模拟崩溃时写了一半的行
+    with open(checkpoint_file, 'a') as f:
+        f.write('{"sample_id": "trunc')
+
+    CrashingChat.calls = []
+    task = BaseTask(dataset_id='', model_id='echo', executor=executor, max_concurrency=2)
+    task.checkpoint = Checkpoint(checkpoint_file, resume=True)
+    task.model = CrashingChat('echo')
+    task.get_model = lambda: CrashingChat('echo')
+    responses = task.generate(ListLoader(make_batches(10)))
+    task.checkpoint.close()
+    assert [response['target'] for response in responses] == list(range(10))
+    assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(10)]
+    # 失败的样本 2 与崩溃后未完成的 7, 8, 9 被重新生成
+    assert sorted(CrashingChat.calls) == ['sample-2', 'sample-7', 'sample-8', 'sample-9']
+
+
+class JsonAnswerChat(EchoChat):
+    def chat(self, messages, **generation_kwargs):
+        # 奇数样本回答 Edema 阳性
+        index = int(messages[0]['content'].split('-')[1])
+        return Response(self.model_id, '{"Edema": %d}' % (index % 2), None, 'stop')
+
+
+def test_sharded_runs_merge_to_single_run_metrics(tmp_path):
+    from ours.tasks.shard import merge_shards, get_shard_path
+    evaluator_seq_cfgs = [{'rule_chexpert_eval': {'metrics_cfg': {'accuracy_score': {}, 'f1_score': {'average': 'macro', 'zero_division': 0}}}}]
+    batches = [[{'message': [{'role': 'user', 'content': f'sample-{i}'}], 'target': {'Edema': int(i % 3 == 0)}, 'extra': None}] for i in range(40)]
+    log_file = str(tmp_path / 'run.json')
+
+    num_shards = 3
+    for shard_id in range(num_shards):
+        shard_log = get_shard_path(log_file, num_shards, shard_id)
+        task = BaseTask(dataset_id='', model_id='echo', evaluator_seq_cfgs=evaluator_seq_cfgs, log_file=shard_log,
+                        checkpoint_file=shard_log.replace('.json', '.responses.jsonl'), num_shards=num_shards, shard_id=shard_id)
+        task.dataset = ListLoader(batches).dataset
+        task.model = JsonAnswerChat('echo')
+        task.evaluators = task.get_evaluators()
+        dataloader = task.get_dataloader()
+        # ListLoader 模拟只加载本 shard 的样本
+        task.checkpoint = Checkpoint(task.checkpoint_file)
+        responses = task.generate(ListLoader([batches[i] for i in task.shard_indices]))
+        task.checkpoint.close()
+        task.eval(responses)
+
+    merged = merge_shards(log_file, num_shards)
+    single = BaseTask(dataset_id='', model_id='echo', evaluator_seq_cfgs=evaluator_seq_cfgs)
+    single.model, single.dataset = JsonAnswerChat('echo'), None
+    single.evaluators = single.get_evaluators()
+    responses = single.generate(ListLoader(batches))
+    expected = single.evaluators[0]([r['response'] for r in responses], [r['target'] for r in responses])
+
+    # 解析失败的统计不随 shard 状态合并
+    assert set(merged) == {'rule_chexpert_eval:accuracy_score', 'rule_chexpert_eval:f1_score'}
+    assert merged == pytest.approx({key: expected[key] for key in merged})
+    merged_ids = [json.loads(line)['sample_id'] for line in open(str(tmp_path / 'run.responses.jsonl'))]
+    assert merged_ids == [response['sample_id'] for response in responses]
+
+
+@pytest.mark.parametrize('executor', ['sequential', 'thread', 'async'])
+def test_online_eval_matches_final_eval(tmp_path, executor):
+    evaluator_seq_cfgs = [{'rule_chexpert_eval': {'metrics_cfg': {'accuracy_score': {}, 'f1_score': {'average': 'micro'}, 'pred_no_op': {}}}}]
+    batches = [[{'message': [{'role': 'user', 'content': f'sample-{i}'}], 'target': {'Edema': int(i % 3 == 0)}, 'extra': None}] for i in range(23)]
+    log_file = str(tmp_path / 'run.json')
+    task = BaseTask(dataset_id='', model_id='echo', evaluator_seq_cfgs=evaluator_seq_cfgs, log_file=log_file, executor=executor, max_concurrency=4,
+                    online_eval_cfg={'every': 10})
+    task.model, task.dataset = JsonAnswerChat('echo'), None
+    task.model.thread_safe = True
+    task.evaluators = task.get_evaluators()
+    responses = task.generate(ListLoader(batches))
+
+    # 每 10 个样本导出一次部分指标
+    with open(str(tmp_path / 'run.online.json')) as f:
+        partial = json.load(f)
+    assert partial['num_samples'] == 20
+    online = task.report_online()
+    final = task.evaluators[0]([r['response'] for r in responses], [r['target'] for r in responses])
+    # pred_no_op 没有可合并的状态, 不做在线计算
+    assert set(online) == {'rule_chexpert_eval:accuracy_score', 'rule_chexpert_eval:f1_score', 'rule_chexpert_eval:parse_failure_rate'}
+    assert online == pytest.approx({key: final[key] for key in online})
+
+    # 再次生成时从零开始累计
+    task.generate(ListLoader(batches[:5]))
+    assert task.num_online == 5 and task.report_online()['rule_chexpert_eval:accuracy_score'] == pytest.approx(
+        task.evaluators[0]([r['response'] for r in responses[:5]], [r['target'] for r in responses[:5]])['rule_chexpert_eval:accuracy_score'])
+
+
+class BadJsonAnswerChat(JsonAnswerChat):
+    def chat(self, messages, **generation_kwargs):
+        response = super().chat(messages, **generation_kwargs)
+        if int(messages[-1]['content'].split('-')[1]) % 4 == 0:
+            response.content = "I cannot tell."
+        return response
+
+
+@pytest.mark.parametrize('executor', ['sequential', 'thread', 'async'])
+def test_online_eval_without_final_eval(tmp_path, executor, capsys):
+    evaluator_seq_cfgs = [{'rule_chexpert_eval': {'metrics_cfg': {'accuracy_score': {}}}}]
+    batches = [[{'message': [{'role': 'user', 'content': f'sample-{i}'}], 'target': {'Edema': int(i % 3 == 0)}, 'extra': None}] for i in range(10)]
+    task = BaseTask(dataset_id='', model_id='echo', evaluator_seq_cfgs=evaluator_seq_cfgs, executor=executor, max_concurrency=4,
+                    checkpoint_file=str(tmp_path / 'run.responses.jsonl'), online_eval_cfg={'every': 100, 'final_eval': False})
+    task.model, task.dataset = BadJsonAnswerChat('echo'), None
+    task.model.thread_safe = True
+    task.evaluators = task.get_evaluators()
+    task.checkpoint = Checkpoint(task.checkpoint_file)
+    # 不保留响应, 仍然写入 checkpoint
+    assert task.generate(ListLoader(batches)) == []
+    task.checkpoint.close()
+    checkpoint = Checkpoint(task.checkpoint_file, resume=True)
+    assert len(checkpoint.finished) == 10
+    checkpoint.close()
+
+    # 逐样本更新时累计解析失败, 不逐条打印
+    assert task.report_online()['rule_chexpert_eval:parse_failure_rate'] == pytest.approx(3 / 10)
+    assert '⚠️' not in capsys.readouterr().out
+
+
+def test_sharded_run_needs_final_eval():
+    # 分片的指标状态由最终评估写出
+    with pytest.raises(AssertionError, match='num_shards'):
+        BaseTask(dataset_id='', model_id='echo', num_shards=2, online_eval_cfg={'final_eval': False})
+    BaseTask(dataset_id='', model_id='echo', num_shards=2, online_eval_cfg={'every': 10})
+
+
+def test_eval_saves_parse_failures_per_sample(tmp_path, capsys):
+    evaluator_seq_cfgs = [{'rule_chexpert_eval': {'metrics_cfg': {'accuracy_score': {}}}}]
+    batches = [[{'message': [{'role': 'user', 'content': f'sample-{i}'}], 'target': {'Edema': int(i % 3 == 0)}, 'extra': None}] for i in range(6)]
+    task = BaseTask(dataset_id='', model_id='echo', evaluator_seq_cfgs=evaluator_seq_cfgs, log_file=str(tmp_path / 'run.json'))
+    task.model, task.dataset = BadJsonAnswerChat('echo'), None
+    task.evaluators = task.get_evaluators()
+    responses = task.generate(ListLoader(batches))
+    capsys.readouterr()
+    task.eval(responses)
+
+    # 打印的指标只有失败率, 逐样本的 mask 写入日志
+    out = capsys.readouterr().out
+    assert 'parse_failure_rate' in out and 'False' not in out
+    with open(str(tmp_path / 'run.json')) as f:
+        per_sample = json.load(f)['per_sample_results']
+    assert [result['sample_id'] for result in per_sample] == [response['sample_id'] for response in responses]
+    assert [result['rule_chexpert_eval:parse_failure'] for result in per_sample] == [i % 4 == 0 for i in range(6)]
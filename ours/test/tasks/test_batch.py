@@ -0,0 +1,110 @@
+import pytest
+from openai import OpenAI
+from ours.models.qwen_chat import QwenChat
+from ours.tasks.base import BaseTask
+from ours.test.mock_server import MockOpenAIServer, echo_responder
+from ours.utils.checkpoint import Checkpoint
+from ours.test.tasks.test_base_task import ListLoader, make_batches
+
+
+def test_batch_generate_keeps_dataset_order(tmp_path):
+    with MockOpenAIServer() as server:
+        task = BaseTask(dataset_id='', model_id='qwen2.5-vl-32b-instruct', executor='batch',
+                        batch_cfg={'input_file': str(tmp_path / 'batch_input.jsonl'), 'poll_interval': 0.01})
+        task.model = QwenChat('qwen2.5-vl-32b-instruct')
+        task.model.client = OpenAI(base_url=server.base_url, api_key='mock', max_retries=0)
+        responses = task.generate(ListLoader(make_batches(10)))
+
+        assert [response['target'] for response in responses] == list(range(10))
+        assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(10)]
+        # 批处理模式下不应发送在线请求
+        assert server.num_online_chat_requests == 0
+        assert server.num_chat_requests == 10
+        assert len(server.batches) == 1
+
+
+def test_batch_generate_skips_finished_samples(tmp_path):
+    checkpoint_file = str(tmp_path / 'responses.jsonl')
+    with MockOpenAIServer() as server:
+        task = BaseTask(dataset_id='', model_id='qwen2.5-vl-32b-instruct', executor='batch', batch_cfg={'input_file': str(tmp_path / 'batch_input.jsonl'), 'poll_interval': 0.01})
+        task.model = QwenChat('qwen2.5-vl-32b-instruct')
+        task.model.client = OpenAI(base_url=server.base_url, api_key='mock', max_retries=0)
+
+        task.checkpoint = Checkpoint(checkpoint_file)
+        task.generate(ListLoader(make_batches(4)))
+        task.checkpoint.close()
+
+        # 全部样本已完成: 不再提交新的批任务
+        task.checkpoint = Checkpoint(checkpoint_file, resume=True)
+        responses = task.generate(ListLoader(make_batches(4)))
+        task.checkpoint.close()
+
+        assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(4)]
+        assert len(server.batches) == 1
+
+
+def failing_responder(body):
+    content = echo_responder(body)
+    if content == 'sample-2':
+        raise RuntimeError("server error")
+    return content
+
+
+def make_batch_task(tmp_path, server, **kwargs):
+    task = BaseTask(dataset_id='', model_id='qwen2.5-vl-32b-instruct', executor='batch', batch_cfg={'input_file': str(tmp_path / 'batch_input.jsonl'), 'poll_interval': 0.01}, **kwargs)
+    task.model = QwenChat('qwen2.5-vl-32b-instruct')
+    task.model.client = OpenAI(base_url=server.base_url, api_key='mock', max_retries=0)
+    return task
+
+
+def test_failed_batch_rows_are_retried_on_resume(tmp_path):
+    checkpoint_file = str(tmp_path / 'responses.jsonl')
+    with MockOpenAIServer(responder=failing_responder) as server:
+        task = make_batch_task(tmp_path, server)
+        task.checkpoint = Checkpoint(checkpoint_file)
+        responses = task.generate(ListLoader(make_batches(4)))
+        task.checkpoint.close()
+        assert responses[2]['response'].startswith('Error in batch generation')
+
+        # 失败的样本没有写入 checkpoint, 续跑时只重新提交它
+        server.responder = echo_responder
+        task.checkpoint = Checkpoint(checkpoint_file, resume=True)
+        responses = task.generate(ListLoader(make_batches(4)))
+        task.checkpoint.close()
+
+        assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(4)]
+        assert len(server.batches) == 2
+        assert server.num_chat_requests == 4 + 1
+
+
+def test_batch_generate_uses_response_cache(tmp_path):
+    cache_cfg = {'path': str(tmp_path / 'responses.sqlite')}
+    generation_kwargs = {'do_sample': False}
+    with MockOpenAIServer(responder=failing_responder) as server:
+        make_batch_task(tmp_path, server, cache_cfg=cache_cfg).generate(ListLoader(make_batches(4)), **generation_kwargs)
+
+        server.responder = echo_responder
+        responses = make_batch_task(tmp_path, server, cache_cfg=cache_cfg).generate(ListLoader(make_batches(4)), **generation_kwargs)
+
+        assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(4)]
+        assert [response.get('from_cache', False) for response in responses] == [True, True, False, True]
+        # 第二次只提交了未缓存的失败样本
+        assert len(server.batches) == 2
+        assert server.num_chat_requests == 4 + 1
+
+
+def test_timed_out_batch_is_resumed(tmp_path):
+    with MockOpenAIServer() as server:
+        task = make_batch_task(tmp_path, server)
+        task.batch_cfg = {**task.batch_cfg, 'timeout': 0}
+        with pytest.raises(TimeoutError):
+            task.generate(ListLoader(make_batches(4)))
+        assert (tmp_path / 'batch_input.batch_id').read_text() in server.batches
+
+        # 续跑时等待同一个批任务, 不重新提交
+        responses = make_batch_task(tmp_path, server).generate(ListLoader(make_batches(4)))
+
+        assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(4)]
+        assert len(server.batches) == 1
+        assert server.num_chat_requests == 4
+        assert not (tmp_path / 'batch_input.batch_id').exists()
@@ -0,0 +1,72 @@
+from ours.tasks.multi_model import MultiModelTask, get_model_path
+from ours.test.tasks.test_base_task import EchoChat, CrashingChat, ListLoader, make_batches
+from ours.utils.profiler import profiler
+
+
+class MultiEchoChat(EchoChat):
+    model_family = ['echo-a', 'echo-b', 'echo-c']
+
+
+class MultiCrashingChat(CrashingChat):
+    model_family = ['crash']
+
+
+class CountingLoader(ListLoader):
+    iterations = 0
+    dataset = property(lambda self: [data for batch in list.__iter__(self) for data in batch])
+
+    def __iter__(self):
+        CountingLoader.iterations += 1
+        return super().__iter__()
+
+
+def test_get_model_path():
+    assert get_model_path('logs/{model_id}/anomaly-detection.json', 'qwen') == 'logs/qwen/anomaly-detection.json'
+    assert get_model_path('logs/anomaly-detection.json', 'qwen') == 'logs/qwen/anomaly-detection.json'
+    assert get_model_path(None, 'qwen') is None
+
+
+def test_models_share_one_dataloader_pass():
+    task = MultiModelTask(dataset_id='', model_ids=['echo-a', 'echo-b', 'echo-c'], executor='async', max_concurrency=4, queue_size=2)
+    for subtask in task.tasks:
+        subtask.model = MultiEchoChat(subtask.model_id)
+        subtask.dataset = None
+    CountingLoader.iterations = 0
+    outputs = task.generate(CountingLoader(make_batches(30)))
+
+    assert CountingLoader.iterations == 1
+    for responses in outputs:
+        assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(30)]
+
+
+def test_failed_model_does_not_block_the_others():
+    task = MultiModelTask(dataset_id='', model_ids=['echo-a', 'crash'], queue_size=1)
+    task.tasks[0].model = MultiEchoChat('echo-a')
+    # 第 3 个样本失败, 另一个模型仍需跑完全部样本
+    task.tasks[1].model = MultiCrashingChat('crash', crash_at=3)
+    for subtask in task.tasks:
+        subtask.dataset = None
+    outputs = task.generate(ListLoader(make_batches(20)))
+
+    assert len(outputs[0]) == 20
+    assert isinstance(outputs[1], RuntimeError)
+
+
+def test_models_share_one_response_cache(tmp_path):
+    task = MultiModelTask(dataset_id='', model_ids=['echo-a', 'echo-b'], cache_cfg={'path': str(tmp_path / 'responses.sqlite')})
+    assert task.response_cache is not None
+    assert all(subtask.response_cache is task.response_cache for subtask in task.tasks)
+
+
+def test_dataloader_span_times_the_dataloader():
+    task = MultiModelTask(dataset_id='', model_ids=['echo-a', 'echo-b'], queue_size=2)
+    for subtask in task.tasks:
+        subtask.model = MultiEchoChat(subtask.model_id)
+        subtask.dataset = None
+    profiler.reset()
+    task.generate(ListLoader(make_batches(10)))
+
+    summary = profiler.summary()
+    # 数据集只读一遍; 各模型等待队列的时间单独记录
+    assert summary['dataloader']['count'] == 11
+    assert summary['dataloader:fan_out']['count'] == 2 * 11
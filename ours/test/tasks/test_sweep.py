@@ -0,0 +1,84 @@
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from ours.tasks.sweep import ModelPool, SweepJob, SweepTask, expand_sweep, interleave_providers
+from ours.test.mock_server import MockOpenAIServer
+from ours.test.tasks.test_base_task import ListLoader, make_batches
+from ours.utils.ratelimit import InFlightChat
+from ours.utils.cache import CachedChat
+
+
+def write_config(tmp_path, name, model_id):
+    path = tmp_path / f'{name}.yaml'
+    path.write_text(yaml.dump({'dataset_id': 'anomaly-detection', 'model_id': model_id, 'generation_kwargs': {'max_new_tokens': 100}}))
+    return str(path)
+
+
+def test_expand_sweep(tmp_path):
+    spec = {
+        'configs': [write_config(tmp_path, 'task-a', ['qwen2.5-vl-32b-instruct', 'deepseek-vl2']), write_config(tmp_path, 'task-b', 'deepseek-vl2')],
+        'cfg_options': {'executor': 'async'},
+        'grid': {'generation_kwargs.max_new_tokens': [100, 200]},
+        'log_dir': str(tmp_path / 'logs'),
+    }
+    jobs = expand_sweep(spec)
+
+    # task-a: 2 个模型 x 2 个取值, task-b: 1 x 2
+    assert len(jobs) == 6
+    assert {job.cfg['executor'] for job in jobs} == {'async'}
+    assert sorted(job.cfg['generation_kwargs']['max_new_tokens'] for job in jobs) == [100, 100, 100, 200, 200, 200]
+    assert all(job.cfg['generation_kwargs']['do_sample'] is False for job in jobs)
+    assert len({job.cfg['log_file'] for job in jobs}) == 6
+    assert jobs[0].name == 'task-a/max_new_tokens=100,model_id=qwen2.5-vl-32b-instruct'
+    assert jobs[0].cfg['log_file'] == str(tmp_path / 'logs' / 'task-a' / 'max_new_tokens=100,model_id=qwen2.5-vl-32b-instruct.json')
+
+
+def test_interleave_providers():
+    jobs = [SweepJob(f'{model_id}-{i}', {'model_id': model_id}) for model_id in ['deepseek-vl2', 'qwen2.5-vl-32b-instruct'] for i in range(3)]
+    assert [job.provider for job in interleave_providers(jobs)] == ['deepseek', 'qwen'] * 3
+
+
+def test_model_pool_shares_models_and_caches(tmp_path):
+    pool = ModelPool(budgets={'qwen': 4})
+    cache = pool.get_cache({'path': str(tmp_path / 'responses.sqlite')})
+    assert pool.get_cache({'path': str(tmp_path / 'responses.sqlite')}) is cache
+
+    model_a = pool.get_model('qwen2.5-vl-32b-instruct', response_cache=cache)
+    model_b = pool.get_model('qwen2.5-vl-32b-instruct')
+    assert isinstance(model_a, CachedChat) and isinstance(model_a.model, InFlightChat)
+    assert isinstance(model_b, InFlightChat)
+    # 同一个客户端与并发预算
+    assert model_a.model.model.client is model_b.model.client
+    assert model_a.model.limiter is model_b.limiter
+    assert not isinstance(pool.get_model('deepseek-vl2'), InFlightChat)
+
+
+def test_async_jobs_share_a_model(tmp_path):
+    pool = ModelPool()
+    with MockOpenAIServer() as server:
+        def run_job(_):
+            task = SweepTask(pool=pool, dataset_id='', model_id='qwen2.5-vl-32b-instruct', model_cfg={'base_url': server.base_url}, executor='async', max_concurrency=4)
+            task.model = task.get_model()
+            task.dataset = None
+            return task.generate(ListLoader(make_batches(8)))
+
+        # 每个异步任务在自己的线程里运行自己的事件循环, 第二轮复用第一轮的模型
+        for _ in range(2):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                for responses in executor.map(run_job, range(2)):
+                    assert [response['response'] for response in responses] == [f'sample-{i}' for i in range(8)]
+    models = [pool.get_model('qwen2.5-vl-32b-instruct', {'base_url': server.base_url}) for _ in range(2)]
+    assert models[0].client is models[1].client and models[0].rate_limiter is models[1].rate_limiter
+    assert models[0].async_client is not models[1].async_client
+
+
+def test_structured_output_downgrade_is_shared_by_jobs():
+    pool = ModelPool()
+    schema = {'type': 'object', 'properties': {'Edema': {'type': 'integer'}}, 'required': ['Edema']}
+    with MockOpenAIServer(responder=lambda body: '{"Edema": 0}', response_formats=('json_object',)) as server:
+        model_cfg = {'base_url': server.base_url, 'rate_limit': None}
+        first, later = pool.get_model('qwen2.5-vl-32b-instruct', model_cfg), pool.get_model('qwen2.5-vl-32b-instruct', model_cfg)
+        first.chat([{'role': 'user', 'content': 'x'}], output_schema=schema)
+        # 后续任务直接使用降级后的模式, 不再收到 400
+        later.chat([{'role': 'user', 'content': 'y'}], output_schema=schema)
+        assert server.rejected_response_formats == ['json_schema']
+    assert later.structured_output_mode() == 'json_object'
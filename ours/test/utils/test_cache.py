@@ -0,0 +1,78 @@
+import asyncio
+from ours.models.base import BaseChat, Response
+from ours.utils.cache import ResponseCache, CachedChat
+
+
+class CountingChat(BaseChat):
+    model_family = ['counting']
+    thread_safe = True
+
+    def __init__(self, model_id):
+        super().__init__(model_id)
+        self.calls = 0
+
+    def chat(self, messages, **generation_kwargs):
+        self.calls += 1
+        return Response(self.model_id, f"answer-{self.calls}", None, 'stop')
+
+
+def image_message(image_path, text='describe'):
+    return [{'role': 'user', 'content': {'image_path': str(image_path), 'text': text}}]
+
+
+def test_repeat_deterministic_request_hits_cache(tmp_path):
+    image = tmp_path / 'a.png'
+    image.write_bytes(b'fake-image')
+    cache = ResponseCache(path=str(tmp_path / 'responses.sqlite'))
+    model = CachedChat(CountingChat('counting'), cache)
+
+    first = model.chat(image_message(image), do_sample=False, max_new_tokens=10)
+    second = model.chat(image_message(image), do_sample=False, max_new_tokens=10)
+    assert model.calls == 1
+    assert second.content == first.content
+
+    # 换一个缓存实例 (模拟重新运行), 仍然命中
+    rerun = CachedChat(CountingChat('counting'), ResponseCache(path=str(tmp_path / 'responses.sqlite')))
+    assert asyncio.run(rerun.achat(image_message(image), do_sample=False, max_new_tokens=10)).content == first.content
+    assert rerun.calls == 0
+
+
+def test_key_depends_on_image_content_and_kwargs(tmp_path):
+    image = tmp_path / 'a.png'
+    image.write_bytes(b'fake-image')
+    cache = ResponseCache(path=str(tmp_path / 'responses.sqlite'))
+    key = cache.make_key('m', image_message(image), {'do_sample': False})
+    assert key != cache.make_key('m', image_message(image), {'do_sample': False, 'max_new_tokens': 5})
+    assert cache.make_key('m', image_message(image), {'do_sample': True}) is None
+
+    copy = tmp_path / 'b.png'
+    copy.write_bytes(b'fake-image')
+    assert cache.make_key('m', image_message(copy), {'do_sample': False}) == key
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / 'responses.sqlite'), max_size_mb=0.001, eviction_interval=1)
+    for i in range(20):
+        cache.set(f'key-{i}', Response('m', 'x' * 200, None, 'stop'))
+    assert cache.get('key-19') is not None
+    assert cache.get('key-0') is None
+
+
+def test_access_times_are_buffered(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / 'responses.sqlite'), access_flush_interval=3)
+    for i in range(3):
+        cache.set(f'key-{i}', Response('m', 'x', None, 'stop'))
+    accessed_at = lambda: dict(cache.connection().execute("SELECT key, accessed_at FROM responses").fetchall())
+    before = accessed_at()
+
+    # 命中后不立即写回访问时间
+    cache.get('key-0')
+    cache.get('key-1')
+    assert accessed_at() == before
+    cache.get('key-2')
+    after = accessed_at()
+    assert all(after[key] > before[key] for key in before)
+
+    cache.get('key-0')
+    cache.close()
+    assert accessed_at()['key-0'] > after['key-0']
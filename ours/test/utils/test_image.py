@@ -0,0 +1,37 @@
+import base64
+import io
+from PIL import Image
+from ours.utils.image import encode_image, _target_size
+
+
+def save_image(path, size, format):
+    Image.new('RGB', size, color=(120, 60, 30)).save(path, format=format)
+
+
+def test_small_image_is_passed_through(tmp_path):
+    path = tmp_path / 'small.png'
+    save_image(path, (300, 200), 'PNG')
+    encoded = encode_image(str(path), use_cache=False)
+    assert encoded.mime_type == 'image/png'
+    assert base64.b64decode(encoded.data) == path.read_bytes()
+    assert encoded.data_url.startswith('data:image/png;base64,')
+
+
+def test_large_image_is_downscaled_to_jpeg(tmp_path):
+    for format in ['JPEG', 'PNG']:
+        path = tmp_path / f'large.{format.lower()}'
+        save_image(path, (2320, 2828), format)
+        encoded = encode_image(str(path), use_cache=False)
+        img = Image.open(io.BytesIO(base64.b64decode(encoded.data)))
+        assert encoded.mime_type == 'image/jpeg' and img.format == 'JPEG'
+        assert img.size == (int(2320 * 400 / 2828), 400)
+
+
+def test_elongated_image_keeps_one_pixel(tmp_path):
+    path = tmp_path / 'strip.png'
+    save_image(path, (4000, 5), 'PNG')
+
+    encoded = encode_image(str(path), max_size=400, use_cache=False)
+    img = Image.open(io.BytesIO(base64.b64decode(encoded.data)))
+    assert img.size == (400, 1)
+    assert _target_size(5, 4000, 400) == (1, 400)
@@ -0,0 +1,27 @@
+from ours.utils.image_cache import ImageCache
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    image_a, image_b = tmp_path / 'a.png', tmp_path / 'b.png'
+    image_a.write_bytes(b'same-content')
+    image_b.write_bytes(b'same-content')
+    calls = []
+
+    def encode_fn(image_path):
+        calls.append(image_path)
+        return 'payload'
+
+    params = {'max_size': 400, 'format': 'JPEG'}
+    cache = ImageCache(cache_dir=str(tmp_path / 'images'), max_items=1)
+    assert cache.get_or_encode(str(image_a), encode_fn, params) == 'payload'
+    # 内容相同的不同路径命中同一条缓存
+    assert cache.get_or_encode(str(image_b), encode_fn, params) == 'payload'
+    assert len(calls) == 1
+
+    # 新实例 (内存为空) 从磁盘读取
+    assert ImageCache(cache_dir=str(tmp_path / 'images')).get_or_encode(str(image_a), encode_fn, params) == 'payload'
+    assert len(calls) == 1
+
+    # 编码参数不同则重新编码
+    cache.get_or_encode(str(image_a), encode_fn, {**params, 'max_size': 200})
+    assert len(calls) == 2
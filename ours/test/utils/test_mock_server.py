@@ -0,0 +1,46 @@
+import asyncio
+import random
+from openai import OpenAI
+from ours.models.qwen_chat import QwenChat
+from ours.test.mock_server import MockOpenAIServer, sample_latency
+from ours.utils.utils import merge_config
+
+
+def test_sample_latency():
+    rng = random.Random(0)
+    assert sample_latency(None, rng) == 0.0
+    assert sample_latency(0.5, rng) == 0.5
+    draws = sorted(sample_latency({'dist': 'lognormal', 'median': 0.2, 'sigma': 0.5}, rng) for _ in range(2000))
+    assert 0.18 < draws[1000] < 0.22
+    assert max(sample_latency({'dist': 'uniform', 'low': 0, 'high': 10, 'max': 1.0}, rng) for _ in range(100)) <= 1.0
+
+
+def test_injected_faults_are_retried():
+    with MockOpenAIServer(rate_limit_rate=0.3, error_rate=0.2, retry_after=0.01, seed=0) as server:
+        model = QwenChat('qwen2.5-vl-32b-instruct', model_cfg={'base_url': server.base_url, 'timeout': 0.01, 'rate_limit': None})
+        model.client = OpenAI(base_url=server.base_url, api_key='mock', max_retries=0)
+        responses = [model.chat([{'role': 'user', 'content': f'sample {i}'}]) for i in range(20)]
+
+    assert [response.content for response in responses] == [f'sample {i}' for i in range(20)]
+    assert server.num_rate_limited > 0 and server.num_errors > 0
+
+
+def test_model_cfg_overrides_model_config():
+    model = QwenChat('qwen2.5-vl-32b-instruct', model_cfg={'base_url': 'http://127.0.0.1:1/v1', 'rate_limit': None})
+    assert str(model.client.base_url) == 'http://127.0.0.1:1/v1/'
+    assert model.rate_limiter is None
+
+
+def test_merge_config_keeps_nested_keys():
+    cfg = {'dataset_cfg': {'nums': 1, 'image_dir': 'a'}}
+    merged = merge_config(cfg, {'dataset_cfg.image_dir': 'b', 'model_cfg.base_url': 'x'})
+    assert merged == {'dataset_cfg': {'nums': 1, 'image_dir': 'b'}, 'model_cfg': {'base_url': 'x'}}
+
+
+def test_failed_generation_has_no_finish_reason():
+    with MockOpenAIServer(error_rate=1.0) as server:
+        model = QwenChat('qwen2.5-vl-32b-instruct', model_cfg={'base_url': server.base_url, 'timeout': 0.01, 'max_retries': 1, 'rate_limit': None})
+        responses = [model.chat([{'role': 'user', 'content': 'x'}]), asyncio.run(model.achat([{'role': 'user', 'content': 'x'}]))]
+    # 同步与异步接口使用同一种错误响应
+    for response in responses:
+        assert response.finish_reason is None and response.content.startswith('Error in generation')
@@ -0,0 +1,89 @@
+import asyncio
+import json
+from ours.tasks.base import BaseTask
+from ours.tasks.multi_model import MultiModelTask
+from ours.test.tasks.test_multi_model import MultiEchoChat
+from ours.test.tasks.test_base_task import EchoChat, ListLoader, make_batches
+from ours.utils.profiler import Histogram, Profiler, profiler
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=[0.1, 0.2, 0.5, 1.0])
+    for value in [0.05] * 50 + [0.3] * 49 + [0.9]:
+        histogram.observe(value)
+    stats = histogram.to_dict()
+
+    assert stats['count'] == 100 and stats['max'] == 0.9
+    assert 0.05 <= stats['p50'] <= 0.1
+    assert 0.2 <= stats['p90'] <= 0.5
+
+
+def test_spans_and_exports(tmp_path):
+    local = Profiler()
+    with local.span('encode_image'):
+        pass
+
+    @local.timed('chat')
+    async def chat():
+        await asyncio.sleep(0.01)
+
+    asyncio.run(chat())
+    summary = local.summary()
+    assert summary['chat']['count'] == 1 and summary['chat']['total'] >= 0.01
+
+    local.save_json(str(tmp_path / 'profile.json'))
+    assert set(json.load(open(tmp_path / 'profile.json'))) == {'chat', 'encode_image'}
+
+    local.save_prometheus(str(tmp_path / 'run.prom'), labels={'model_id': 'echo'})
+    text = open(tmp_path / 'run.prom').read()
+    assert '# TYPE ours_stage_duration_seconds histogram' in text
+    assert 'ours_stage_duration_seconds_count{stage="chat",model_id="echo"} 1' in text
+    assert 'ours_stage_duration_seconds_bucket{stage="chat",model_id="echo",le="+Inf"} 1' in text
+
+
+def test_generate_records_stages():
+    profiler.reset()
+    task = BaseTask(dataset_id='', model_id='echo')
+    task.model = EchoChat('echo')
+    task.generate(ListLoader(make_batches(5)))
+
+    summary = profiler.summary()
+    assert summary['chat']['count'] == 5
+    # 最后一次取数据时 dataloader 已耗尽
+    assert summary['dataloader']['count'] == 6
+
+
+class EchoTask(BaseTask):
+    def get_handlers(self):
+        self.model = EchoChat('echo')
+        self.dataset = None
+        self.evaluators = []
+
+    def get_dataloader(self):
+        return ListLoader(make_batches(5))
+
+
+def test_pipeline_starts_from_empty_profile():
+    task = EchoTask(dataset_id='', model_id='echo')
+    task.pipeline()
+    # 同一进程内的第二次运行不累加第一次的耗时
+    task.pipeline()
+    assert profiler.summary()['chat']['count'] == 5
+
+
+class EchoMultiModelTask(MultiModelTask):
+    def get_handlers(self):
+        for task in self.tasks:
+            task.model = MultiEchoChat(task.model_id)
+            task.dataset = None
+            task.evaluators = []
+
+
+def test_multi_model_pipeline_starts_from_empty_profile():
+    task = EchoMultiModelTask(dataset_id='', model_ids=['echo-a', 'echo-b'])
+    task.tasks[0].get_dataloader = lambda: ListLoader(make_batches(5))
+    task.pipeline()
+    task.pipeline()
+    summary = profiler.summary()
+    assert summary['generate']['count'] == 1
+    assert summary['chat']['count'] == 2 * 5
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from ours.utils.ratelimit import RateLimiter, ConcurrencyLimiter, get_rate_limiter
+
+
+def test_request_bucket_waits_after_burst():
+    limiter = RateLimiter(rpm=60, headroom=1.0)
+    # 突发容量为一分钟的配额, 超出部分按 1 req/s 排队
+    waits = [limiter.reserve() for _ in range(62)]
+    assert waits[:60] == [0.0] * 60
+    assert 0.9 < waits[60] <= 1.0
+    assert 1.9 < waits[61] <= 2.0
+
+
+def test_token_bucket_and_settle():
+    limiter = RateLimiter(tpm=600, headroom=1.0)
+    assert limiter.reserve(500) == 0.0
+    assert limiter.reserve(200) > 0
+    limiter.settle(estimated_tokens=500, used_tokens=100)
+    assert limiter.reserve(300) == 0.0
+
+
+def test_estimate_tokens():
+    limiter = RateLimiter(tpm=1000, image_tokens=100)
+    raw_request = {
+        "messages": [{"role": "user", "content": [{"type": "text", "text": "a" * 40}, {"type": "image_url", "image_url": {"url": ""}}]}],
+        "max_tokens": 50,
+    }
+    assert limiter.estimate_tokens(raw_request) == 10 + 100 + 50
+
+
+def test_limiter_shared_per_endpoint_and_key():
+    cfg = {'rpm': 10}
+    limiter = get_rate_limiter('http://test-endpoint/v1', 'key-a', cfg)
+    assert get_rate_limiter('http://test-endpoint/v1', 'key-a', cfg) is limiter
+    assert get_rate_limiter('http://test-endpoint/v1', 'key-b', cfg) is not limiter
+    assert get_rate_limiter('http://test-endpoint/v1', 'key-a', None) is None
+
+
+def test_concurrency_limiter_bounds_threads_and_event_loops():
+    limiter = ConcurrencyLimiter(3)
+    state = {'current': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def enter():
+        with lock:
+            state['current'] += 1
+            state['peak'] = max(state['peak'], state['current'])
+
+    def leave():
+        with lock:
+            state['current'] -= 1
+
+    def thread_worker():
+        limiter.acquire()
+        enter()
+        time.sleep(0.01)
+        leave()
+        limiter.release()
+
+    async def coroutine_worker():
+        await limiter.aacquire()
+        enter()
+        await asyncio.sleep(0.01)
+        leave()
+        limiter.release()
+
+    async def run_loop():
+        await asyncio.gather(*[coroutine_worker() for _ in range(10)])
+
+    # 线程与两个独立事件循环共享同一个并发上限
+    threads = [threading.Thread(target=thread_worker) for _ in range(10)]
+    threads += [threading.Thread(target=asyncio.run, args=(run_loop(),)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert state['peak'] == 3
+    assert limiter.in_flight == 0 and not limiter.waiters
+
+
+def test_concurrency_limiter_cancelled_waiter_frees_its_slot():
+    limiter = ConcurrencyLimiter(1)
+
+    async def main():
+        await limiter.aacquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        limiter.release()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0 and not limiter.waiters
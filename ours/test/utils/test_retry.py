@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from ours.utils.retry import RetryPolicy, RetryError, is_retryable, get_retry_after
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.response = FakeResponse(status_code, headers)
+        self.status_code = status_code
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+def test_error_classification():
+    assert is_retryable(FakeStatusError(429))
+    assert is_retryable(FakeStatusError(503))
+    assert is_retryable(APIConnectionError("connection reset"))
+    assert not is_retryable(FakeStatusError(400))
+    assert not is_retryable(FakeStatusError(401))
+    assert not is_retryable(ValueError("bug"))
+
+
+def test_retry_after_headers():
+    assert get_retry_after(FakeStatusError(429, {"retry-after": "3"})) == 3.0
+    assert get_retry_after(FakeStatusError(429, {"retry-after-ms": "250"})) == 0.25
+    assert get_retry_after(FakeStatusError(429)) is None
+
+
+def test_fatal_error_is_not_retried():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise FakeStatusError(400)
+
+    with pytest.raises(RetryError):
+        RetryPolicy(max_retries=5, base_delay=0).call(fn)
+    assert len(calls) == 1
+
+
+def test_retryable_error_uses_retry_after_then_succeeds(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("ours.utils.retry.time.sleep", sleeps.append)
+    errors = [FakeStatusError(429, {"retry-after": "2"}), FakeStatusError(500)]
+
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert RetryPolicy(max_retries=5, base_delay=1, max_delay=4).call(fn) == "ok"
+    assert sleeps[0] == 2.0
+    # 第二次退避: full jitter, 上限 base_delay * 2
+    assert 0 <= sleeps[1] <= 2
+
+
+def test_deadline_stops_retries_and_bounds_timeout():
+    timeouts = []
+
+    async def fn(timeout):
+        timeouts.append(timeout)
+        raise FakeStatusError(429, {"retry-after": "10"})
+
+    with pytest.raises(RetryError):
+        asyncio.run(RetryPolicy(max_retries=5, deadline=5).acall(fn))
+    assert len(timeouts) == 1 and timeouts[0] <= 5
@@ -0,0 +1,67 @@
+import asyncio
+from openai import OpenAI, AsyncOpenAI
+from ours.models.qwen_chat import QwenChat
+from ours.test.mock_server import MockOpenAIServer
+from ours.utils.stream import JsonObjectDetector
+
+
+def feed_all(detector, chunks):
+    text = ''
+    for chunk in chunks:
+        end = detector.feed(chunk)
+        if end is not None:
+            return text + chunk[:end]
+        text += chunk
+    return None
+
+
+def test_json_object_detector_stops_after_closing_brace():
+    chunks = ['```json\n{"a": ', '{"b": 1}', ', "c": "}{"', '}\n```', ' Explanation...']
+    assert feed_all(JsonObjectDetector(), chunks) == '```json\n{"a": {"b": 1}, "c": "}{"}'
+
+
+def test_json_object_detector_handles_escaped_quotes():
+    chunks = ['{"a": "say \\"}\\" ', 'now"} tail']
+    assert feed_all(JsonObjectDetector(), chunks) == '{"a": "say \\"}\\" now"}'
+    assert feed_all(JsonObjectDetector(), ['no json here']) is None
+
+
+ANSWER = '{"label": "Cardiomegaly"} The heart is enlarged because ' + 'blah ' * 50
+
+
+def make_model(server):
+    model = QwenChat('qwen2.5-vl-32b-instruct')
+    model.client = OpenAI(base_url=server.base_url, api_key='mock', max_retries=0)
+    model.async_client = AsyncOpenAI(base_url=server.base_url, api_key='mock', max_retries=0)
+    model.rate_limiter = None
+    return model
+
+
+def test_streaming_with_completion_detector():
+    with MockOpenAIServer(responder=lambda body: ANSWER) as server:
+        model = make_model(server)
+        messages = [{'role': 'user', 'content': 'hi'}]
+
+        full = model.chat(messages, stream=True)
+        assert full.content == ANSWER
+        assert full.finish_reason == 'stop' and full.ttft is not None
+
+        early = model.chat(messages, stream=True, completion_detector='json_object')
+        assert early.content == '{"label": "Cardiomegaly"}'
+        assert early.ttft is not None
+
+        early_async = asyncio.run(model.achat(messages, stream=True, completion_detector='json_object'))
+        assert early_async.content == early.content
+
+        # 非流式请求不记录 ttft
+        assert model.chat(messages).ttft is None
+
+
+def test_cached_tokens_are_reported():
+    with MockOpenAIServer() as server:
+        model = make_model(server)
+        instructions = 'Analyze this chest X-ray image. ' * 20
+        responses = [model.chat([{'role': 'system', 'content': instructions}, {'role': 'user', 'content': f'sample {i}'}]) for i in range(2)]
+    assert responses[0].cached_tokens == 0
+    # 第二个请求与第一个共享指令前缀
+    assert responses[1].cached_tokens >= len(instructions) // 4 - 16
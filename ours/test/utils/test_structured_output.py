@@ -0,0 +1,74 @@
+import json
+import httpx
+from openai import OpenAI, BadRequestError
+from ours.datasets.anomaly_detection import AnomalyData
+from ours.models.qwen_chat import QwenChat
+from ours.test.mock_server import MockOpenAIServer
+from ours.utils.structured_output import build_response_format, next_mode
+
+SCHEMA = AnomalyData.output_schema
+ANSWER = json.dumps({condition: 0 for condition in SCHEMA['required']})
+
+
+def test_build_response_format():
+    assert build_response_format('json_schema', SCHEMA)['json_schema']['schema'] is SCHEMA
+    assert build_response_format('json_object', SCHEMA) == {'type': 'json_object'}
+    assert build_response_format('none', SCHEMA) is None
+    assert [next_mode('json_schema'), next_mode('json_object'), next_mode('none')] == ['json_object', 'none', 'none']
+
+
+def make_model(server):
+    model = QwenChat('qwen2.5-vl-32b-instruct')
+    model.client = OpenAI(base_url=server.base_url, api_key='mock', max_retries=0)
+    model.rate_limiter = None
+    return model
+
+
+def test_request_carries_schema():
+    seen = []
+    with MockOpenAIServer(responder=lambda body: seen.append(body) or ANSWER) as server:
+        response = make_model(server).chat([{'role': 'user', 'content': 'x'}], output_schema=SCHEMA)
+    assert response.content == ANSWER
+    assert seen[0]['response_format']['type'] == 'json_schema'
+
+
+def test_fallback_when_provider_lacks_structured_output():
+    seen = []
+    # 服务端不支持任何 response_format: 依次降级到 json_object, 再到仅 prompt
+    with MockOpenAIServer(responder=lambda body: seen.append(body) or ANSWER, response_formats=()) as server:
+        model = make_model(server)
+        first = model.chat([{'role': 'user', 'content': 'x'}], output_schema=SCHEMA)
+        second = model.chat([{'role': 'user', 'content': 'y'}], output_schema=SCHEMA)
+        assert server.rejected_response_formats == ['json_schema', 'json_object']
+    assert first.content == second.content == ANSWER
+    assert model.structured_output_mode() == 'none'
+    assert all('response_format' not in body for body in seen)
+
+
+def bad_request(param, message='invalid request'):
+    response = httpx.Response(400, request=httpx.Request('POST', 'http://mock/v1/chat/completions'))
+    return BadRequestError(message, response=response, body={'message': message, 'param': param})
+
+
+def test_fallback_only_on_response_format_errors():
+    with MockOpenAIServer() as server:
+        model = make_model(server)
+    raw_request = {'messages': [], 'response_format': model.response_format({'output_schema': SCHEMA})}
+    # 与 response_format 无关的 400 不降级
+    assert not model.fallback_response_format(raw_request, {'output_schema': SCHEMA}, bad_request('messages'))
+    assert model.structured_output_mode() == 'json_schema'
+    assert raw_request['response_format']['type'] == 'json_schema'
+    assert model.fallback_response_format(raw_request, {'output_schema': SCHEMA}, bad_request(None, 'response_format is not supported'))
+    assert raw_request['response_format'] == {'type': 'json_object'}
+
+
+def test_concurrent_rejections_downgrade_once():
+    with MockOpenAIServer() as server:
+        model = make_model(server)
+    generation_kwargs = {'output_schema': SCHEMA}
+    # 多个请求同时以 json_schema 被拒: 只降一级
+    requests = [{'messages': [], 'response_format': model.response_format(generation_kwargs)} for _ in range(3)]
+    for raw_request in requests:
+        assert model.fallback_response_format(raw_request, generation_kwargs, bad_request('response_format'))
+    assert model.structured_output_mode() == 'json_object'
+    assert all(raw_request['response_format'] == {'type': 'json_object'} for raw_request in requests)
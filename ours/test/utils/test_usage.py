@@ -0,0 +1,63 @@
+import json
+from types import SimpleNamespace
+import pytest
+from openai import OpenAI
+from ours.models.qwen_chat import QwenChat
+from ours.test.mock_server import MockOpenAIServer
+from ours.utils.usage import get_token_usage, summarize_usage
+
+
+def test_get_token_usage_reads_provider_formats():
+    openai_usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+    deepseek_usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, prompt_cache_hit_tokens=32)
+    anthropic_usage = SimpleNamespace(input_tokens=100, output_tokens=20, cache_read_input_tokens=16)
+
+    assert get_token_usage(openai_usage) == {'prompt_tokens': 100, 'completion_tokens': 20, 'cached_tokens': 64}
+    assert get_token_usage(deepseek_usage)['cached_tokens'] == 32
+    assert get_token_usage(anthropic_usage) == {'prompt_tokens': 100, 'completion_tokens': 20, 'cached_tokens': 16}
+    assert get_token_usage(None)['prompt_tokens'] is None
+
+
+def test_summarize_usage():
+    outputs = [
+        {'prompt_tokens': 1000, 'completion_tokens': 100, 'cached_tokens': 0, 'latency': 1.0},
+        {'prompt_tokens': 1000, 'completion_tokens': 300, 'cached_tokens': 500, 'latency': 3.0},
+        # 命中本地响应缓存的样本不计费
+        {'prompt_tokens': 1000, 'completion_tokens': 100, 'cached_tokens': 0, 'latency': 0.01, 'from_cache': True},
+    ]
+    summary = summarize_usage(outputs, {'prompt': 2.0, 'cached_prompt': 1.0, 'completion': 10.0})
+
+    assert summary['totals'] == {'num_samples': 3, 'num_from_cache': 1, 'num_with_usage': 2, 'num_usage_unknown': 0,
+                                 'prompt_tokens': 2000, 'completion_tokens': 400, 'cached_tokens': 500}
+    assert summary['prompt_cache_hit_rate'] == 0.25
+    assert summary['per_sample']['completion_tokens']['p50'] == 100
+    assert summary['cost']['total'] == pytest.approx((1500 * 2.0 + 500 * 1.0 + 400 * 10.0) / 1e6)
+    assert summary['per_sample']['latency'] == {'mean': 2.0, 'max': 3.0, 'p50': 2.0, 'p90': pytest.approx(2.8), 'p99': pytest.approx(2.98)}
+    assert summary['per_sample']['ttft'] is None
+    json.dumps(summary)
+
+
+def test_response_carries_usage_and_latency():
+    with MockOpenAIServer(responder=lambda body: 'ok') as server:
+        model = QwenChat('qwen2.5-vl-32b-instruct')
+        model.client = OpenAI(base_url=server.base_url, api_key='mock', max_retries=0)
+        model.rate_limiter = None
+        response = model.chat([{'role': 'user', 'content': 'hello'}])
+    assert response.prompt_tokens > 0 and response.completion_tokens == 1
+    assert response.latency > 0
+
+
+def test_early_closed_stream_has_unknown_usage():
+    with MockOpenAIServer(responder=lambda body: '{"Edema": 1} because ' + 'blah ' * 50) as server:
+        model = QwenChat('qwen2.5-vl-32b-instruct', model_cfg={'base_url': server.base_url, 'rate_limit': None})
+        messages = [{'role': 'user', 'content': 'hello'}]
+        full = model.chat(messages, stream=True)
+        early = model.chat(messages, stream=True, completion_detector='json_object')
+    assert full.prompt_tokens > 0
+    # 提前关闭的流收不到带 usage 的最后一个分块
+    assert early.content == '{"Edema": 1}' and early.prompt_tokens is None
+
+    outputs = [{field: getattr(response, field) for field in ['prompt_tokens', 'completion_tokens', 'cached_tokens', 'latency']} for response in [full, early]]
+    summary = summarize_usage(outputs, {'prompt': 1.0, 'completion': 1.0})
+    assert summary['totals']['num_usage_unknown'] == 1
+    assert summary['cost']['lower_bound']
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+
+FINAL_BATCH_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+class BatchJob:
+    """
+    Offline execution of chat-completion requests through the batch API of OpenAI-compatible providers:
+    requests are written to a JSONL file, uploaded, submitted as one batch, polled until done, and the
+    results are mapped back to their `custom_id`. The id of the submitted batch is stored next to the input file
+    (`<input name>.batch_id`) until the batch is done, so that an interrupted run waits for the same batch again.
+    """
+
+    def __init__(self, client: OpenAI, endpoint: str = '/v1/chat/completions', completion_window: str = '24h', poll_interval: float = 30, timeout: Optional[float] = None) -> None:
+        """
+        Arguments:
+            client: OpenAI-compatible client of the chat model
+            endpoint: endpoint every request of the batch is sent to
+            completion_window: time frame in which the batch should be processed
+            poll_interval: seconds between two status checks
+            timeout: seconds to wait for the batch before raising TimeoutError, None to wait until it is done
+        """
+        self.client = client
+        self.endpoint = endpoint
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def write_input(self, path: str, requests: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Write (custom_id, request body) pairs to the batch input file, return the number of requests.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        num_requests = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for custom_id, body in requests:
+                f.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': self.endpoint, 'body': body}, ensure_ascii=False) + '\n')
+                num_requests += 1
+        return num_requests
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=self.endpoint, completion_window=self.completion_window)
+        print(f"Batch {batch.id} submitted with input file {input_file.id}.")
+        return batch.id
+
+    def wait(self, batch_id: str):
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            print(f"Batch {batch_id}: {batch.status}, request_counts={batch.request_counts}")
+            if batch.status in FINAL_BATCH_STATUSES:
+                return batch
+            if deadline is not None and time.monotonic() + self.poll_interval > deadline:
+                raise TimeoutError(f"Batch {batch_id} is still {batch.status} after {self.timeout}s, run again to keep waiting for it.")
+            time.sleep(self.poll_interval)
+
+    @staticmethod
+    def batch_id_path(input_path: str) -> str:
+        return os.path.splitext(input_path)[0] + '.batch_id'
+
+    def _read_file(self, file_id: Optional[str]):
+        if not file_id:
+            return
+        for line in self.client.files.content(file_id).text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+    def results(self, batch) -> Dict[str, Tuple[Optional[ChatCompletion], Optional[str]]]:
+        """
+        Results of a finished batch, format: {custom_id: (chat completion, None) or (None, error message)}.
+        """
+        results = {}
+        for record in list(self._read_file(batch.output_file_id)) + list(self._read_file(getattr(batch, 'error_file_id', None))):
+            response = record.get('response') or {}
+            if record.get('error') is None and response.get('status_code') == 200:
+                results[record['custom_id']] = (ChatCompletion.model_validate(response['body']), None)
+            else:
+                error = record.get('error') or response.get('body', {}).get('error') or response
+                results[record['custom_id']] = (None, str(error))
+        return results
+
+    def run(self, input_path: str) -> Dict[str, Tuple[Optional[ChatCompletion], Optional[str]]]:
+        """
+        Submit the input file as a batch, or resume the batch of a previous run, and return its results.
+        """
+        batch_id_path = self.batch_id_path(input_path)
+        if os.path.exists(batch_id_path):
+            with open(batch_id_path, encoding='utf-8') as f:
+                batch_id = f.read().strip()
+            print(f"Resuming batch {batch_id}.")
+        else:
+            batch_id = self.submit(input_path)
+            with open(batch_id_path, 'w', encoding='utf-8') as f:
+                f.write(batch_id)
+        batch = self.wait(batch_id)
+        # the batch is done, a next run submits a new one (e.g., for the failed rows)
+        os.remove(batch_id_path)
+        if batch.status != 'completed':
+            print(f"Batch {batch.id} ended with status {batch.status}: {batch.errors}")
+        return self.results(batch)
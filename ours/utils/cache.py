@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from ours.models.base import BaseChat, Response
+from ours.utils.utils import file_hash
+
+
+def _to_jsonable(obj: Any) -> Any:
+    # SDK objects, e.g., logprobs of openai responses
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    return str(obj)
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of chat responses, stored in SQLite so that several threads and processes can share it.
+
+    Entries are keyed on the model id, the normalized messages (images are identified by content hash) and
+    the generation kwargs, and only deterministic requests are cached. The least recently used entries are
+    evicted once the cache grows beyond `max_size_mb`. Access times of hits are buffered and written every
+    `access_flush_interval` hits, or before an eviction.
+    """
+
+    def __init__(self, path: str = './cache/responses.sqlite', max_size_mb: float = 1024, eviction_interval: int = 100, access_flush_interval: int = 100) -> None:
+        self.path = path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.eviction_interval = eviction_interval
+        self.access_flush_interval = access_flush_interval
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.num_writes = 0
+        self.pending_accesses: Dict[str, float] = {}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def connection(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared across threads or forked processes
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def is_deterministic(generation_kwargs: Dict[str, Any]) -> bool:
+        if 'do_sample' in generation_kwargs:
+            return not generation_kwargs['do_sample']
+        return generation_kwargs.get('temperature', 1.0) == 0
+
+    @staticmethod
+    def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        normalized = []
+        for message in messages:
+            content = message['content']
+            if isinstance(content, dict):
+                content = dict(content)
+                content.pop('encoded_image', None)
+                image_path = content.pop('image_path', None)
+                if image_path is not None:
+                    content['image_sha256'] = file_hash(image_path) if os.path.exists(image_path) else image_path
+            normalized.append({'role': message['role'], 'content': content})
+        return normalized
+
+    def make_key(self, model_id: str, messages: List[Dict[str, Any]], generation_kwargs: Dict[str, Any]) -> Optional[str]:
+        """
+        Cache key of a request, or None if the request is not deterministic.
+        """
+        if not self.is_deterministic(generation_kwargs):
+            return None
+        payload = json.dumps({
+            'model_id': model_id,
+            'messages': self.normalize_messages(messages),
+            'generation_kwargs': generation_kwargs,
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Response]:
+        conn = self.connection()
+        row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.lock:
+            self.pending_accesses[key] = time.time()
+            flush = len(self.pending_accesses) >= self.access_flush_interval
+        if flush:
+            self.flush_accesses()
+        return Response.from_dict(json.loads(row[0]))
+
+    def set(self, key: str, response: Response) -> None:
+        value = json.dumps(response.to_dict(), ensure_ascii=False, default=_to_jsonable)
+        self.connection().execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, value, len(value), time.time()),
+        )
+        with self.lock:
+            self.num_writes += 1
+            evict = self.num_writes % self.eviction_interval == 0
+        if evict:
+            self.evict()
+
+    def flush_accesses(self) -> None:
+        """
+        Write the buffered access times of cache hits in one statement.
+        """
+        with self.lock:
+            accesses, self.pending_accesses = self.pending_accesses, {}
+        if accesses:
+            self.connection().executemany("UPDATE responses SET accessed_at = ? WHERE key = ?", [(t, key) for key, t in accesses.items()])
+
+    def evict(self) -> None:
+        """
+        Delete least recently used entries until the cache is below 90% of `max_size`.
+        """
+        self.flush_accesses()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size > self.max_size:
+                excess = total_size - int(self.max_size * 0.9)
+                rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+                evicted = []
+                for key, size in rows:
+                    if excess <= 0:
+                        break
+                    evicted.append((key,))
+                    excess -= size
+                conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self) -> None:
+        """
+        Flush the buffered access times and close the connection of the calling thread.
+        """
+        self.flush_accesses()
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None and self.local.pid == os.getpid():
+            conn.close()
+        self.local.conn = None
+
+
+class CachedChat:
+    """
+    Wraps a chat model so that `chat`/`achat` go through a ResponseCache, other attributes are forwarded to the model.
+    Failed generations (no finish_reason) are never cached.
+    """
+
+    def __init__(self, model: BaseChat, cache: ResponseCache) -> None:
+        self.model = model
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    def chat(self, messages: List, **generation_kwargs) -> Response:
+        key = self.cache.make_key(self.model.model_id, messages, generation_kwargs)
+        if key is not None:
+            response = self.cache.get(key)
+            if response is not None:
+                response.from_cache = True
+                return response
+        response = self.model.chat(messages, **generation_kwargs)
+        if key is not None and response.finish_reason is not None:
+            self.cache.set(key, response)
+        return response
+
+    async def achat(self, messages: List, **generation_kwargs) -> Response:
+        key = self.cache.make_key(self.model.model_id, messages, generation_kwargs)
+        if key is not None:
+            response = self.cache.get(key)
+            if response is not None:
+                response.from_cache = True
+                return response
+        response = await self.model.achat(messages, **generation_kwargs)
+        if key is not None and response.finish_reason is not None:
+            self.cache.set(key, response)
+        return response
@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+from typing import Any, Dict
+
+
+class Checkpoint:
+    """
+    Append-only JSONL checkpoint of generated responses, one line per finished sample keyed by `sample_id`.
+
+    Every line is flushed as soon as it is written and fsync-ed every `fsync_interval` lines, so a crash loses
+    at most the line being written; such a truncated last line is skipped on load.
+    """
+
+    def __init__(self, path: str, resume: bool = False, fsync_interval: int = 16) -> None:
+        """
+        Arguments:
+            path: path of the JSONL checkpoint file
+            resume: if True, keep and load the existing checkpoint, otherwise start a new one
+            fsync_interval: number of lines between two fsync calls
+        """
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.num_unsynced = 0
+        self.finished: Dict[str, Dict[str, Any]] = self.load() if resume else {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if resume:
+            self.repair()
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        finished = {}
+        if not os.path.exists(self.path):
+            return finished
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # truncated line written during a crash
+                    continue
+                finished[record['sample_id']] = record
+        print(f"Resuming from {self.path}: {len(finished)} samples already finished.")
+        return finished
+
+    def repair(self) -> None:
+        # make sure the next record starts on a new line after a truncated last line
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+
+    def append(self, sample_id: str, output: Dict[str, Any]) -> None:
+        line = json.dumps({'sample_id': sample_id, **output}, ensure_ascii=False, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            self.num_unsynced += 1
+            if self.num_unsynced >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.num_unsynced = 0
+
+    def close(self) -> None:
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
@@ -0,0 +1,106 @@
+import base64
+import io
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+from PIL import Image
+from ours.utils.image_cache import image_cache
+from ours.utils.profiler import profiler
+
+# formats accepted as-is by the chat providers
+PASSTHROUGH_FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'GIF': 'image/gif', 'WEBP': 'image/webp'}
+
+
+@dataclass
+class EncodedImage:
+    """
+    Base64 payload of an image, ready to be sent to a chat model.
+    """
+
+    data: str
+    # base64 encoded bytes of the image
+
+    mime_type: str
+    # MIME type of the encoded bytes, e.g., image/jpeg
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.data}"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EncodedImage":
+        return cls(**{k: v for k, v in data.items() if k in cls.__annotations__})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _target_size(width: int, height: int, max_size: int):
+    # keep the aspect ratio, the longer side becomes max_size
+    # very elongated images still keep at least one pixel on the shorter side
+    if width > height:
+        return max_size, max(1, int(height * (max_size / width)))
+    return max(1, int(width * (max_size / height))), max_size
+
+
+@profiler.timed('encode_image.miss')
+def _encode_image(image_path: str, max_size: int = 400, quality: Optional[int] = None) -> EncodedImage:
+    with open(image_path, 'rb') as f:
+        raw = f.read()
+
+    # only the header is parsed here, pixels are decoded lazily
+    img = Image.open(io.BytesIO(raw))
+    if img.width <= max_size and img.height <= max_size and img.format in PASSTHROUGH_FORMATS:
+        # already small enough: send the original bytes untouched
+        return EncodedImage(base64.b64encode(raw).decode('utf-8'), PASSTHROUGH_FORMATS[img.format])
+
+    size = _target_size(img.width, img.height, max_size)
+    if img.format == 'JPEG':
+        # let libjpeg decode directly at 1/2, 1/4 or 1/8 scale, never below the target size
+        img.draft('RGB', size)
+    img = img.convert('RGB')
+
+    if img.width > size[0] or img.height > size[1]:
+        # cheap box reduction down to at most 2x the target, then a high quality resize for the rest
+        factor = min(img.width // size[0], img.height // size[1]) // 2
+        if factor > 1:
+            img = img.reduce(factor)
+        img = img.resize(size, Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    save_kwargs = {'quality': quality} if quality is not None else {}
+    img.save(buffer, format='JPEG', **save_kwargs)
+    return EncodedImage(base64.b64encode(buffer.getvalue()).decode('utf-8'), 'image/jpeg')
+
+
+def encode_image(image_path: str, max_size: int = 400, quality: Optional[int] = None, use_cache: bool = True) -> EncodedImage:
+    """
+    Encode a local image for chat models: images larger than `max_size` are downscaled and re-encoded as JPEG,
+    smaller JPEG/PNG/GIF/WEBP images are passed through untouched.
+
+    Arguments:
+        image_path: local image file
+        max_size: maximal width and height in pixels
+        quality: JPEG quality of re-encoded images, None for the Pillow default
+        use_cache: look the payload up in the shared image cache first
+
+    Return:
+        EncodedImage with the base64 payload and its MIME type
+    """
+    with profiler.span('encode_image'):
+        if not use_cache:
+            return _encode_image(image_path, max_size=max_size, quality=quality)
+
+        params = {'encoder': 'ours.utils.image', 'max_size': max_size, 'quality': quality}
+        payload = image_cache.get_or_encode(image_path, lambda path: _encode_image(path, max_size=max_size, quality=quality).to_dict(), params)
+        return EncodedImage.from_dict(payload)
+
+
+def get_encoded_image(content: Dict[str, Any], max_size: int = 400) -> EncodedImage:
+    """
+    Payload of a multimodal message content: the one prepared by `collate_fn` in a dataloader worker if present,
+    otherwise the image at `content['image_path']` is encoded now.
+    """
+    encoded_image = content.get('encoded_image')
+    if encoded_image is not None:
+        return encoded_image
+    return encode_image(content['image_path'], max_size=max_size)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from ours.utils.utils import file_hash
+
+
+class ImageCache:
+    """
+    Two-tier cache of encoded (resized, re-encoded, base64) image payloads: an in-memory LRU in front of
+    an on-disk store shared by processes and runs.
+
+    Entries are keyed on the content hash of the image file and the encoding parameters, so the same image
+    is decoded and encoded once, whatever its path and whichever chat model sends it.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = './cache/images', max_items: int = 1024) -> None:
+        """
+        Arguments:
+            cache_dir: folder of the on-disk store, None to keep the in-memory tier only
+            max_items: capacity of the in-memory LRU
+        """
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.memory: "OrderedDict[str, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image_path: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps({'image_sha256': file_hash(image_path), **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self.lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_items:
+                self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        if self.cache_dir is None:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file then rename, so that concurrent readers never see a partial payload
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get_or_encode(self, image_path: str, encode_fn: Callable[[str], Any], params: Dict[str, Any]) -> Any:
+        """
+        Encoded payload of `image_path`, computed with `encode_fn(image_path)` on a cache miss.
+
+        Arguments:
+            image_path: local image file
+            encode_fn: function encoding the image, its result must be JSON serializable
+            params: every parameter that changes the output of `encode_fn`, e.g., {'max_size': 400, 'format': 'JPEG'}
+        """
+        key = self.make_key(image_path, params)
+        value = self.get(key)
+        if value is None:
+            value = encode_fn(image_path)
+            self.set(key, value)
+        return value
+
+
+# shared by all chat models of the process
+image_cache = ImageCache(cache_dir=os.getenv("IMAGE_CACHE_DIR", "./cache/images"))
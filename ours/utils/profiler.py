@@ -0,0 +1,171 @@
+import bisect
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+# upper bounds (s) of the histogram buckets, from sub-millisecond image work to multi-minute API calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram of durations, memory does not grow with the number of observations.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Quantile estimated by linear interpolation inside the bucket, as Prometheus' histogram_quantile does.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                value = lower + (upper - lower) * (rank - cumulative) / count
+                return min(max(value, self.min), self.max)
+            cumulative += count
+        return self.max
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'total': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Profiler:
+    """
+    Named timing spans aggregated into histograms, shared by the threads and coroutines of a run.
+
+    Usage:
+        with profiler.span('encode_image'):
+            ...
+
+        @profiler.timed('chat')
+        def chat(...): ...
+
+    Spans recorded in dataloader worker processes stay in those processes.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str) -> Callable:
+        """
+        Decorator recording every call of a function (or coroutine function) as a span.
+        """
+        def decorator(fn: Callable) -> Callable:
+            if inspect.iscoroutinefunction(fn):
+                @wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms = {}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+
+    def save_json(self, path: str) -> None:
+        _makedirs(path)
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def to_prometheus(self, metric: str = 'ours_stage_duration_seconds', labels: Optional[Dict[str, str]] = None) -> str:
+        """
+        Histograms in the Prometheus text exposition format, one series per span name (label `stage`).
+        """
+        extra_labels = ''.join(f',{key}="{_escape(value)}"' for key, value in (labels or {}).items())
+        lines = [f"# HELP {metric} Duration of the stages of an evaluation run.", f"# TYPE {metric} histogram"]
+        with self.lock:
+            for name, histogram in sorted(self.histograms.items()):
+                stage = f'stage="{_escape(name)}"{extra_labels}'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{stage},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{stage}}} {histogram.sum}')
+                lines.append(f'{metric}_count{{{stage}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def save_prometheus(self, path: str, labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Write a textfile for the node_exporter textfile collector, atomically so that it is never scraped half-written.
+        """
+        _makedirs(path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus(labels=labels))
+        os.replace(tmp_path, path)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _makedirs(path: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+
+# shared by all modules of the process
+profiler = Profiler()
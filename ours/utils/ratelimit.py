@@ -0,0 +1,240 @@
+import asyncio
+import collections
+import hashlib
+import threading
+import time
+import warnings
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from ours.utils.profiler import profiler
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `capacity` tokens per minute.
+
+    Tokens are reserved rather than taken: a reservation may drive the bucket below zero, and the caller
+    waits for the returned delay. This keeps the bucket lock free of sleeps, so it works for threads and
+    event loops alike, and concurrent callers are served in reservation order.
+    """
+
+    def __init__(self, capacity: float) -> None:
+        assert capacity > 0, "capacity of a token bucket must be positive."
+        self.capacity = float(capacity)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Reserve `amount` tokens and return the seconds to wait before they are available."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def refund(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """
+    Client-side limiter for requests per minute (rpm) and tokens per minute (tpm).
+
+    Arguments:
+        rpm: maximal requests per minute, None for unlimited
+        tpm: maximal (estimated) tokens per minute, None for unlimited
+        headroom: fraction of the quota actually used, so that concurrent runs stay just under it
+        image_tokens: estimated prompt tokens for one image when estimating request sizes
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, headroom: float = 0.95, image_tokens: int = 256) -> None:
+        assert 0 < headroom <= 1, "headroom must be in (0, 1]."
+        self.rpm = rpm
+        self.tpm = tpm
+        self.headroom = headroom
+        self.image_tokens = image_tokens
+        self.request_bucket = TokenBucket(rpm * headroom) if rpm else None
+        self.token_bucket = TokenBucket(tpm * headroom) if tpm else None
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> float:
+        with self.lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.request_bucket is not None:
+                wait = max(wait, self.request_bucket.reserve(1, now))
+            if self.token_bucket is not None and tokens:
+                wait = max(wait, self.token_bucket.reserve(tokens, now))
+        return wait
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block until a request of `tokens` estimated tokens may be sent."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            profiler.record('rate_limit_wait', wait)
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        """Asynchronous version of `acquire`."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            profiler.record('rate_limit_wait', wait)
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens: int, used_tokens: Optional[int]) -> None:
+        """Correct the token bucket with the real usage reported by the provider."""
+        if self.token_bucket is None or used_tokens is None:
+            return
+        with self.lock:
+            self.token_bucket.refund(estimated_tokens - used_tokens)
+
+    def estimate_tokens(self, raw_request: Dict[str, Any]) -> int:
+        """
+        Rough token estimate of an OpenAI-compatible chat request: ~4 characters per text token,
+        `image_tokens` per image, plus the requested completion budget.
+        """
+        num_chars, num_images = 0, 0
+        for message in raw_request.get('messages', []):
+            content = message.get('content')
+            if isinstance(content, str):
+                num_chars += len(content)
+                continue
+            for part in content or []:
+                if part.get('type') == 'text':
+                    num_chars += len(part.get('text', ''))
+                elif part.get('type') in ['image_url', 'image']:
+                    num_images += 1
+        max_tokens = raw_request.get('max_tokens') or 0
+        return num_chars // 4 + num_images * self.image_tokens + max_tokens
+
+
+_rate_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(base_url: str, api_key: str, rate_limit_cfg: Optional[Dict[str, Any]]) -> Optional[RateLimiter]:
+    """
+    Get the rate limiter shared by every chat model instance using the same `base_url` and api key.
+
+    Arguments:
+        base_url: endpoint of the provider
+        api_key: api key, quotas are usually enforced per key
+        rate_limit_cfg: `rate_limit` section of the model config, format: {rpm: ..., tpm: ..., headroom: ..., image_tokens: ...}
+
+    Return:
+        the shared RateLimiter, or None if no rate limit is configured
+    """
+    if not rate_limit_cfg:
+        return None
+
+    key = (base_url, hashlib.sha256(api_key.encode('utf-8')).hexdigest())
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(**rate_limit_cfg)
+            _rate_limiters[key] = limiter
+        elif (limiter.rpm, limiter.tpm) != (rate_limit_cfg.get('rpm'), rate_limit_cfg.get('tpm')):
+            warnings.warn(f"Rate limiter for {base_url} already exists with rpm={limiter.rpm}, tpm={limiter.tpm}, ignoring {rate_limit_cfg}.")
+    return limiter
+
+
+class ConcurrencyLimiter:
+    """
+    Bound on the number of in-flight requests, shared by threads and event loops alike (e.g., the jobs of a sweep,
+    each running its own executor). Waiters are served in FIFO order and a released slot is handed over directly.
+    """
+
+    def __init__(self, max_in_flight: int) -> None:
+        assert max_in_flight >= 1, "max_in_flight must be a positive integer."
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiters: Deque[Callable[[], None]] = collections.deque()
+        self.lock = threading.Lock()
+
+    def _try_acquire(self, waiter: Callable[[], None]) -> bool:
+        with self.lock:
+            if self.in_flight < self.max_in_flight and not self.waiters:
+                self.in_flight += 1
+                return True
+            self.waiters.append(waiter)
+            return False
+
+    def acquire(self) -> None:
+        """Block until a slot is free."""
+        event = threading.Event()
+        if self._try_acquire(event.set):
+            return
+        start = time.perf_counter()
+        event.wait()
+        profiler.record('in_flight_wait', time.perf_counter() - start)
+
+    async def aacquire(self) -> None:
+        """Asynchronous version of `acquire`."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def hand_over() -> None:
+            # the waiter was cancelled while the slot was on its way: pass it on
+            if future.cancelled():
+                self.release()
+            else:
+                future.set_result(None)
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(hand_over)
+
+        if self._try_acquire(wake):
+            return
+        start = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self.lock:
+                if wake in self.waiters:
+                    self.waiters.remove(wake)
+                    raise
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        profiler.record('in_flight_wait', time.perf_counter() - start)
+
+    def release(self) -> None:
+        with self.lock:
+            if not self.waiters:
+                self.in_flight -= 1
+                return
+            waiter = self.waiters.popleft()
+        waiter()
+
+
+class InFlightChat:
+    """
+    Wraps a chat model so that `chat`/`achat` hold a slot of a ConcurrencyLimiter, other attributes are forwarded to the model.
+    A slot is held for the whole call, retries included.
+    """
+
+    def __init__(self, model: Any, limiter: ConcurrencyLimiter) -> None:
+        self.model = model
+        self.limiter = limiter
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    def chat(self, messages: List, **generation_kwargs) -> Any:
+        self.limiter.acquire()
+        try:
+            return self.model.chat(messages, **generation_kwargs)
+        finally:
+            self.limiter.release()
+
+    async def achat(self, messages: List, **generation_kwargs) -> Any:
+        await self.limiter.aacquire()
+        try:
+            return await self.model.achat(messages, **generation_kwargs)
+        finally:
+            self.limiter.release()
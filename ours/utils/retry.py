@@ -0,0 +1,162 @@
+import asyncio
+import email.utils
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from ours.utils.profiler import profiler
+
+# HTTP status codes worth retrying: timeouts, conflicts, rate limits and server-side errors.
+# Every other status (400, 401, 403, 404, 422, ...) fails the same way on every attempt.
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+# Exceptions without a status code that still indicate a transient transport problem
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException", "ConnectionError", "TimeoutError"}
+
+
+def get_status_code(error: BaseException) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Classify an error raised by a chat request as retryable (rate limit, server error, network) or fatal.
+    """
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds to wait as requested by the server through `retry-after-ms` / `Retry-After` headers, if any.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    # HTTP-date format
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RetryError(Exception):
+    """
+    Raised when a request failed for good, with the last error as `__cause__`.
+    """
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Retry policy shared by the chat models.
+
+    max_retries: maximal number of attempts for one request
+    base_delay: delay before the first retry, doubled after every failed attempt
+    max_delay: upper bound of the exponential backoff
+    deadline: time budget in seconds for one request across all attempts, None for unlimited
+    """
+
+    max_retries: int = 10
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    deadline: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, model_config: Dict[str, Any], default_delay: float = 1.0) -> "RetryPolicy":
+        """
+        Build the policy from a model config, where `timeout` is the base delay between retries.
+        """
+        return cls(
+            max_retries=model_config.get("max_retries", 10),
+            base_delay=model_config.get("timeout", default_delay),
+            max_delay=model_config.get("max_delay", 60.0),
+            deadline=model_config.get("deadline"),
+        )
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """
+        Delay before attempt `attempt + 1`: the server's Retry-After if given, otherwise full-jitter exponential backoff.
+        """
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _next_delay(self, attempt: int, error: BaseException, start: float) -> Optional[float]:
+        """
+        Delay before the next attempt, or None if the request should fail now.
+        """
+        if not is_retryable(error):
+            print(f"[Retry] Fatal error, not retrying: {error}")
+            return None
+        if attempt + 1 >= self.max_retries:
+            return None
+
+        delay = self.backoff(attempt, error)
+        if self.deadline is not None and time.monotonic() - start + delay >= self.deadline:
+            print(f"[Retry] Deadline of {self.deadline}s exceeded: {error}")
+            return None
+        print(f"[Retry {attempt + 1}/{self.max_retries}] Error: {error}, retrying in {delay:.2f}s")
+        return delay
+
+    def _request_kwargs(self, start: float) -> Dict[str, Any]:
+        # bound every attempt by the remaining time of the deadline
+        if self.deadline is None:
+            return {}
+        return {"timeout": max(0.1, self.deadline - (time.monotonic() - start))}
+
+    def call(self, fn: Callable[..., Any]) -> Any:
+        """
+        Call `fn` until it succeeds. `fn` receives `timeout=<remaining seconds>` when a deadline is set.
+        """
+        start = time.monotonic()
+        for attempt in range(self.max_retries):
+            try:
+                with profiler.span('request'):
+                    return fn(**self._request_kwargs(start))
+            except Exception as e:
+                delay = self._next_delay(attempt, e, start)
+                if delay is None:
+                    raise RetryError(str(e)) from e
+                profiler.record('retry_backoff', delay)
+                time.sleep(delay)
+        raise RetryError("max_retries must be positive.")
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]]) -> Any:
+        """
+        Asynchronous version of `call`.
+        """
+        start = time.monotonic()
+        for attempt in range(self.max_retries):
+            try:
+                with profiler.span('request'):
+                    return await fn(**self._request_kwargs(start))
+            except Exception as e:
+                delay = self._next_delay(attempt, e, start)
+                if delay is None:
+                    raise RetryError(str(e)) from e
+                profiler.record('retry_backoff', delay)
+                await asyncio.sleep(delay)
+        raise RetryError("max_retries must be positive.")
@@ -0,0 +1,170 @@
+import time
+from typing import Any, Callable, Dict, List, Optional
+from openai.types.chat import ChatCompletion
+
+
+class CompletionDetector:
+    """
+    Watches the text of a streamed response and tells when the answer is complete, so that the stream can be
+    closed before the model finishes writing. A new detector is created for every request.
+    """
+
+    def feed(self, delta: str) -> Optional[int]:
+        """
+        Consume the next chunk of text.
+
+        Return:
+            None while the answer is incomplete, otherwise the number of characters of `delta` that belong to it
+        """
+        raise NotImplementedError
+
+
+class JsonObjectDetector(CompletionDetector):
+    """
+    Fires when the first top-level JSON object of the response is closed, text before its opening brace
+    (e.g., a ```json fence) is kept, text after its closing brace is dropped.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, delta: str) -> Optional[int]:
+        for i, char in enumerate(delta):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth > 0:
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return None
+
+
+_completion_detectors: Dict[str, Callable[[], CompletionDetector]] = {
+    'json_object': JsonObjectDetector,
+}
+
+
+def get_completion_detector(name: Optional[str]) -> Optional[CompletionDetector]:
+    if name is None:
+        return None
+    assert name in _completion_detectors, f"Unknown completion detector {name}, supported: {list(_completion_detectors)}"
+    return _completion_detectors[name]()
+
+
+class StreamAccumulator:
+    """
+    Rebuilds a ChatCompletion from the chunks of a streamed response. The returned completion carries two extra
+    attributes: `ttft` (seconds from the request to the first content token) and `stopped_early`.
+    """
+
+    def __init__(self, detector: Optional[CompletionDetector] = None) -> None:
+        self.detector = detector
+        self.start_time = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.usage = None
+        self.stopped_early = False
+        self.last_chunk = None
+
+    def add(self, chunk) -> bool:
+        """
+        Consume a chunk, return True once the stream should be closed.
+        """
+        self.last_chunk = chunk
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return False
+        choice = chunk.choices[0]
+        if choice.finish_reason is not None:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta.content or ''
+        if not delta:
+            return False
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start_time
+        if self.detector is not None:
+            end = self.detector.feed(delta)
+            if end is not None:
+                self.parts.append(delta[:end])
+                # the answer is complete: the stream is closed like a stop sequence would end it
+                self.finish_reason, self.stopped_early = 'stop', True
+                return True
+        self.parts.append(delta)
+        return False
+
+    def completion(self) -> ChatCompletion:
+        chunk = self.last_chunk
+        completion = ChatCompletion.model_construct(
+            id=getattr(chunk, 'id', ''),
+            object='chat.completion',
+            created=getattr(chunk, 'created', int(time.time())),
+            model=getattr(chunk, 'model', ''),
+            choices=[_Choice(''.join(self.parts), self.finish_reason)],
+            usage=self.usage,
+        )
+        completion.ttft = self.ttft
+        completion.stopped_early = self.stopped_early
+        return completion
+
+
+class _Message:
+    def __init__(self, content: str) -> None:
+        self.role = 'assistant'
+        self.content = content
+
+
+class _Choice:
+    def __init__(self, content: str, finish_reason: Optional[str]) -> None:
+        self.index = 0
+        self.message = _Message(content)
+        self.finish_reason = finish_reason
+        self.logprobs = None
+
+
+def stream_request(raw_request: Dict[str, Any]) -> Dict[str, Any]:
+    # ask for the usage in a last chunk, it is not reported when the stream is closed early
+    return {**raw_request, 'stream': True, 'stream_options': {'include_usage': True}}
+
+
+def stream_completion(client, raw_request: Dict[str, Any], detector: Optional[CompletionDetector] = None, **request_kwargs) -> ChatCompletion:
+    """
+    Send `raw_request` with streaming and collect the answer, the stream is closed as soon as `detector` fires.
+    """
+    accumulator = StreamAccumulator(detector)
+    stream = client.chat.completions.create(**stream_request(raw_request), **request_kwargs)
+    try:
+        for chunk in stream:
+            if accumulator.add(chunk):
+                break
+    finally:
+        # closing the connection makes the provider stop generating
+        stream.close()
+    return accumulator.completion()
+
+
+async def astream_completion(async_client, raw_request: Dict[str, Any], detector: Optional[CompletionDetector] = None, **request_kwargs) -> ChatCompletion:
+    """
+    Asynchronous version of `stream_completion`.
+    """
+    accumulator = StreamAccumulator(detector)
+    stream = await async_client.chat.completions.create(**stream_request(raw_request), **request_kwargs)
+    try:
+        async for chunk in stream:
+            if accumulator.add(chunk):
+                break
+    finally:
+        await stream.close()
+    return accumulator.completion()
@@ -0,0 +1,39 @@
+from typing import Any, Dict, Optional
+
+# structured output modes, from the strictest to prompt-only
+STRUCTURED_OUTPUT_MODES = ['json_schema', 'json_object', 'none']
+
+
+def build_response_format(mode: str, output_schema: Dict[str, Any], name: str = 'answer') -> Optional[Dict[str, Any]]:
+    """
+    `response_format` of an OpenAI-compatible request asking for answers matching `output_schema`.
+
+    Arguments:
+        mode: 'json_schema' (the provider enforces the schema), 'json_object' (JSON mode, any object) or 'none' (prompt-only)
+        output_schema: JSON schema of the answer, declared by the dataset
+        name: name of the schema sent to the provider
+    """
+    assert mode in STRUCTURED_OUTPUT_MODES, f"Unknown structured output mode {mode}, supported: {STRUCTURED_OUTPUT_MODES}"
+    if mode == 'json_schema':
+        return {'type': 'json_schema', 'json_schema': {'name': name, 'schema': output_schema, 'strict': True}}
+    if mode == 'json_object':
+        return {'type': 'json_object'}
+    return None
+
+
+def next_mode(mode: str) -> str:
+    """
+    Mode to fall back to when the provider rejects `mode`.
+    """
+    return STRUCTURED_OUTPUT_MODES[min(STRUCTURED_OUTPUT_MODES.index(mode) + 1, len(STRUCTURED_OUTPUT_MODES) - 1)]
+
+
+def is_response_format_error(error: BaseException) -> bool:
+    """
+    Whether a rejected request (e.g., an openai.BadRequestError) was rejected because of its `response_format`.
+    """
+    body = getattr(error, 'body', None)
+    param = getattr(error, 'param', None) or (body.get('param') if isinstance(body, dict) else None)
+    if param is not None:
+        return param == 'response_format'
+    return 'response_format' in str(error)
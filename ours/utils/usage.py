@@ -0,0 +1,114 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+# per-request usage fields of Response, copied to the output of every sample
+USAGE_FIELDS = ['prompt_tokens', 'completion_tokens', 'cached_tokens', 'latency', 'ttft', 'from_cache']
+
+PERCENTILES = [50, 90, 99]
+
+
+def get_cached_tokens(usage: Any) -> Optional[int]:
+    """
+    Prompt tokens served from the provider-side prefix cache, None if the provider does not report them.
+
+    OpenAI-compatible APIs report them in `usage.prompt_tokens_details.cached_tokens`, DeepSeek in `usage.prompt_cache_hit_tokens`
+    and Anthropic in `usage.cache_read_input_tokens`.
+    """
+    if usage is None:
+        return None
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', None)
+    if cached_tokens is None:
+        cached_tokens = getattr(usage, 'prompt_cache_hit_tokens', None)
+    if cached_tokens is None:
+        cached_tokens = getattr(usage, 'cache_read_input_tokens', None)
+    return cached_tokens
+
+
+def get_token_usage(usage: Any) -> Dict[str, Optional[int]]:
+    """
+    Token counts of a provider response, as keyword arguments of Response.
+    """
+    if usage is None:
+        return {'prompt_tokens': None, 'completion_tokens': None, 'cached_tokens': None}
+    prompt_tokens = getattr(usage, 'prompt_tokens', None)
+    completion_tokens = getattr(usage, 'completion_tokens', None)
+    if prompt_tokens is None:
+        # anthropic naming
+        prompt_tokens = getattr(usage, 'input_tokens', None)
+        completion_tokens = getattr(usage, 'output_tokens', None)
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'cached_tokens': get_cached_tokens(usage)}
+
+
+def _distribution(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    values = np.asarray(values, dtype=float)
+    distribution = {'mean': float(values.mean()), 'max': float(values.max())}
+    for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        distribution[f'p{q}'] = float(value)
+    return distribution
+
+
+def get_cost(prompt_tokens: int, completion_tokens: int, cached_tokens: int, pricing: Dict[str, Any]) -> float:
+    """
+    Cost of a number of tokens, with prices per 1M tokens: {prompt: ..., completion: ..., cached_prompt: ...}.
+    Cached prompt tokens are billed at `cached_prompt`, or at the full prompt price if it is not given.
+    """
+    prompt_price = pricing.get('prompt', 0)
+    cached_price = pricing.get('cached_prompt', prompt_price)
+    return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price + completion_tokens * pricing.get('completion', 0)) / 1e6
+
+
+def summarize_usage(outputs: List[Dict[str, Any]], pricing: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Aggregate the usage fields of the outputs of a run: totals, per-sample distributions and cost.
+
+    Responses served from the local response cache are counted but not billed, and left out of the latency distributions.
+    Billed responses without token counts (e.g., streams closed early, before the usage chunk) are counted in `num_usage_unknown`:
+    the token totals and the cost are then lower bounds.
+
+    Arguments:
+        outputs: outputs of `BaseTask.generate`
+        pricing: price table of the model config, format: {currency: ..., prompt: ..., cached_prompt: ..., completion: ...} per 1M tokens
+    """
+    billed = [output for output in outputs if not output.get('from_cache')]
+    totals = {
+        'num_samples': len(outputs),
+        'num_from_cache': len(outputs) - len(billed),
+        'num_with_usage': sum(output.get('prompt_tokens') is not None for output in billed),
+    }
+    totals['num_usage_unknown'] = len(billed) - totals['num_with_usage']
+    for field in ['prompt_tokens', 'completion_tokens', 'cached_tokens']:
+        totals[field] = int(sum(output.get(field) or 0 for output in billed))
+
+    summary = {
+        'totals': totals,
+        'per_sample': {
+            **{field: _distribution([output[field] for output in outputs if output.get(field) is not None])
+               for field in ['prompt_tokens', 'completion_tokens', 'cached_tokens']},
+            # cache hits take no time at the provider
+            **{field: _distribution([output[field] for output in billed if output.get(field) is not None])
+               for field in ['latency', 'ttft']},
+        },
+    }
+    if totals['prompt_tokens']:
+        summary['prompt_cache_hit_rate'] = totals['cached_tokens'] / totals['prompt_tokens']
+    if pricing:
+        cost = get_cost(totals['prompt_tokens'], totals['completion_tokens'], totals['cached_tokens'], pricing)
+        summary['cost'] = {
+            'currency': pricing.get('currency', 'USD'),
+            'total': cost,
+            'per_sample': cost / len(billed) if billed else 0.0,
+            'lower_bound': totals['num_usage_unknown'] > 0,
+        }
+    return summary
+
+
+def save_usage(summary: Dict[str, Any], path: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=4)
@@ -1,7 +1,9 @@
 from argparse import Action, ArgumentParser, Namespace
-from typing import Any, Sequence, Union, Dict
+from typing import Any, Sequence, Union, Dict, Tuple
 from ours import lib_path
 import requests
+import hashlib
+import threading
 import copy
 import os
 
@@ -9,6 +11,29 @@ def get_abs_path(rel):
     return os.path.join(lib_path, rel)
 
 
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+_file_hashes_lock = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    """
+    sha256 of the file content, memoized on (path, mtime, size) so that every file is read once per process.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _file_hashes_lock:
+        digest = _file_hashes.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _file_hashes_lock:
+            _file_hashes[memo_key] = digest
+    return digest
+
+
 # Function to download an image from a URL
 def download_image(url, path):
     if os.path.exists(path):
@@ -180,7 +205,7 @@ def merge_config(dict1: Dict[str, Any], dict2: Dict[str, Any]) -> Dict[str, Any]
 
         cur_dict = dict1
         for key_name in key_list[:-1]:
-            if not hasattr(cur_dict, key_name):
+            if not isinstance(cur_dict.get(key_name), dict):
                 cur_dict[key_name] = {}
             cur_dict = cur_dict[key_name]
         
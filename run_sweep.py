@@ -0,0 +1,35 @@
+import yaml
+import argparse
+import warnings
+from pprint import pprint
+warnings.filterwarnings("ignore")
+from ours.tasks.sweep import Sweep, expand_sweep
+from ours.utils.utils import DictAction, merge_config
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spec', default='ours/configs/sweep/truthfulness.yaml', help='sweep spec file path')
+    parser.add_argument(
+        '--spec-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the sweep spec, in xxx=yyy format, e.g., max_parallel_jobs=8 budgets.qwen=64')
+    parser.add_argument('--resume', action='store_true', help='skip the samples already finished in the checkpoint files of the jobs')
+    parser.add_argument('--dry-run', action='store_true', help='list the jobs without running them')
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with open(args.spec, 'r') as f:
+        spec = yaml.load(f, Loader=yaml.FullLoader)
+    if args.spec_options is not None:
+        spec = merge_config(spec, args.spec_options)
+    pprint(spec, width=150)
+
+    if args.dry_run:
+        for job in expand_sweep(spec):
+            print(f"{job.name}: {job.cfg['log_file']}")
+    else:
+        Sweep.from_spec(spec, resume=args.resume).run()
@@ -1,12 +1,11 @@
-import yaml
 import argparse
 import warnings
 from pprint import pprint
 warnings.filterwarnings("ignore")
-from ours.tasks.base import BaseTask
+from ours.tasks.config import load_task_config, build_task, merge_task_shards
 from ours.utils.registry import registry
 # from ours.evaluators.metrics import _supported_metrics
-from ours.utils.utils import DictAction, merge_config
+from ours.utils.utils import DictAction
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -21,6 +20,10 @@ def parse_args():
         'It also allows nested list/tuple values, e.g. key="[(a,b),(c,d)]" '
         'Note that the quotation marks are necessary and that no white space '
         'is allowed.')
+    parser.add_argument('--resume', action='store_true', help='skip the samples already finished in the checkpoint file of the run')
+    parser.add_argument('--num-shards', type=int, default=1, help='split the samples into shards run by separate processes/nodes')
+    parser.add_argument('--shard-id', type=int, default=0, help='shard run by this process, in [0, num_shards)')
+    parser.add_argument('--merge', action='store_true', help='merge the outputs of the finished shards of the run instead of running it')
     args = parser.parse_args()
     return args
 
@@ -36,30 +39,12 @@ if __name__ == '__main__':
     '''
 
     args = parse_args()
-    config = args.config
-
-    with open(config, 'r') as f:
-        cfg = yaml.load(f, Loader=yaml.FullLoader)
-        if hasattr(args, "cfg_options") and args.cfg_options is not None:
-            cfg = merge_config(cfg, args.cfg_options)
-        
-        model_id = cfg.get('model_id')
-        dataset_id = cfg.get('dataset_id')
-        log_file = cfg.get('log_file')
-        method_cfg = cfg.get('method_cfg', {})
-        dataset_cfg = cfg.get('dataset_cfg', {})
-        generation_kwargs = cfg.get('generation_kwargs', {})
-        evaluator_seq_cfgs = cfg.get('evaluator_seq_cfgs', [])
-
-        if 'max_new_tokens' not in generation_kwargs.keys():
-            generation_kwargs['max_new_tokens'] = 50
-        if 'do_sample' not in generation_kwargs.keys(): 
-            generation_kwargs['do_sample'] = False
-
-        cfg['generation_kwargs'] = generation_kwargs
-        cfg['config_path'] = config
-
-        pprint(cfg, width=150)
-
-        runner = BaseTask(dataset_id=dataset_id, model_id=model_id, method_cfg=method_cfg, dataset_cfg=dataset_cfg, generation_kwargs=generation_kwargs, log_file=log_file, evaluator_seq_cfgs=evaluator_seq_cfgs)
-        runner.pipeline()
\ No newline at end of file
+    cfg = load_task_config(args.config, args.cfg_options)
+    cfg['num_shards'], cfg['shard_id'] = args.num_shards, args.shard_id
+    pprint(cfg, width=150)
+
+    if args.merge:
+        merge_task_shards(cfg)
+    else:
+        runner = build_task(cfg, resume=args.resume)
+        runner.pipeline()
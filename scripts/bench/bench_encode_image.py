@@ -0,0 +1,115 @@
+"""
+Microbenchmark of image encoding: `ours.utils.image.encode_image` against the per-wrapper
+implementations it replaced (copied below as reference), on synthetic chest X-ray sized images.
+
+Usage:
+    APIKEY_FILE=env/apikey.yaml python scripts/bench/bench_encode_image.py --sizes 2320x2828 1024x1024 320x390 --repeat 20
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from ours.utils.image import encode_image  # noqa: E402
+
+
+# ---- reference implementations replaced by ours.utils.image.encode_image ----
+
+def legacy_openai_deepseek_encode(image_path: str):
+    # OpenAIChat.encode_image / DeepseekChat.encode_image
+    buffer = io.BytesIO()
+    with open(image_path, "rb") as image_file:
+        img_data = base64.b64encode(image_file.read())
+        img = Image.open(io.BytesIO(base64.b64decode(img_data))).convert('RGB')
+        if img.width > 400 or img.height > 400:
+            if img.width > img.height:
+                new_width = 400
+                size = int((float(img.height) * float(new_width / float(img.width))))
+                img = img.resize((new_width, size), Image.LANCZOS)
+            else:
+                new_height = 400
+                size = int((float(img.width) * float(new_height / float(img.height))))
+                img = img.resize((size, new_height), Image.LANCZOS)
+            img.save(buffer, format="JPEG")
+            img_data = base64.b64encode(buffer.getvalue())
+        return img_data.decode('utf-8')
+
+
+def legacy_qwen_encode(image_path: str):
+    # QwenChat.encode_image
+    buffer = io.BytesIO()
+    with open(image_path, "rb") as image_file:
+        img = Image.open(image_file).convert("RGB")
+        max_size = 400
+        if img.width > max_size or img.height > max_size:
+            ratio = min(max_size / img.width, max_size / img.height)
+            img = img.resize((int(img.width * ratio), int(img.height * ratio)), Image.LANCZOS)
+        img.save(buffer, format="JPEG")
+        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def legacy_claude_encode(image_path: str):
+    # claude_chat.encode_image (imghdr format detection omitted, JPEG inputs only here)
+    buffer = io.BytesIO()
+    img = Image.open(image_path).convert('RGB')
+    if img.width > 400 or img.height > 400:
+        if img.width > img.height:
+            new_width, new_height = 400, int(img.height * (400 / img.width))
+        else:
+            new_width, new_height = int(img.width * (400 / img.height)), 400
+        img = img.resize((new_width, new_height), Image.LANCZOS)
+    img.save(buffer, format='JPEG')
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+IMPLEMENTATIONS = {
+    'legacy_openai_deepseek': legacy_openai_deepseek_encode,
+    'legacy_qwen': legacy_qwen_encode,
+    'legacy_claude': legacy_claude_encode,
+    'ours.utils.image': lambda path: encode_image(path, use_cache=False).data,
+}
+
+
+def make_image(path: str, width: int, height: int, seed: int = 0) -> None:
+    # smooth gradient plus noise, closer to a radiograph than pure noise and compressible like one
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = 128 + 60 * np.sin(x / 37.0) * np.cos(y / 53.0) + rng.normal(0, 12, (height, width))
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), mode='L').convert('RGB').save(path, format='JPEG', quality=90)
+
+
+def bench(fn, image_path: str, repeat: int) -> float:
+    fn(image_path)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(image_path)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='+', default=['2320x2828', '1024x1024', '320x390'], help='image sizes WxH')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'size':>12} {'implementation':>24} {'ms/image':>10} {'payload KB':>11}")
+        for size in args.sizes:
+            width, height = map(int, size.split('x'))
+            image_path = os.path.join(tmp_dir, f'{size}.jpg')
+            make_image(image_path, width, height)
+            for name, fn in IMPLEMENTATIONS.items():
+                ms = bench(fn, image_path, args.repeat)
+                payload_kb = len(fn(image_path)) / 1024
+                print(f"{size:>12} {name:>24} {ms:>10.2f} {payload_kb:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
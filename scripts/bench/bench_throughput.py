@@ -0,0 +1,163 @@
+"""
+End-to-end throughput benchmark of `run_task.py` against a local mock OpenAI-compatible server
+(`ours.test.mock_server`), so that regressions in BaseTask.generate, the chat wrappers and image encoding
+can be caught offline and without API costs.
+
+A synthetic anomaly-detection dataset is generated, the mock server is started in this process, and every
+(executor, concurrency) combination is run as a separate `run_task.py` process. Reported per run:
+samples/s over the generate stage, p50/p99 per-sample latency, CPU seconds per sample of the run_task process
+(start-up included, so use enough samples) and the number of 429/500 responses injected by the server.
+
+Usage:
+    python scripts/bench/bench_throughput.py --config ours/configs/task/truthfulness/t1-anomaly-detection.yaml \
+        --executors async thread --concurrency 1 4 16 --num-samples 64 \
+        --latency-median 0.3 --latency-sigma 0.5 --rate-limit-rate 0.02 --error-rate 0.01 --output bench.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+repo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, repo_path)
+os.environ.setdefault('APIKEY_FILE', os.path.join(repo_path, 'env', 'apikey.yaml'))
+from ours.datasets.anomaly_detection import ANSWER_CONDITIONS  # noqa: E402
+from ours.test.mock_server import MockOpenAIServer  # noqa: E402
+
+
+def make_dataset(root: str, num_samples: int, image_size: int, seed: int = 0):
+    """
+    Synthetic chest X-ray sized grayscale images and their labels, in the AnomalyData format.
+    """
+    rng = np.random.default_rng(seed)
+    image_dir = os.path.join(root, 'images')
+    os.makedirs(image_dir, exist_ok=True)
+    samples = []
+    for i in range(num_samples):
+        filename = f'{i:05d}.jpg'
+        pixels = rng.integers(0, 255, (image_size, int(image_size * 0.82)), dtype=np.uint8)
+        Image.fromarray(pixels, mode='L').save(os.path.join(image_dir, filename), quality=90)
+        samples.append({'image_filename': filename, 'labels': {condition: int(rng.random() < 0.2) for condition in ANSWER_CONDITIONS}})
+    annotation_file = os.path.join(root, 'labels.json')
+    with open(annotation_file, 'w') as f:
+        json.dump({'samples': samples}, f)
+    return image_dir, annotation_file
+
+
+def make_anomaly_responder(seed: int):
+    # answers drawn from a generator of their own, so that runs with the same --seed see the same answers
+    rng = random.Random(seed)
+
+    def anomaly_responder(body):
+        # a JSON answer followed by the kind of explanation models tend to add
+        answer = {condition: rng.randint(0, 1) for condition in ANSWER_CONDITIONS}
+        return json.dumps(answer) + "\nExplanation: the findings above are based on the visible lung fields and cardiac silhouette."
+
+    return anomaly_responder
+
+
+def run_once(args, server, image_dir, annotation_file, run_dir, executor, concurrency):
+    log_file = os.path.join(run_dir, 'log.json')
+    cfg_options = {
+        'log_file': log_file,
+        'executor': executor,
+        'max_concurrency': concurrency,
+        'cache_cfg': 'None',
+        'model_cfg.base_url': server.base_url,
+        'model_cfg.rate_limit': 'None',
+        'model_cfg.timeout': 0.05,
+        'dataset_cfg.image_dir': image_dir,
+        'dataset_cfg.annotation_file': annotation_file,
+        'dataset_cfg.nums': args.num_samples,
+        'dataloader_cfg.num_workers': args.num_workers,
+        'generation_kwargs.stream': args.stream,
+    }
+    if args.model_id:
+        cfg_options['model_id'] = args.model_id
+    command = [sys.executable, os.path.join(repo_path, 'run_task.py'), '--config', args.config, '--cfg-options']
+    command += [f'{key}={value}' for key, value in cfg_options.items()]
+
+    env = dict(os.environ, IMAGE_CACHE_DIR=os.path.join(run_dir, 'image_cache'))
+    num_rate_limited, num_errors = server.num_rate_limited, server.num_errors
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=repo_path, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    wall = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    if result.returncode != 0:
+        print(result.stdout[-4000:])
+        raise RuntimeError(f"run_task.py failed for executor={executor} concurrency={concurrency}")
+
+    log_prefix = os.path.splitext(log_file)[0]
+    with open(log_prefix + '.usage.json') as f:
+        usage = json.load(f)
+    with open(log_prefix + '.profile.json') as f:
+        profile = json.load(f)
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    latency = usage['per_sample']['latency'] or {}
+    generate_time = profile['generate']['total']
+    return {
+        'executor': executor,
+        'concurrency': concurrency,
+        'samples': args.num_samples,
+        'samples_per_s': args.num_samples / generate_time,
+        'generate_s': generate_time,
+        'wall_s': wall,
+        'latency_p50_s': latency.get('p50'),
+        'latency_p99_s': latency.get('p99'),
+        'cpu_s_per_sample': cpu / args.num_samples,
+        'rate_limited': server.num_rate_limited - num_rate_limited,
+        'errors': server.num_errors - num_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='ours/configs/task/truthfulness/t1-anomaly-detection.yaml')
+    parser.add_argument('--model-id', default=None, help='override the model_id of the config, must be an OpenAI-compatible model')
+    parser.add_argument('--executors', nargs='+', default=['sequential', 'async', 'thread'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--num-samples', type=int, default=32)
+    parser.add_argument('--image-size', type=int, default=1024, help='height of the synthetic images')
+    parser.add_argument('--num-workers', type=int, default=2, help='dataloader workers')
+    parser.add_argument('--stream', action='store_true', help='stream the responses')
+    parser.add_argument('--latency-median', type=float, default=0.2)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--stream-delay', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='JSON file for the results')
+    args = parser.parse_args()
+
+    latency = {'dist': 'lognormal', 'median': args.latency_median, 'sigma': args.latency_sigma} if args.latency_sigma > 0 else args.latency_median
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        image_dir, annotation_file = make_dataset(root, args.num_samples, args.image_size, args.seed)
+        with MockOpenAIServer(responder=make_anomaly_responder(args.seed), latency=latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                              stream_delay=args.stream_delay, seed=args.seed) as server:
+            for executor in args.executors:
+                # the sequential executor ignores max_concurrency
+                for concurrency in ([1] if executor == 'sequential' else args.concurrency):
+                    run_dir = os.path.join(root, f'{executor}-{concurrency}')
+                    result = run_once(args, server, image_dir, annotation_file, run_dir, executor, concurrency)
+                    results.append(result)
+                    print(f"{executor:>10} x{concurrency:<3} {result['samples_per_s']:8.2f} samples/s  "
+                          f"p50 {result['latency_p50_s']:.3f}s  p99 {result['latency_p99_s']:.3f}s  "
+                          f"cpu {result['cpu_s_per_sample'] * 1000:.1f}ms/sample  429s {result['rate_limited']}  500s {result['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 if [ $# -eq 0 ]; then
-    echo "Usage: $0 <model_id>"
+    echo "Usage: $0 <model_id> [<model_id> ...]"
     exit 1
 fi
 
-model_id=$1
+# all models run in one process over a shared dataset / image-encoding pass
+model_ids=$(IFS=,; echo "$*")
 
 dataset_ids=(
     "anomaly-detection"
@@ -13,6 +14,6 @@ for dataset_id in "${dataset_ids[@]}";
 do
     python run_task.py --config ours/configs/task/truthfulness/t1-anomaly-detection.yaml --cfg-options \
         dataset_id=${dataset_id} \
-        model_id=${model_id} \
-        log_file="logs/truthfulness/t1-anomaly-detection/${model_id}/${dataset_id}.json"
-done
\ No newline at end of file
+        model_id="[${model_ids}]" \
+        log_file="logs/truthfulness/t1-anomaly-detection/{model_id}/${dataset_id}.json"
+done